@@ -554,6 +554,8 @@ bool AgentRequestHandler::ProcessOneCommand() {
       return ListHals(command_msg.paths());
     case SET_HOST_INFO:
       return SetHostInfo(command_msg.callback_port());
+    case PING:
+      return DefaultResponse();
     case CHECK_DRIVER_SERVICE:
       return CheckDriverService(command_msg.service_name(), NULL);
     case LAUNCH_DRIVER_SERVICE:
@@ -202,9 +202,10 @@ class VtsResourceManager {
   // Converts write_data field in fmq_request to a C++ buffer.
   // For user-defined type, dynamically load the HAL shared library
   // to parse protobuf message to C++ type.
+  // If write_data_packed is set, scalar items are copied from it instead.
   //
   // @param fmq_request    contains the write_data, represented as a repeated
-  //                       proto field.
+  //                       proto field, or write_data_packed.
   // @param write_data     converted data that will be written into FMQ.
   // @param write_data_size number of items in write_data.
   //
@@ -226,13 +227,16 @@ class VtsResourceManager {
   //                       written into protobuf message.
   // @param read_data      contains data read from FMQ read operation.
   // @param read_data_size number of items in read_data.
+  // @param pack_read_data whether to fill the read_data_packed field with
+  //                       the raw scalar items instead of read_data.
   //
   // @return true if parsing is successful, false otherwise.
   //         This function can fail if loading shared library or locating
-  //         function symbols fails in user-defined type.
+  //         function symbols fails in user-defined type, or if packing is
+  //         requested for a user-defined type.
   template <typename T>
   bool FmqCpp2Proto(FmqResponseMessage* fmq_response, const string& data_type,
-                    T* read_data, size_t read_data_size);
+                    T* read_data, size_t read_data_size, bool pack_read_data);
 
   // Loads the corresponding HAL driver shared library from the type name.
   // This function parses the shared library path from a type name, and
@@ -20,7 +20,10 @@
 #include <dlfcn.h>
 #include <fcntl.h>
 #include <sys/stat.h>
+#include <cstring>
+#include <memory>
 #include <regex>
+#include <type_traits>
 
 #include "test/vts/proto/ComponentSpecificationMessage.pb.h"
 #include "test/vts/proto/VtsResourceControllerMessage.pb.h"
@@ -213,9 +216,12 @@ void VtsResourceManager::ProcessHidlMemoryCommand(
       break;
     }
     case MEM_PROTO_READ_BYTES: {
-      char read_data[length];
-      success = hidl_memory_driver_.ReadBytes(mem_id, read_data, length, start);
-      hidl_memory_response->set_read_data(string(read_data, length));
+      // Read directly into the response, so large ranges are neither
+      // allocated on the stack nor copied.
+      string* read_data = hidl_memory_response->mutable_read_data();
+      read_data->resize(length);
+      success = hidl_memory_driver_.ReadBytes(mem_id, &(*read_data)[0], length,
+                                              start);
       break;
     }
     case MEM_PROTO_COMMIT: {
@@ -328,10 +334,17 @@ void VtsResourceManager::ProcessFmqCommandInternal(
   size_t queue_size = fmq_request.queue_size();
   bool blocking = fmq_request.blocking();
   bool reset_pointers = fmq_request.reset_pointers();
-  size_t write_data_size = fmq_request.write_data_size();
-  T write_data[write_data_size];
+  size_t write_data_size = fmq_request.has_write_data_packed()
+                               ? fmq_request.write_data_packed().size() /
+                                     sizeof(T)
+                               : fmq_request.write_data_size();
+  // Allocate on the heap, packed requests can carry millions of items.
+  unique_ptr<T[]> write_data_buffer(new T[write_data_size]);
+  T* write_data = write_data_buffer.get();
   size_t read_data_size = fmq_request.read_data_size();
-  T read_data[read_data_size];
+  unique_ptr<T[]> read_data_buffer(new T[read_data_size]);
+  T* read_data = read_data_buffer.get();
+  bool pack_read_data = fmq_request.pack_read_data();
   size_t queue_desc_addr = fmq_request.queue_desc_addr();
   int64_t time_out_nanos = fmq_request.time_out_nanos();
   // TODO: The three variables below are manually created.
@@ -366,7 +379,7 @@ void VtsResourceManager::ProcessFmqCommandInternal(
       success = fmq_driver_.ReadFmq<T, flavor>(data_type, queue_id, read_data,
                                                read_data_size);
       if (!FmqCpp2Proto<T>(fmq_response, data_type, read_data,
-                           read_data_size)) {
+                           read_data_size, pack_read_data)) {
         LOG(ERROR) << "Resource manager: failed to convert C++ type into "
                    << "protobuf message for type " << data_type;
         break;
@@ -377,7 +390,7 @@ void VtsResourceManager::ProcessFmqCommandInternal(
       success = fmq_driver_.ReadFmqBlocking<T, flavor>(
           data_type, queue_id, read_data, read_data_size, time_out_nanos);
       if (!FmqCpp2Proto<T>(fmq_response, data_type, read_data,
-                           read_data_size)) {
+                           read_data_size, pack_read_data)) {
         LOG(ERROR) << "Resource manager: failed to convert C++ type into "
                    << "protobuf message for type " << data_type;
         break;
@@ -391,7 +404,7 @@ void VtsResourceManager::ProcessFmqCommandInternal(
           data_type, queue_id, read_data, read_data_size, read_notification,
           write_notification, time_out_nanos, &event_flag_word);
       if (!FmqCpp2Proto<T>(fmq_response, data_type, read_data,
-                           read_data_size)) {
+                           read_data_size, pack_read_data)) {
         LOG(ERROR) << "Resource manager: failed to convert C++ type into "
                    << "protobuf message for type " << data_type;
         break;
@@ -475,6 +488,19 @@ template <typename T>
 bool VtsResourceManager::FmqProto2Cpp(const FmqRequestMessage& fmq_request,
                                       T* write_data, size_t write_data_size) {
   const string& data_type = fmq_request.data_type();
+  if (fmq_request.has_write_data_packed()) {
+    // Host and target are both little-endian, copy the items as they are.
+    const string& packed_data = fmq_request.write_data_packed();
+    if (!is_arithmetic<T>::value ||
+        packed_data.size() != write_data_size * sizeof(T)) {
+      LOG(ERROR) << "Resource manager: invalid packed write data for type "
+                 << data_type;
+      return false;
+    }
+    memcpy(static_cast<void*>(write_data), packed_data.data(),
+           packed_data.size());
+    return true;
+  }
   // Read from different proto fields based on type.
   if (data_type == "int8_t") {
     int8_t* convert_data = reinterpret_cast<int8_t*>(write_data);
@@ -557,8 +583,19 @@ bool VtsResourceManager::FmqProto2Cpp(const FmqRequestMessage& fmq_request,
 template <typename T>
 bool VtsResourceManager::FmqCpp2Proto(FmqResponseMessage* fmq_response,
                                       const string& data_type, T* read_data,
-                                      size_t read_data_size) {
+                                      size_t read_data_size,
+                                      bool pack_read_data) {
   fmq_response->clear_read_data();
+  if (pack_read_data) {
+    if (!is_arithmetic<T>::value) {
+      LOG(ERROR) << "Resource manager: can not pack read data of type "
+                 << data_type;
+      return false;
+    }
+    fmq_response->set_read_data_packed(reinterpret_cast<const char*>(read_data),
+                                       read_data_size * sizeof(T));
+    return true;
+  }
   // Write to different proto fields based on type.
   if (data_type == "int8_t") {
     int8_t* convert_data = reinterpret_cast<int8_t*>(read_data);
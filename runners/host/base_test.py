@@ -14,6 +14,7 @@
 # limitations under the License.
 #
 
+import inspect
 import logging
 import os
 import re
@@ -71,6 +72,10 @@ _SETUP_RETRY_NUMBER = 5
 # configured to stop when that property's value is 1.
 SYSPROP_VTS_NATIVE_SERVER = "vts.native_server.on"
 
+# Test class to the names of its callable test attributes.
+_class_test_names = {}
+_class_test_names_lock = threading.Lock()
+
 LOGCAT_BUFFERS = [
     'radio',
     'events',
@@ -98,12 +103,20 @@ class BaseTestClass(object):
         results: A records.TestResult object for aggregating test results from
                  the execution of test cases.
         _current_record: A records.TestResultRecord object for the test case
-                         currently being executed. If no test is running, this
-                         should be None.
+                         currently being executed by the current thread. If
+                         no test is running, this should be None.
+        _thread_local: threading.local object which holds the current record
+                       and the pending result operations of a thread.
         _interrupted: Whether the test execution has been interrupted.
         _interrupt_lock: The threading.Lock object that protects _interrupted.
         _timer: The threading.Timer object that interrupts main thread when
                 timeout.
+        _use_deadline: bool, whether the caller enforces the timeout by
+                       polling _deadline instead of a timer terminating the
+                       process.
+        _deadline: float, the time in seconds since the epoch when the test
+                   class times out, or None if no timeout is set. Only used
+                   if _use_deadline is True.
         timeout: A float, the timeout, in seconds, configured for this object.
         include_filer: A list of string, each representing a test case name to
                        include.
@@ -126,8 +139,12 @@ class BaseTestClass(object):
         test_filter: Filter object to filter test names.
         _test_filter_retry: Filter object for retry filtering.
         max_retry_count: int, max number of retries.
+        fast_retry: bool, whether a retry attempt reuses the class-level
+                    fixtures of the previous attempt if the passive heal
+                    check passes.
+        _class_set_up: bool, whether setUpClass has succeeded and
+                       tearDownClass is deferred to a later attempt.
     """
-    _current_record = None
     start_vts_agents = True
 
     def __init__(self, configs):
@@ -143,6 +160,8 @@ class BaseTestClass(object):
         self._interrupted = False
         self._interrupt_lock = threading.Lock()
         self._timer = None
+        self._use_deadline = False
+        self._deadline = None
 
         timeout_milli = self.getUserParam(keys.ConfigKeys.KEY_TEST_TIMEOUT, 0)
         self.timeout = timeout_milli / 1000 if timeout_milli > 0 else _DEFAULT_TEST_TIMEOUT_SECS
@@ -186,6 +205,9 @@ class BaseTestClass(object):
             keys.ConfigKeys.IKEY_RUN_32BIT_ON_64BIT_ABI, default_value=False)
         self.max_retry_count = self.getUserParam(
             keys.ConfigKeys.IKEY_MAX_RETRY_COUNT, default_value=0)
+        self.fast_retry = self.getUserParam(
+            keys.ConfigKeys.IKEY_FAST_RETRY, default_value=False)
+        self._class_set_up = False
 
         self.web = web_utils.WebFeature(self.user_params)
         self.coverage = coverage_utils.CoverageFeature(
@@ -238,6 +260,50 @@ class BaseTestClass(object):
     def __exit__(self, *args):
         self._exec_func(self.cleanUp)
 
+    def _getThreadLocal(self):
+        """Returns the threading.local object of this test class."""
+        return self.__dict__.setdefault("_thread_local", threading.local())
+
+    @property
+    def _current_record(self):
+        """Returns the record of the test executed by the current thread."""
+        return getattr(self._getThreadLocal(), "record", None)
+
+    @_current_record.setter
+    def _current_record(self, record):
+        """Sets the record of the test executed by the current thread."""
+        self._getThreadLocal().record = record
+
+    def _addRecord(self, record):
+        """Adds a test record to self.results.
+
+        If the current thread runs a generated test in parallel, the record
+        is added later by the main thread in the order of the settings.
+
+        Args:
+            record: A records.TestResultRecord object.
+        """
+        pending = getattr(self._getThreadLocal(), "pending", None)
+        if pending is None:
+            self.results.addRecord(record)
+        else:
+            pending.append((self.results.addRecord, record))
+
+    def _removeRecord(self, record):
+        """Removes a test record from self.results.
+
+        If the current thread runs a generated test in parallel, the record
+        is removed later by the main thread in the order of the settings.
+
+        Args:
+            record: A records.TestResultRecord object.
+        """
+        pending = getattr(self._getThreadLocal(), "pending", None)
+        if pending is None:
+            self.results.removeRecord(record)
+        else:
+            pending.append((self.results.removeRecord, record))
+
     def updateTestFilter(self):
         """Updates test filter using include and exclude filters."""
         self.include_filter = list_utils.ExpandItemDelimiters(
@@ -513,6 +579,10 @@ class BaseTestClass(object):
         event = tfi.Begin('_tearDownClass method for test class',
                           tfi.categories.TEST_CLASS_TEARDOWN)
         self.cancelTimeout()
+        if self._use_deadline:
+            # The timeout decorators below don't work outside the main thread.
+            self.resetTimeout(TIMEOUT_SECS_TEARDOWN_CLASS +
+                              TIMEOUT_SECS_LOG_UPLOADING)
 
         event_sub = tfi.Begin('tearDownClass method from test script',
                               tfi.categories.TEST_CLASS_TEARDOWN,
@@ -584,9 +654,27 @@ class BaseTestClass(object):
         logging.info("Test timed out, interrupt")
         utils.stop_current_process(TIMEOUT_SECS_TEARDOWN_CLASS)
 
+    def useDeadline(self):
+        """Lets the caller enforce the timeout of the test class.
+
+        After this call, resetTimeout sets a deadline which the caller reads
+        with getDeadline, instead of starting a timer which terminates the
+        process. This is for a test class which runs in a thread alongside
+        other test classes.
+        """
+        self._use_deadline = True
+
+    def getDeadline(self):
+        """Returns the time in seconds since the epoch when the test class
+        times out, or None if the timeout is cancelled.
+        """
+        return self._deadline
+
     def cancelTimeout(self):
         """Cancels main thread timer."""
-        if hasattr(signal, "SIGALRM"):
+        if self._use_deadline:
+            self._deadline = None
+        elif timeout_utils.CanUseAlarm():
             signal.alarm(0)
         else:
             with self._interrupt_lock:
@@ -608,7 +696,9 @@ class BaseTestClass(object):
             timeout: A float, wait time in seconds before interrupt.
         """
         logging.debug("Start timer with timeout=%ssec.", timeout)
-        if hasattr(signal, "SIGALRM"):
+        if self._use_deadline:
+            self._deadline = time.time() + timeout
+        elif timeout_utils.CanUseAlarm():
             signal.signal(signal.SIGALRM, utils._timeout_handler)
             signal.alarm(int(timeout))
         else:
@@ -628,6 +718,8 @@ class BaseTestClass(object):
         self._current_record = test_record
         if self.web.enabled:
             self.web.AddTestReport(test_record.test_name)
+        for collector in self._GetLogcatCollectors():
+            collector.beginTest(test_record.test_name)
 
     def _setUp(self, test_name):
         """Proxy function to guarantee the base implementation of setUp is
@@ -664,8 +756,24 @@ class BaseTestClass(object):
 
     def _testExit(self):
         """Internal function to be called upon exit of a test."""
+        if self._current_record:
+            for collector in self._GetLogcatCollectors():
+                collector.endTest(self._current_record.test_name)
         self._current_record = None
 
+    def _GetLogcatCollectors(self):
+        """Gets the logcat collectors of the registered devices.
+
+        Returns:
+            list of LogcatCollector objects which are running.
+        """
+        return [
+            device.adb_logcat_collector
+            for device in getattr(self, _ANDROID_DEVICES, [])
+            if getattr(device, "adb_logcat_collector", None) and
+            device.adb_logcat_collector.isRunning
+        ]
+
     def _tearDown(self, test_name):
         """Proxy function to guarantee the base implementation of tearDown
         is called.
@@ -956,9 +1064,13 @@ class BaseTestClass(object):
             test_func: The test function.
             args: A tuple of params.
             kwargs: Extra kwargs.
+
+        Returns:
+            The records.TestResultRecord object of the test. None if the test
+            is not executed in this retry attempt or is silenced.
         """
         if self._test_filter_retry and not self._test_filter_retry.Filter(test_name):
-            return
+            return None
 
         is_silenced = False
         tr_record = records.TestResultRecord(test_name, self.test_module_name)
@@ -1045,7 +1157,7 @@ class BaseTestClass(object):
             # Suppress test reporting.
             is_silenced = True
             self._exec_procedure_func(self._onSilent)
-            self.results.removeRecord(tr_record)
+            self._removeRecord(tr_record)
             finished = True
         except Exception as e:
             # Exception happened during test.
@@ -1061,7 +1173,7 @@ class BaseTestClass(object):
                 # Test passed.
                 tr_record.testPass()
                 self._exec_procedure_func(self._onPass)
-                return
+                return tr_record
             # Test failed because it didn't return True.
             # This should be removed eventually.
             tr_record.testFail()
@@ -1080,8 +1192,9 @@ class BaseTestClass(object):
                 self._exec_procedure_func(self._onFail)
 
             if not is_silenced:
-                self.results.addRecord(tr_record)
+                self._addRecord(tr_record)
             self._testExit()
+        return None if is_silenced else tr_record
 
     def runGeneratedTests(self,
                           test_func,
@@ -1089,13 +1202,20 @@ class BaseTestClass(object):
                           args=None,
                           kwargs=None,
                           tag="",
-                          name_func=None):
+                          name_func=None,
+                          max_workers=1,
+                          test_timeout=None):
         """Runs generated test cases.
 
         Generated test cases are not written down as functions, but as a list
         of parameter sets. This way we reduce code repetition and improve
         test case scalability.
 
+        If max_workers is greater than 1, the test cases are executed by
+        daemon threads. This is for independent test cases which mostly
+        wait for devices. setUp, tearDown, and test_func must be thread-safe.
+        The results are still added in the order of the settings.
+
         Args:
             test_func: The common logic shared by all these generated test
                        cases. This function should take at least one argument,
@@ -1111,13 +1231,15 @@ class BaseTestClass(object):
                        proper test name. The test name should be shorter than
                        utils.MAX_FILENAME_LEN. Names over the limit will be
                        truncated.
+            max_workers: int, max number of test cases executed concurrently.
+            test_timeout: float, the timeout in seconds of one test case when
+                          max_workers is greater than 1. None means no limit.
 
         Returns:
             A list of settings that did not pass.
         """
         args = args or ()
         kwargs = kwargs or {}
-        failed_settings = []
 
         def GenerateTestName(setting):
             test_name = "{} {}".format(tag, setting)
@@ -1134,24 +1256,140 @@ class BaseTestClass(object):
 
             return test_name
 
-        for setting in settings:
-            test_name = GenerateTestName(setting)
-
+        test_names = [GenerateTestName(setting) for setting in settings]
+        for test_name in test_names:
             tr_record = records.TestResultRecord(test_name, self.test_module_name)
-            self.results.requested.append(tr_record)
+            self.results.requestRecord(tr_record)
 
-        for setting in settings:
-            test_name = GenerateTestName(setting)
-            previous_success_cnt = len(self.results.passed)
+        if max_workers > 1 and (self.web.enabled or self.systrace.enabled):
+            logging.warning("Cannot run generated tests in parallel with web "
+                            "or systrace enabled.")
+            max_workers = 1
 
-            event_exec = tfi.Begin('BaseTest execOneTest method for generated tests',
-                                   enable_logging=False)
-            self.execOneTest(test_name, test_func, (setting, ) + args, **kwargs)
-            event_exec.End()
-            if len(self.results.passed) - previous_success_cnt != 1:
-                failed_settings.append(setting)
+        if max_workers > 1:
+            tr_records = self._runGeneratedTestsInParallel(
+                test_func, settings, test_names, args, kwargs, max_workers,
+                test_timeout)
+        else:
+            tr_records = []
+            for setting, test_name in zip(settings, test_names):
+                event_exec = tfi.Begin('BaseTest execOneTest method for generated tests',
+                                       enable_logging=False)
+                tr_records.append(self.execOneTest(
+                    test_name, test_func, (setting, ) + args, **kwargs))
+                event_exec.End()
+
+        return [
+            setting for setting, tr_record in zip(settings, tr_records)
+            if tr_record is None or
+            tr_record.result != records.TestResultEnums.TEST_RESULT_PASS
+        ]
+
+    def _runGeneratedTestsInParallel(self, test_func, settings, test_names,
+                                     args, kwargs, max_workers, test_timeout):
+        """Executes generated test cases in daemon threads.
+
+        A worker thread keeps its result operations in a thread-local list.
+        The main thread applies the lists in the order of the settings, so
+        self.results is only modified by the main thread.
+
+        The main thread waits for the test cases instead of using SIGALRM,
+        which only works in the main thread. A test case which exceeds
+        test_timeout is recorded as an error. Its thread keeps running, but
+        as a daemon thread it does not block the interpreter exit. After the
+        results are collected or an abort signal is raised, the workers do
+        not start more test cases.
 
-        return failed_settings
+        Args:
+            test_func: The common logic shared by all these generated test
+                       cases.
+            settings: A list of parameter sets.
+            test_names: A list of strings, the names of the test cases.
+            args: Tuple of additional position args to be passed to test_func.
+            kwargs: Dict of additional keyword args to be passed to test_func.
+            max_workers: int, max number of threads.
+            test_timeout: float, the timeout in seconds of one test case, or
+                          None.
+
+        Returns:
+            A list of records.TestResultRecord objects or None, in the order
+            of the settings.
+
+        Raises:
+            The abort signal raised by a test case, after the results of the
+            previous test cases are added.
+        """
+        count = len(settings)
+        start_times = {}
+        # (record, pending operations, exc_info) of the finished test cases.
+        outcomes = {}
+        done_events = [threading.Event() for _ in range(count)]
+        next_index = [0]
+        index_lock = threading.Lock()
+        stopped = threading.Event()
+
+        def _Execute(index):
+            start_times[index] = time.time()
+            local = self._getThreadLocal()
+            local.pending = []
+            try:
+                tr_record = self.execOneTest(test_names[index], test_func,
+                                             (settings[index], ) + args,
+                                             **kwargs)
+                outcomes[index] = (tr_record, local.pending, None)
+            except Exception:
+                outcomes[index] = (None, local.pending, sys.exc_info())
+            finally:
+                local.pending = None
+                done_events[index].set()
+
+        def _Work():
+            while not stopped.is_set():
+                with index_lock:
+                    index = next_index[0]
+                    if index >= count:
+                        return
+                    next_index[0] += 1
+                _Execute(index)
+
+        for worker_index in range(min(max_workers, count)):
+            worker = threading.Thread(
+                target=_Work, name="GeneratedTest-%d" % worker_index)
+            worker.daemon = True
+            worker.start()
+
+        tr_records = []
+        try:
+            for index in range(count):
+                done = done_events[index]
+                while not done.is_set():
+                    start_time = start_times.get(index)
+                    if (test_timeout and start_time is not None and
+                            time.time() - start_time > test_timeout):
+                        break
+                    done.wait(1)
+
+                if not done.is_set():
+                    logging.error("Test %s timed out after %s seconds.",
+                                  test_names[index], test_timeout)
+                    tr_record = records.TestResultRecord(
+                        test_names[index], self.test_module_name)
+                    tr_record.begin_time = int(start_times[index] * 1000)
+                    tr_record.testError(utils.TimeoutError(
+                        "Test timed out after %s seconds." % test_timeout))
+                    self.results.addRecord(tr_record)
+                    tr_records.append(tr_record)
+                    continue
+
+                tr_record, pending, exc_info = outcomes.pop(index)
+                for operation, pending_record in pending:
+                    operation(pending_record)
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                tr_records.append(tr_record)
+        finally:
+            stopped.set()
+        return tr_records
 
     def _exec_func(self, func, *args):
         """Executes a function with exception safeguard.
@@ -1180,15 +1418,45 @@ class BaseTestClass(object):
         """Finds all the function names that match the test case naming
         convention in this class.
 
+        The names defined by the class and its bases are found once per
+        class. The attributes of this object are checked on every call.
+
         Returns:
             A list of strings, each is a test case name.
         """
-        test_names = []
-        for name in dir(self):
+        test_names = set(self._getClassTestNames(type(self)))
+        for name, value in vars(self).items():
             if name.startswith(STR_TEST) or name.startswith(STR_GENERATE):
-                attr_func = getattr(self, name)
-                if hasattr(attr_func, "__call__"):
-                    test_names.append(name)
+                if hasattr(value, "__call__"):
+                    test_names.add(name)
+                else:
+                    test_names.discard(name)
+        return sorted(test_names)
+
+    @staticmethod
+    def _getClassTestNames(test_cls):
+        """Finds the callable test attributes of a class and its bases.
+
+        Args:
+            test_cls: A subclass of BaseTestClass.
+
+        Returns:
+            A frozenset of strings, the test case names.
+        """
+        with _class_test_names_lock:
+            test_names = _class_test_names.get(test_cls)
+        if test_names is not None:
+            return test_names
+        candidates = set()
+        for klass in inspect.getmro(test_cls):
+            candidates.update(
+                name for name in vars(klass)
+                if name.startswith(STR_TEST) or name.startswith(STR_GENERATE))
+        test_names = frozenset(
+            name for name in candidates
+            if hasattr(getattr(test_cls, name), "__call__"))
+        with _class_test_names_lock:
+            _class_test_names[test_cls] = test_names
         return test_names
 
     def _get_test_funcs(self, test_names):
@@ -1303,14 +1571,33 @@ class BaseTestClass(object):
     def runTestsWithRetry(self, tests):
         """Run tests with retry and collect test results.
 
+        In fast retry mode, an attempt keeps the class-level fixtures of the
+        previous attempt if the passive heal check passes, so that only the
+        failed tests are run again without tearDownClass and setUpClass.
+        Otherwise, the fixtures are torn down and the devices are healed.
+
+        The overhead of every attempt before its tests run, i.e., healing,
+        tearing down, and setting up, is recorded as an instrumentation event.
+
         Args:
             tests: A list of tests to be run.
         """
         for count in range(self.max_retry_count + 1):
+            event_overhead = tfi.Begin(
+                'BaseTest run attempt %s overhead' % (count + 1),
+                tfi.categories.TEST_CLASS_SETUP)
+            reuse_class = False
             if count:
-                if not self.Heal():
+                reuse_class = self._class_set_up and self.Heal(passive=True)
+                if self._class_set_up and not reuse_class:
+                    logging.info('Passive heal check failed. Tearing down '
+                                 'the class before retry.')
+                    self._class_set_up = False
+                    self._exec_func(self._tearDownClass)
+                if not reuse_class and not self.Heal():
                     logging.error('Self heal failed. '
                                   'Some error is not recoverable within time constraint.')
+                    event_overhead.Remove('Self heal failed.')
                     return
 
                 include_filter = map(lambda item: item.test_name,
@@ -1330,7 +1617,8 @@ class BaseTestClass(object):
             self._is_final_run = count == self.max_retry_count
 
             try:
-                self._runTests(tests)
+                self._runTests(tests, reuse_class=reuse_class,
+                               event_overhead=event_overhead)
             except Exception as e:
                 if self._is_final_run:
                     raise e
@@ -1338,14 +1626,17 @@ class BaseTestClass(object):
             if self._is_final_run:
                 break
 
-    def _runTests(self, tests):
+    def _runTests(self, tests, reuse_class=False, event_overhead=None):
         """Run tests and collect test results.
 
         Args:
             tests: A list of tests to be run.
+            reuse_class: bool, whether to skip setUpClass because the
+                         fixtures of the previous attempt are kept.
+            event_overhead: Event object which is ended before the tests run.
         """
         # Setup for the class with retry.
-        for i in xrange(_SETUP_RETRY_NUMBER):
+        for i in xrange(0 if reuse_class else _SETUP_RETRY_NUMBER):
             setup_done = False
             caught_exception = None
             try:
@@ -1365,6 +1656,8 @@ class BaseTestClass(object):
                                            caught_exception)
                     self._exec_func(self._tearDownClass)
                     self._is_final_run = True
+                    if event_overhead:
+                        event_overhead.Remove('Failed to set up class.')
                     return
                 else:
                     # restart services before retry setup.
@@ -1372,6 +1665,9 @@ class BaseTestClass(object):
                         logging.info("restarting service on device %s", device.serial)
                         device.stopServices()
                         device.startServices()
+        self._class_set_up = True
+        if event_overhead:
+            event_overhead.End()
 
         class_error = None
         # Run tests in order.
@@ -1429,7 +1725,11 @@ class BaseTestClass(object):
             if class_error and self._is_final_run:
                 self.results.failClass(self.test_module_name, class_error)
 
-            self._exec_func(self._tearDownClass)
+            if self.fast_retry and not self._is_final_run and not class_error:
+                logging.info("Keeping the class set up for retry.")
+            else:
+                self._class_set_up = False
+                self._exec_func(self._tearDownClass)
 
             if self._is_final_run:
                 if self.web.enabled:
@@ -1584,9 +1884,21 @@ class BaseTestClass(object):
             logging.error('Failed to create bugreport output directory %s', parent_dir)
             return
 
+        test_name = (self._current_record.test_name
+                     if self._current_record else None)
         for device in self.android_devices:
             if (not device.isAdbLogcatOn) or device.fatal_error:
                 continue
+            collector = getattr(device, "adb_logcat_collector", None)
+            if test_name and collector:
+                # Extracts the log of the current test case from the
+                # collected logcat instead of dumping the device buffers.
+                file_path = os.path.join(
+                    parent_dir, _LOGCAT_FILE_PREFIX + prefix + '_' +
+                    device.serial + _LOGCAT_FILE_EXTENSION)
+                logging.info('Dumping logcat %s...' % file_path)
+                if collector.dumpTest(test_name, file_path) is not None:
+                    continue
             for buffer in LOGCAT_BUFFERS:
                 file_name = (_LOGCAT_FILE_PREFIX
                              + prefix
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from vts.runners.host import asserts
+from vts.runners.host import base_test
+from vts.runners.host import records
+from vts.runners.host import signals
+
+
+class FakeWeb(object):
+    enabled = False
+
+
+class FakeFeature(object):
+    enabled = False
+
+
+class FakeTestClass(base_test.BaseTestClass):
+    """A test class which counts the class fixtures and fails once."""
+
+    def __init__(self, fast_retry, heal_passive=True):
+        self.results = records.TestResult()
+        self.test_module_name = "FakeModule"
+        self.max_retry_count = 2
+        self.fast_retry = fast_retry
+        self.run_as_vts_self_test = False
+        self.web = FakeWeb()
+        self._class_set_up = False
+        self._test_filter_retry = None
+        self._heal_passive = heal_passive
+        self.set_up_count = 0
+        self.tear_down_count = 0
+        self.heal_calls = []
+        self.executed = []
+
+    def _setUpClass(self):
+        self.set_up_count += 1
+        return True
+
+    def _tearDownClass(self):
+        self.tear_down_count += 1
+
+    def Heal(self, passive=False, timeout=900):
+        self.heal_calls.append(passive)
+        return self._heal_passive or not passive
+
+    def execOneTest(self, test_name, test_func, args, **kwargs):
+        record = records.TestResultRecord(test_name, self.test_module_name)
+        record.testBegin()
+        try:
+            self.filterOneTest(test_name)
+        except signals.TestSkip:
+            return
+        self.executed.append(test_name)
+        if test_name == "test_flaky" and self.executed.count(test_name) == 1:
+            record.testFail()
+        else:
+            record.testPass()
+        self.results.addRecord(record)
+
+    def _filterOneTestThroughTestFilter(self, test_name, test_filter=None):
+        pass
+
+    def _filterOneTestThroughAbiBitness(self, test_name):
+        pass
+
+
+_TESTS = [("test_pass", None), ("test_flaky", None)]
+
+
+class BaseTestRetryTest(unittest.TestCase):
+    """Tests the retry modes of BaseTestClass."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = getattr(logging, "log_path", None)
+        logging.log_path = self.temp_dir
+
+    def tearDown(self):
+        """TearDown tasks"""
+        logging.log_path = self.log_path
+        shutil.rmtree(self.temp_dir)
+
+    def testRetry(self):
+        """Tests that a retry sets up the class again by default."""
+        test = FakeTestClass(fast_retry=False)
+        test.runTestsWithRetry(_TESTS)
+        self.assertEqual(test.executed,
+                         ["test_pass", "test_flaky", "test_flaky"])
+        self.assertEqual((test.set_up_count, test.tear_down_count), (2, 2))
+        self.assertEqual(test.heal_calls, [False])
+
+    def testFastRetry(self):
+        """Tests that a fast retry keeps the class set up."""
+        test = FakeTestClass(fast_retry=True)
+        test.runTestsWithRetry(_TESTS)
+        self.assertEqual(test.executed,
+                         ["test_pass", "test_flaky", "test_flaky"])
+        self.assertEqual((test.set_up_count, test.tear_down_count), (1, 1))
+        self.assertEqual(test.heal_calls, [True])
+        self.assertEqual(len(test.results.passed), 2)
+
+    def testFastRetryHealFailed(self):
+        """Tests that a failed passive heal check tears down the class."""
+        test = FakeTestClass(fast_retry=True, heal_passive=False)
+        test.runTestsWithRetry(_TESTS)
+        self.assertEqual((test.set_up_count, test.tear_down_count), (2, 2))
+        self.assertEqual(test.heal_calls, [True, False])
+
+
+class NamedTestClass(base_test.BaseTestClass):
+    """A test class which defines and overrides test attributes."""
+
+    def __init__(self):
+        pass
+
+    def testBase(self):
+        pass
+
+    def generateBase(self):
+        pass
+
+
+class NamedSubTestClass(NamedTestClass):
+    generateBase = None
+    test_data = "data"
+
+    def testSub(self):
+        pass
+
+
+class BaseTestNamesTest(unittest.TestCase):
+    """Tests the discovery of test names."""
+
+    def testGetAllTestNames(self):
+        """Tests inherited, overridden, and instance test attributes."""
+        test = NamedSubTestClass()
+        self.assertEqual(test._get_all_test_names(), ["testBase", "testSub"])
+        test.testDynamic = lambda: None
+        test.testSub = None
+        self.assertEqual(test._get_all_test_names(),
+                         ["testBase", "testDynamic"])
+        self.assertEqual(NamedSubTestClass()._get_all_test_names(),
+                         ["testBase", "testSub"])
+
+
+class GeneratedTestClass(base_test.BaseTestClass):
+    """A test class which runs generated tests without devices."""
+
+    def __init__(self):
+        self.results = records.TestResult()
+        self.test_module_name = "FakeModule"
+        self.web = FakeWeb()
+        self.systrace = FakeFeature()
+        self.collect_tests_only = False
+        self.abi_bitness = None
+        self.skip_on_32bit_abi = False
+        self.skip_on_64bit_abi = False
+        self.run_32bit_on_64bit_abi = False
+        self._is_final_run = True
+        self._test_filter_retry = None
+        self._bug_report_on_failure = False
+        self._logcat_on_failure = False
+        self.test_filter = None
+        self.thread_names = set()
+        self.hang_thread = None
+
+    def Heal(self, passive=False, timeout=900):
+        return True
+
+    def _filterOneTestThroughTestFilter(self, test_name, test_filter=None):
+        pass
+
+    def VerifySetting(self, setting):
+        self.thread_names.add(threading.current_thread().name)
+        if setting == "hang":
+            self.hang_thread = threading.current_thread()
+            time.sleep(2)
+            return
+        time.sleep(0.01 * (setting % 3))
+        self.addTableToResult("setting", [[setting]])
+        asserts.assertTrue(setting % 2, "even setting")
+
+
+class GeneratedTestsTest(unittest.TestCase):
+    """Tests the serial and parallel generated tests."""
+
+    def _Run(self, settings, **kwargs):
+        test = GeneratedTestClass()
+        failed = test.runGeneratedTests(
+            test_func=test.VerifySetting,
+            settings=settings,
+            name_func=lambda setting: "setting_%s" % setting,
+            **kwargs)
+        return test, failed
+
+    def testSerial(self):
+        """Tests the failed settings in serial mode."""
+        test, failed = self._Run(range(6))
+        self.assertEqual(failed, [0, 2, 4])
+        self.assertEqual(len(test.thread_names), 1)
+
+    def testParallel(self):
+        """Tests that parallel results are in the order of the settings."""
+        test, failed = self._Run(range(12), max_workers=4)
+        self.assertEqual(failed, [0, 2, 4, 6, 8, 10])
+        self.assertGreater(len(test.thread_names), 1)
+        self.assertEqual(
+            [record.test_name for record in test.results.executed],
+            ["setting_%s" % setting for setting in range(12)])
+        self.assertEqual(
+            [record.tables["setting"] for record in test.results.executed],
+            [[[setting]] for setting in range(12)])
+
+    def testParallelTimeout(self):
+        """Tests that a hanging test times out without SIGALRM."""
+        test, failed = self._Run([1, "hang", 3], max_workers=2,
+                                 test_timeout=0.5)
+        self.assertEqual(failed, ["hang"])
+        self.assertEqual(
+            [record.result for record in test.results.executed],
+            [records.TestResultEnums.TEST_RESULT_PASS,
+             records.TestResultEnums.TEST_RESULT_ERROR,
+             records.TestResultEnums.TEST_RESULT_PASS])
+        self.assertTrue(test.hang_thread.daemon)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -39,6 +39,10 @@ class ConfigKeys(object):
 
     # Keys for base test.
     IKEY_MAX_RETRY_COUNT = "max_retry_count"
+    IKEY_FAST_RETRY = "fast_retry"
+    IKEY_TEST_SHARDING = "test_sharding"
+    IKEY_TEST_DURATION_FILES = "test_duration_files"
+    IKEY_TEST_MODULE_INDEX_FILE = "test_module_index_file"
 
     # Keys for binary tests
     IKEY_BINARY_TEST_SOURCE = "binary_test_source"
@@ -48,6 +52,11 @@ class ConfigKeys(object):
     IKEY_BINARY_TEST_LD_LIBRARY_PATH = "binary_test_ld_library_path"
     IKEY_NATIVE_SERVER_PROCESS_NAME = "native_server_process_name"
     IKEY_GTEST_BATCH_MODE = "gtest_batch_mode"
+    IKEY_GTEST_BATCH_SHARD_COUNT = "gtest_batch_shard_count"
+    IKEY_GTEST_BATCH_MAX_PARALLEL = "gtest_batch_max_parallel"
+    IKEY_GTEST_BATCH_CPU_AFFINITY = "gtest_batch_cpu_affinity"
+    IKEY_GTEST_DURATION_FILE = "gtest_duration_file"
+    IKEY_GTEST_LIST_CACHE_DIR = "gtest_list_cache_dir"
 
     # @Deprecated use IKEY_DISABLE_FRAMEWORK
     IKEY_BINARY_TEST_DISABLE_FRAMEWORK = "binary_test_disable_framework"
@@ -84,6 +93,7 @@ class ConfigKeys(object):
     IKEY_BUILD_ALIAS = "build_alias"
     IKEY_API_LEVEL = "api_level"
     IKEY_SERIAL = "serial"
+    IKEY_PERSISTENT_ADB_SHELL = "persistent_adb_shell"
 
     # Keys for web
     IKEY_ENABLE_WEB = "enable_web"
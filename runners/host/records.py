@@ -17,6 +17,8 @@ from __builtin__ import property
 """This module is where all the record definitions and record containers live.
 """
 
+import collections
+import itertools
 import json
 import logging
 import pprint
@@ -214,10 +216,75 @@ class TestResultRecord(object):
         return json.dumps(self.getDict())
 
 
+# The names of the record lists of TestResult.
+_RECORD_LIST_NAMES = ("requested", "failed", "executed", "passed", "skipped",
+                      "error")
+
+
+class RecordListView(object):
+    """A read-only list view of the records in one list of TestResult.
+
+    Length, iteration, and truth value take constant time per record.
+    Indexing and slicing copy the records to a list.
+    """
+
+    def __init__(self, records):
+        self._records = records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __nonzero__(self):
+        return bool(self._records)
+
+    __bool__ = __nonzero__
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _RecordListProperty(list_name):
+    """Creates the property of a record list of TestResult.
+
+    Args:
+        list_name: string, one of _RECORD_LIST_NAMES.
+
+    Returns:
+        A property which gets a RecordListView and sets a list.
+    """
+    return property(
+        lambda self: RecordListView(self._lists[list_name]),
+        lambda self, records: self._setList(list_name, records))
+
+
 class TestResult(object):
     """A class that contains metrics of a test run.
 
-    This class is essentially a container of TestResultRecord objects.
+    This class is essentially a container of TestResultRecord objects. The
+    records are indexed by the full name of the test case, so that adding,
+    removing, and looking up a record do not scan the lists.
 
     Attributes:
         self.requested: A list of records for tests requested by user.
@@ -226,24 +293,97 @@ class TestResult(object):
         self.passed: A list of records for tests passed.
         self.skipped: A list of records for tests skipped.
         self.error: A list of records for tests with error result token.
+        The six lists are read-only RecordListView objects. They can be
+        replaced by assigning a list.
         self.class_errors: A list of strings, the errors that occurred during
                             class setup.
         self._test_module_name: A string, test module's name.
         self._test_module_timestamp: An integer, test module's execution start
                                      timestamp.
+        self._lists: A dict of list name to an OrderedDict which maps a
+                     sequence number to a record.
+        self._index: A dict of test case full name to a list of (list name,
+                     sequence number) tuples.
+        self._sequence: An iterator of the sequence numbers.
+        self._stream: A ResultStreamWriter object which the records are
+                      written to when they are added, or None.
     """
 
     def __init__(self):
-        self.requested = []
-        self.failed = []
-        self.executed = []
-        self.passed = []
-        self.skipped = []
-        self.error = []
+        self._lists = dict(
+            (name, collections.OrderedDict()) for name in _RECORD_LIST_NAMES)
+        self._index = collections.defaultdict(list)
+        self._sequence = itertools.count()
         self._test_module_name = None
         self._test_module_timestamp = None
+        self._stream = None
         self.class_errors = []
 
+    def _append(self, list_name, record):
+        """Appends a record to a list.
+
+        Args:
+            list_name: string, one of _RECORD_LIST_NAMES.
+            record: A TestResultRecord object.
+        """
+        sequence = next(self._sequence)
+        self._lists[list_name][sequence] = record
+        self._index[record.fullname].append((list_name, sequence))
+
+    def setStream(self, stream):
+        """Sets the stream which the added records are written to.
+
+        Args:
+            stream: A result_stream.ResultStreamWriter object, or None.
+        """
+        self._stream = stream
+
+    def _streamRecord(self, record):
+        """Writes a record to the stream if any.
+
+        Args:
+            record: A TestResultRecord object.
+        """
+        if self._stream is not None:
+            self._stream.writeRecord(record)
+
+    def _setList(self, list_name, records):
+        """Replaces the records of a list.
+
+        Args:
+            list_name: string, one of _RECORD_LIST_NAMES.
+            records: An iterable of TestResultRecord objects.
+        """
+        records = list(records)
+        for sequence, record in self._lists[list_name].items():
+            entries = self._index[record.fullname]
+            entries.remove((list_name, sequence))
+            if not entries:
+                del self._index[record.fullname]
+        self._lists[list_name].clear()
+        for record in records:
+            self._append(list_name, record)
+
+    def _hasRecord(self, list_name, record):
+        """Checks whether a list contains the same test case as a record.
+
+        Args:
+            list_name: string, one of _RECORD_LIST_NAMES.
+            record: A TestResultRecord object.
+
+        Returns:
+            True if the list contains the test case, False otherwise.
+        """
+        return any(name == list_name
+                   for name, _ in self._index.get(record.fullname, []))
+
+    requested = _RecordListProperty("requested")
+    failed = _RecordListProperty("failed")
+    executed = _RecordListProperty("executed")
+    passed = _RecordListProperty("passed")
+    skipped = _RecordListProperty("skipped")
+    error = _RecordListProperty("error")
+
     def __add__(self, r):
         """Overrides '+' operator for TestResult class.
 
@@ -261,33 +401,31 @@ class TestResult(object):
                             (r, type(r)))
         r.reportNonExecutedRecord()
         sum_result = TestResult()
-        for name in sum_result.__dict__:
-            if name.startswith("_test_module"):
-                l_value = getattr(self, name)
-                r_value = getattr(r, name)
-                if l_value is None and r_value is None:
-                    continue
-                elif l_value is None and r_value is not None:
-                    value = r_value
-                elif l_value is not None and r_value is None:
+        for name in ("_test_module_name", "_test_module_timestamp"):
+            l_value = getattr(self, name)
+            r_value = getattr(r, name)
+            if l_value is None and r_value is None:
+                continue
+            elif l_value is None and r_value is not None:
+                value = r_value
+            elif l_value is not None and r_value is None:
+                value = l_value
+            else:
+                if name == "_test_module_name":
+                    if l_value != r_value:
+                        raise TypeError("_test_module_name is different.")
                     value = l_value
                 else:
-                    if name == "_test_module_name":
-                        if l_value != r_value:
-                            raise TypeError("_test_module_name is different.")
+                    if int(l_value) < int(r_value):
                         value = l_value
-                    elif name == "_test_module_timestamp":
-                        if int(l_value) < int(r_value):
-                            value = l_value
-                        else:
-                            value = r_value
                     else:
-                        raise TypeError("unknown _test_module* attribute.")
-                setattr(sum_result, name, value)
-            else:
-                l_value = list(getattr(self, name))
-                r_value = list(getattr(r, name))
-                setattr(sum_result, name, l_value + r_value)
+                        value = r_value
+            setattr(sum_result, name, value)
+        for name in _RECORD_LIST_NAMES:
+            for record in itertools.chain(self._lists[name].values(),
+                                          r._lists[name].values()):
+                sum_result._append(name, record)
+        sum_result.class_errors = self.class_errors + r.class_errors
         return sum_result
 
     def getNonPassingRecords(self, non_executed=True, failed=True, skipped=False, error=True):
@@ -301,26 +439,16 @@ class TestResult(object):
             error: bool, whether to include error results
         """
         return ((self.getNonExecutedRecords() if non_executed else [])
-            + (self.failed if failed else [])
-            + (self.skipped if skipped else [])
-            + (self.error if error else []))
+            + (list(self.failed) if failed else [])
+            + (list(self.skipped) if skipped else [])
+            + (list(self.error) if error else []))
 
     def getNonExecutedRecords(self):
         """Returns a list of records that were requested but not executed."""
-        res = []
-
-        for requested in self.requested:
-            found = False
-
-            for executed in self.executed:
-                if requested.isSameTestCase(executed):
-                    found = True
-                    break
-
-            if not found:
-                res.append(requested)
-
-        return res
+        return [
+            requested for requested in self.requested
+            if not self._hasRecord("executed", requested)
+        ]
 
     def reportNonExecutedRecord(self):
         """Check and report any requested tests that did not finish.
@@ -332,7 +460,16 @@ class TestResult(object):
             requested.testBegin()
             requested.testError(
                 "Unknown error: test case requested but not executed.")
-            self.error.append(requested)
+            self._append("error", requested)
+            self._streamRecord(requested)
+
+    def requestRecord(self, record):
+        """Appends a test record to the requested list.
+
+        Args:
+            record: A test record object to add.
+        """
+        self._append("requested", record)
 
     def removeRecord(self, record, remove_requested=True):
         """Remove a test record from test results.
@@ -346,19 +483,8 @@ class TestResult(object):
             remove_requested: bool, whether to remove the test case from requested
                               list as well.
         """
-        lists = [
-            self.requested, self.failed, self.executed, self.passed,
-            self.skipped, self.error
-        ]
-
-        for l in lists:
-            indexToRemove = []
-            for idx in range(len(l)):
-                if l[idx].isSameTestCase(record):
-                    indexToRemove.append(idx)
-
-            for idx in reversed(indexToRemove):
-                del l[idx]
+        for list_name, sequence in self._index.pop(record.fullname, []):
+            del self._lists[list_name][sequence]
 
     def addRecord(self, record):
         """Adds a test record to test results.
@@ -370,15 +496,16 @@ class TestResult(object):
         """
         self.removeRecord(record, remove_requested=False)
 
-        self.executed.append(record)
+        self._append("executed", record)
         if record.result == TestResultEnums.TEST_RESULT_FAIL:
-            self.failed.append(record)
+            self._append("failed", record)
         elif record.result == TestResultEnums.TEST_RESULT_SKIP:
-            self.skipped.append(record)
+            self._append("skipped", record)
         elif record.result == TestResultEnums.TEST_RESULT_PASS:
-            self.passed.append(record)
+            self._append("passed", record)
         else:
-            self.error.append(record)
+            self._append("error", record)
+        self._streamRecord(record)
 
     def setTestModuleKeys(self, name, start_timestamp):
         """Sets the test module's name and start_timestamp."""
@@ -406,8 +533,9 @@ class TestResult(object):
         record = TestResultRecord("setup_class", class_name)
         record.testBegin()
         record.testPass(e)
-        self.executed.append(record)
-        self.passed.append(record)
+        self._append("executed", record)
+        self._append("passed", record)
+        self._streamRecord(record)
 
     def skipClass(self, class_name, reason):
         """Add a record to indicate all test cases in the class are skipped.
@@ -419,8 +547,9 @@ class TestResult(object):
         record = TestResultRecord("skip_class", class_name)
         record.testBegin()
         record.testSkip(signals.TestSkip(reason))
-        self.executed.append(record)
-        self.skipped.append(record)
+        self._append("executed", record)
+        self._append("skipped", record)
+        self._streamRecord(record)
 
     def jsonString(self):
         """Converts this test result to a string in json format.
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import time
+import unittest
+
+from vts.runners.host import records
+
+_BENCHMARK_SIZES = (1000, 10000, 100000)
+
+
+def _CreateRecord(name, result=None, class_name="Module"):
+    """Creates a record which ends with a result."""
+    record = records.TestResultRecord(name, class_name)
+    record.testBegin()
+    if result == records.TestResultEnums.TEST_RESULT_PASS:
+        record.testPass()
+    elif result == records.TestResultEnums.TEST_RESULT_FAIL:
+        record.testFail()
+    elif result == records.TestResultEnums.TEST_RESULT_SKIP:
+        record.testSkip()
+    elif result == records.TestResultEnums.TEST_RESULT_ERROR:
+        record.testError()
+    return record
+
+
+class TestResultTest(unittest.TestCase):
+    """Tests the indexed record lists of TestResult."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.result = records.TestResult()
+        self.result.requested = [_CreateRecord("test%d" % i) for i in range(4)]
+
+    def testAddRecord(self):
+        """Tests that a record replaces the records of the same test case."""
+        self.result.addRecord(
+            _CreateRecord("test0", records.TestResultEnums.TEST_RESULT_FAIL))
+        retry = _CreateRecord("test0", records.TestResultEnums.TEST_RESULT_PASS)
+        self.result.addRecord(retry)
+        self.result.addRecord(
+            _CreateRecord("test1", records.TestResultEnums.TEST_RESULT_SKIP))
+
+        self.assertEqual(list(self.result.executed)[0], retry)
+        self.assertEqual(len(self.result.executed), 2)
+        self.assertEqual(self.result.passed, [retry])
+        self.assertFalse(self.result.failed)
+        self.assertEqual(len(self.result.skipped), 1)
+        self.assertEqual([r.test_name for r in self.result.requested],
+                         ["test2", "test3"])
+        self.assertEqual(self.result.summaryDict(), {
+            "Requested": 2,
+            "Executed": 2,
+            "Passed": 1,
+            "Failed": 0,
+            "Skipped": 1,
+            "Error": 0,
+        })
+
+    def testNonExecutedRecords(self):
+        """Tests the requested records which are not executed."""
+        self.result.requestRecord(_CreateRecord("test4"))
+        self.result.addRecord(
+            _CreateRecord("test2", records.TestResultEnums.TEST_RESULT_PASS))
+        self.assertEqual(
+            [r.test_name for r in self.result.getNonExecutedRecords()],
+            ["test0", "test1", "test3", "test4"])
+
+        self.result.reportNonExecutedRecord()
+        self.assertEqual(len(self.result.error), 4)
+        self.assertEqual(
+            [r.test_name for r in self.result.getNonPassingRecords()],
+            ["test0", "test1", "test3", "test4"] * 2)
+
+    def testListViews(self):
+        """Tests that the lists are read-only views and can be replaced."""
+        requested = self.result.requested
+        with self.assertRaises(AttributeError):
+            requested.append(_CreateRecord("test4"))
+        self.assertEqual(requested[1:3], list(self.result.requested)[1:3])
+        self.assertEqual(len(requested + [None]), 5)
+        self.assertEqual(len([None] + requested), 5)
+
+        self.result.requested = [_CreateRecord("other")]
+        self.assertEqual(len(requested), 1)
+        self.assertEqual(self.result.getNonExecutedRecords()[0].test_name,
+                         "other")
+
+    def testAdd(self):
+        """Tests that the sum of two results contains the records of both."""
+        other = records.TestResult()
+        other.setTestModuleKeys("Module", 1)
+        other.addRecord(
+            _CreateRecord("test0", records.TestResultEnums.TEST_RESULT_PASS))
+        other.requestRecord(_CreateRecord("test9"))
+        self.result.class_errors.append("error")
+        self.result.addRecord(
+            _CreateRecord("test1", records.TestResultEnums.TEST_RESULT_FAIL))
+
+        total = self.result + other
+        self.assertEqual(total.testModuleDict(), {
+            "Name": "Module",
+            "Timestamp": 1
+        })
+        self.assertEqual([r.test_name for r in total.executed],
+                         ["test1", "test0"])
+        self.assertEqual([r.test_name for r in total.error], ["test9"])
+        self.assertEqual(len(total.requested), 4)
+        self.assertEqual(total.class_errors, ["error"])
+
+    def testScalingBenchmark(self):
+        """Measures the bookkeeping time of large modules."""
+        results = (records.TestResultEnums.TEST_RESULT_PASS,
+                   records.TestResultEnums.TEST_RESULT_FAIL)
+        for size in _BENCHMARK_SIZES:
+            requested = [_CreateRecord("test%d" % i) for i in range(size)]
+            executed = [
+                _CreateRecord("test%d" % i, results[i % 2])
+                for i in range(size)
+            ]
+            start = time.time()
+            result = records.TestResult()
+            result.requested = requested
+            for i, record in enumerate(executed):
+                result.addRecord(record)
+                if i % 100 == 0:
+                    result.progressStr
+            non_executed = result.getNonExecutedRecords()
+            summary = result.summaryDict()
+            elapsed = time.time() - start
+            self.assertEqual(non_executed, [])
+            self.assertEqual(summary["Executed"], size)
+            logging.info("%d records: %.3f s, %.2f us per record", size,
+                         elapsed, elapsed * 1e6 / size)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
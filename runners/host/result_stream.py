@@ -0,0 +1,268 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Streams test records to a JSON lines file.
+
+Every line of the stream is a compact JSON object. A record line is
+{"Record": <record dict>}, and the last line of a finished run is
+{"Summary": ..., "TestModule": ..., "Class Errors": ...}. Each line is
+flushed when it is written, so the records survive an aborted run.
+
+The stream can be converted to the format of test_run_summary.json by
+    python -m vts.runners.host.result_stream <stream file> <json file>
+"""
+
+import collections
+import json
+import logging
+import sys
+import threading
+
+from vts.runners.host.records import TestResultEnums
+
+# The file name of the stream in the log directory.
+RESULT_STREAM_FILE_NAME = "test_run_results.jsonl"
+
+# The keys of the stream lines.
+_RECORD_KEY = "Record"
+_SUMMARY_KEY = "Summary"
+_TEST_MODULE_KEY = "TestModule"
+_CLASS_ERRORS_KEY = "Class Errors"
+_RESULTS_KEY = "Results"
+
+# The separators of the legacy format, which is dumped with indent=4.
+_LEGACY_INDENT = " " * 4
+_LEGACY_ITEM_SEPARATOR = ", \n"
+
+# The summary keys and the record results they count.
+_SUMMARY_RESULTS = (
+    ("Passed", TestResultEnums.TEST_RESULT_PASS),
+    ("Failed", TestResultEnums.TEST_RESULT_FAIL),
+    ("Skipped", TestResultEnums.TEST_RESULT_SKIP),
+)
+
+
+class ResultStreamWriter(object):
+    """Appends test records and the summary to a JSON lines file.
+
+    Attributes:
+        path: string, the path to the stream file.
+        _file: file object, the stream. None if closed.
+        _lock: threading.Lock, serializes the lines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+
+    def writeRecord(self, record):
+        """Writes a test record.
+
+        Args:
+            record: A TestResultRecord object.
+        """
+        self._writeLine({_RECORD_KEY: record.getDict()})
+
+    def writeSummary(self, result):
+        """Writes the summary of a test run.
+
+        Args:
+            result: A TestResult object of the whole test run.
+        """
+        self._writeLine({
+            _SUMMARY_KEY: result.summaryDict(),
+            _TEST_MODULE_KEY: result.testModuleDict(),
+            _CLASS_ERRORS_KEY: ("\n".join(result.class_errors)
+                                if result.class_errors else None),
+        })
+
+    def close(self):
+        """Closes the stream."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _writeLine(self, obj):
+        """Writes an object as one line and flushes the file.
+
+        Args:
+            obj: A JSON serializable object.
+        """
+        try:
+            line = json.dumps(obj, separators=(",", ":"), sort_keys=True)
+        except (TypeError, ValueError) as e:
+            logging.error("Cannot stream test result: %s", e)
+            return
+        with self._lock:
+            if self._file is None:
+                logging.error("Result stream %s is closed.", self.path)
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+def _ReadStreamIndex(stream_file):
+    """Indexes the records of a stream.
+
+    A later record of a test case replaces the earlier one and moves to the
+    end, as TestResult.addRecord does. A line which cannot be decoded, such as
+    the last line of an aborted run, is skipped.
+
+    Args:
+        stream_file: file object, the stream.
+
+    Returns:
+        A tuple of an OrderedDict and a dict. The OrderedDict maps (test class,
+        test name) to the offset of the record line. The dict is the summary
+        line, or None if the run did not finish.
+    """
+    offsets = collections.OrderedDict()
+    summary = None
+    while True:
+        offset = stream_file.tell()
+        line = stream_file.readline()
+        if not line:
+            break
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            logging.warning("Skip malformed line at offset %d.", offset)
+            continue
+        if _RECORD_KEY in obj:
+            record = obj[_RECORD_KEY]
+            key = (record.get(TestResultEnums.RECORD_CLASS),
+                   record.get(TestResultEnums.RECORD_NAME))
+            offsets.pop(key, None)
+            offsets[key] = offset
+        elif _SUMMARY_KEY in obj:
+            summary = obj
+    return offsets, summary
+
+
+def _CountResults(records):
+    """Counts the results of records for a run which did not finish.
+
+    Args:
+        records: An iterable of record dicts.
+
+    Returns:
+        A dict in the format of TestResult.summaryDict.
+    """
+    counts = dict((key, 0) for key, _ in _SUMMARY_RESULTS)
+    total = 0
+    for record in records:
+        total += 1
+        for key, result in _SUMMARY_RESULTS:
+            if record.get(TestResultEnums.RECORD_RESULT) == result:
+                counts[key] += 1
+                break
+    counts["Requested"] = total
+    counts["Executed"] = total
+    counts["Error"] = total - sum(counts[key] for key, _ in _SUMMARY_RESULTS)
+    return counts
+
+
+def _DumpLegacy(obj, level):
+    """Dumps an object as a nested value of the legacy format.
+
+    Args:
+        obj: A JSON serializable object.
+        level: int, the indentation level of the value.
+
+    Returns:
+        string, the indented JSON.
+    """
+    text = json.dumps(obj, indent=4, sort_keys=True)
+    return text.replace("\n", "\n" + _LEGACY_INDENT * level)
+
+
+def WriteLegacyJson(stream_path, json_path):
+    """Converts a stream to the format of test_run_summary.json.
+
+    The records are read one at a time, so that only the offsets of the
+    records are kept in memory. If the stream has no summary, the summary is
+    counted from the records.
+
+    Args:
+        stream_path: string, the path to the stream file.
+        json_path: string, the path to the output json file.
+
+    Returns:
+        A dict, the summary of the test run.
+    """
+    with open(stream_path, "rb") as stream_file:
+        offsets, summary = _ReadStreamIndex(stream_file)
+
+        def _IterRecords():
+            for offset in offsets.itervalues():
+                stream_file.seek(offset)
+                yield json.loads(stream_file.readline())[_RECORD_KEY]
+
+        if summary is None:
+            logging.warning("%s has no summary. The run did not finish.",
+                            stream_path)
+            summary = {
+                _SUMMARY_KEY: _CountResults(_IterRecords()),
+                _TEST_MODULE_KEY: {"Name": None, "Timestamp": None},
+                _CLASS_ERRORS_KEY: None,
+            }
+
+        with open(json_path, "w") as json_file:
+            json_file.write("{\n")
+            json_file.write('%s"%s": %s%s' % (
+                _LEGACY_INDENT, _CLASS_ERRORS_KEY,
+                _DumpLegacy(summary.get(_CLASS_ERRORS_KEY), 1),
+                _LEGACY_ITEM_SEPARATOR))
+            json_file.write('%s"%s": [' % (_LEGACY_INDENT, _RESULTS_KEY))
+            separator = "\n"
+            for record in _IterRecords():
+                json_file.write(separator + _LEGACY_INDENT * 2 +
+                                _DumpLegacy(record, 2))
+                separator = _LEGACY_ITEM_SEPARATOR
+            if offsets:
+                json_file.write("\n" + _LEGACY_INDENT)
+            json_file.write("]" + _LEGACY_ITEM_SEPARATOR)
+            json_file.write('%s"%s": %s%s' % (
+                _LEGACY_INDENT, _SUMMARY_KEY,
+                _DumpLegacy(summary[_SUMMARY_KEY], 1),
+                _LEGACY_ITEM_SEPARATOR))
+            json_file.write('%s"%s": %s\n}' % (
+                _LEGACY_INDENT, _TEST_MODULE_KEY,
+                _DumpLegacy(summary.get(_TEST_MODULE_KEY), 1)))
+    return summary[_SUMMARY_KEY]
+
+
+def main(argv):
+    """Converts a stream file given in the arguments.
+
+    Args:
+        argv: list of strings, the command line arguments.
+
+    Returns:
+        int, the exit code.
+    """
+    if len(argv) != 3:
+        print("Usage: python -m vts.runners.host.result_stream "
+              "<stream file> <json file>")
+        return 1
+    summary = WriteLegacyJson(argv[1], argv[2])
+    print(", ".join("%s %d" % item for item in sorted(summary.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
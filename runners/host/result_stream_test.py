@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from vts.runners.host import records
+from vts.runners.host import result_stream
+
+
+def _CreateRecord(name, result):
+    """Creates a record which ends with a result."""
+    record = records.TestResultRecord(name, "Module")
+    record.testBegin()
+    if result == records.TestResultEnums.TEST_RESULT_PASS:
+        record.testPass()
+    elif result == records.TestResultEnums.TEST_RESULT_FAIL:
+        record.testFail()
+    else:
+        record.testError()
+    return record
+
+
+class ResultStreamTest(unittest.TestCase):
+    """Tests streaming TestResult and converting to the legacy format."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.stream_path = os.path.join(self.temp_dir, "results.jsonl")
+        self.json_path = os.path.join(self.temp_dir, "summary.json")
+        self.writer = result_stream.ResultStreamWriter(self.stream_path)
+        self.result = records.TestResult()
+        self.result.setStream(self.writer)
+        self.result.setTestModuleKeys("Module", 1234)
+
+    def tearDown(self):
+        """TearDown tasks"""
+        self.writer.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _ReadLines(self):
+        with open(self.stream_path) as stream_file:
+            return stream_file.readlines()
+
+    def _RunTests(self):
+        """Adds records of a run with a retry and a non-executed test."""
+        for name in ("test_a", "test_b", "test_c"):
+            self.result.requestRecord(records.TestResultRecord(name, "Module"))
+        self.result.passClass("Module")
+        self.result.addRecord(
+            _CreateRecord("test_a", records.TestResultEnums.TEST_RESULT_FAIL))
+        self.result.addRecord(
+            _CreateRecord("test_b", records.TestResultEnums.TEST_RESULT_PASS))
+        self.result.addRecord(
+            _CreateRecord("test_a", records.TestResultEnums.TEST_RESULT_PASS))
+        self.result.failClass("Module", "error")
+
+    def testRecordsAreFlushed(self):
+        """Tests that every added record is a line before the run ends."""
+        self._RunTests()
+        lines = self._ReadLines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            json.loads(lines[-1])["Record"][
+                records.TestResultEnums.RECORD_RESULT],
+            records.TestResultEnums.TEST_RESULT_PASS)
+
+    def testLegacyJson(self):
+        """Tests that the conversion equals TestResult.jsonString."""
+        self._RunTests()
+        self.result.reportNonExecutedRecord()
+        self.writer.writeSummary(self.result)
+        self.writer.close()
+        summary = result_stream.WriteLegacyJson(self.stream_path,
+                                                self.json_path)
+        self.assertEqual(summary, self.result.summaryDict())
+        with open(self.json_path) as json_file:
+            self.assertEqual(json_file.read(), self.result.jsonString())
+
+    def testEmptyLegacyJson(self):
+        """Tests the conversion of a run without records."""
+        self.writer.writeSummary(self.result)
+        result_stream.WriteLegacyJson(self.stream_path, self.json_path)
+        with open(self.json_path) as json_file:
+            self.assertEqual(json_file.read(), self.result.jsonString())
+
+    def testAbortedRun(self):
+        """Tests the conversion of a stream without summary."""
+        self._RunTests()
+        self.writer.close()
+        with open(self.stream_path, "a") as stream_file:
+            stream_file.write('{"Record": {"Test Na')
+        summary = result_stream.WriteLegacyJson(self.stream_path,
+                                                self.json_path)
+        self.assertEqual(summary["Executed"], 3)
+        self.assertEqual(summary["Passed"], 3)
+        with open(self.json_path) as json_file:
+            legacy = json.load(json_file)
+        self.assertEqual(
+            [r[records.TestResultEnums.RECORD_NAME] for r in legacy["Results"]],
+            ["setup_class", "test_b", "test_a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,6 +34,9 @@ TARGET_PORT = os.environ.get("TARGET_PORT", None)
 _DEFAULT_SOCKET_TIMEOUT_SECS = 1800
 _SOCKET_CONN_TIMEOUT_SECS = 60
 _SOCKET_CONN_RETRY_NUMBER = 5
+# The first and the max intervals between two connection attempts.
+_SOCKET_CONN_RETRY_INITIAL_INTERVAL_SECS = 0.1
+_SOCKET_CONN_RETRY_MAX_INTERVAL_SECS = 1
 COMMAND_TYPE_NAME = {
     1: "LIST_HALS",
     2: "SET_HOST_INFO",
@@ -149,12 +152,14 @@ class VtsTcpClient(object):
                     (ip, command_port), timeout=connection_timeout)
                 break
             except socket.error as e:
-                # Wait a bit and retry.
                 logging.exception("Connect failed %s", e)
-                time.sleep(1)
                 if i + 1 == retry:
                     raise errors.VtsTcpClientCreationError(
                         "Couldn't connect to %s:%s" % (ip, command_port))
+                # Wait a bit and retry with exponential backoff.
+                time.sleep(
+                    min(_SOCKET_CONN_RETRY_INITIAL_INTERVAL_SECS * 2**i,
+                        _SOCKET_CONN_RETRY_MAX_INTERVAL_SECS))
         self.channel = self.connection.makefile(mode="brw")
 
         if callback_port is not None:
@@ -507,6 +512,35 @@ class VtsTcpClient(object):
         return self.CheckResourceCommandResponse(
             resp, getattr(resp, "hidl_memory_response", None))
 
+    def SendHidlMemoryRequests(self, messages):
+        """Sends pipelined commands to the hidl_memory driver.
+
+        All commands are sent before any response is received, so the agent
+        can process a command while the next one is in transit. The agent
+        handles the commands of a session in order, thus the responses are
+        returned in the order of the messages.
+        Callers should bound the number of messages, because a large number of
+        large commands can fill the socket buffers of both sides.
+
+        Args:
+            messages: list of HidlMemoryRequestMessage, the requests to send.
+
+        Returns:
+            list of HidlMemoryResponseMessage, one for each request message.
+            An element is None if the response of that request is missing.
+        """
+        for message in messages:
+            self.SendCommand(
+                SysMsg_pb2.VTS_HIDL_MEMORY_COMMAND,
+                hidl_memory_request=message)
+        responses = []
+        for _ in messages:
+            resp = self.RecvResponse()
+            responses.append(
+                self.CheckResourceCommandResponse(
+                    resp, getattr(resp, "hidl_memory_response", None)))
+        return responses
+
     def SendHidlHandleRequest(self, message):
         """Sends a command to the hidl_handle driver and receives the response.
 
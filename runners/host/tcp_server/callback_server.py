@@ -14,17 +14,31 @@
 # limitations under the License.
 #
 
+import collections
+import concurrent.futures
+import itertools
 import logging
 import socket
 import socketserver
 import threading
+import time
 
 from vts.runners.host import errors
 from vts.proto import AndroidSystemControlMessage_pb2 as SysMsg
 from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
+from vts.utils.python.mirror import converter_compiler
 from vts.utils.python.mirror import pb2py
 
 _functions = dict()  # Dictionary to hold function pointers
+_arg_converters = dict()  # Dictionary to hold compiled arg converters
+
+# Overflow policies of a full CallbackDispatcher queue.
+OVERFLOW_BLOCK = "block"  # Wait until a queued callback starts.
+OVERFLOW_DROP_NEWEST = "drop_newest"  # Reject the new callback.
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # Drop the oldest queued callback.
+
+_DEFAULT_MAX_WORKERS = 4
+_DEFAULT_MAX_QUEUE_SIZE = 1024
 
 
 class CallbackServerError(errors.VtsError):
@@ -43,7 +57,7 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
         """
         header = self.rfile.readline().strip()
         try:
-            len = int(header)
+            message_length = int(header)
         except ValueError:
             if header:
                 logging.exception("Unable to convert '%s' into an integer, which "
@@ -54,7 +68,7 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
                 logging.error('CallbackRequestHandler received empty message header. Skipping...')
                 return
         # Read the request message.
-        received_data = self.rfile.read(len)
+        received_data = self.rfile.read(message_length)
         logging.debug("Received callback message: %s", received_data)
         request_message = SysMsg.AndroidSystemCallbackRequestMessage()
         request_message.ParseFromString(received_data)
@@ -62,13 +76,23 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
         response_message = SysMsg.AndroidSystemCallbackResponseMessage()
         # Call the appropriate callback function and construct the response
         # message.
-        if request_message.id in _functions:
+        callback_func = _functions.get(request_message.id)
+        if callback_func is not None:
             callback_args = []
-            for arg in request_message.arg:
-                callback_args.append(pb2py.Convert(arg))
+            converters = _arg_converters.get(request_message.id)
+            if converters and len(converters) == len(request_message.arg):
+                for converter, arg in zip(converters, request_message.arg):
+                    callback_args.append(converter(arg))
+            else:
+                for arg in request_message.arg:
+                    callback_args.append(pb2py.Convert(arg))
             args = tuple(callback_args)
-            _functions[request_message.id](*args)
-            response_message.response_code = SysMsg.SUCCESS
+            task = self.server.dispatcher.Submit(request_message.id,
+                                                 callback_func, args)
+            if task.Wait():
+                response_message.response_code = SysMsg.SUCCESS
+            else:
+                response_message.response_code = SysMsg.FAIL
         else:
             logging.error("Callback function ID %s is not registered!",
                           request_message.id)
@@ -80,19 +104,290 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
         self.request.sendall(message)
 
 
+class _CallbackTask(object):
+    """A callback function call queued in a CallbackDispatcher.
+
+    Attributes:
+        func_id: string, the ID of the callback function.
+        func: the callback function.
+        args: tuple, the args of the callback function.
+        sequence: int, the order in which the task is submitted.
+        submit_time: float, the time when the task is submitted.
+        succeeded: bool, whether the callback function returns normally.
+                   False if the task is dropped.
+        _done: threading.Event, set when the task is finished or dropped.
+    """
+
+    def __init__(self, func_id, func, args, sequence):
+        self.func_id = func_id
+        self.func = func
+        self.args = args
+        self.sequence = sequence
+        self.submit_time = time.time()
+        self.succeeded = False
+        self._done = threading.Event()
+
+    def Finish(self, succeeded):
+        """Marks the task as finished.
+
+        Args:
+            succeeded: bool, whether the callback function returns normally.
+        """
+        self.succeeded = succeeded
+        self._done.set()
+
+    def Wait(self, timeout=None):
+        """Waits for the task to finish.
+
+        Args:
+            timeout: float, max number of seconds to wait. None means no limit.
+
+        Returns:
+            bool, whether the callback function returns normally.
+        """
+        self._done.wait(timeout)
+        return self.succeeded
+
+
+class CallbackDispatcher(object):
+    """Runs callback functions in a bounded thread pool.
+
+    Callbacks of different IDs run concurrently, while callbacks of the same
+    ID run one at a time in the order they are submitted. At most
+    max_queue_size callbacks can wait to run; when the queue is full,
+    overflow_policy decides whether Submit blocks, rejects the new callback,
+    or drops the oldest queued one.
+
+    Attributes:
+        _max_workers: int, number of threads running callback functions.
+        _max_queue_size: int, max number of queued callbacks.
+        _overflow_policy: string, one of the OVERFLOW_* policies.
+        _executor: concurrent.futures.ThreadPoolExecutor, the worker pool.
+                   None if the dispatcher is not started.
+        _cond: threading.Condition, protects the following attributes and is
+               notified when a queued callback starts.
+        _pending: dict, callback ID to collections.deque of queued
+                  _CallbackTask.
+        _running_ids: set, the IDs whose callbacks are running or scheduled
+                      on the executor.
+        _queue_depth: int, number of queued callbacks.
+        _sequence: iterator, generates the task sequence numbers.
+        _stats: dict, the counters returned by GetStats().
+    """
+
+    def __init__(self,
+                 max_workers=_DEFAULT_MAX_WORKERS,
+                 max_queue_size=_DEFAULT_MAX_QUEUE_SIZE,
+                 overflow_policy=OVERFLOW_BLOCK):
+        if overflow_policy not in (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST,
+                                   OVERFLOW_DROP_OLDEST):
+            raise CallbackServerError(
+                "Unknown overflow policy %s" % overflow_policy)
+        self._max_workers = max_workers
+        self._max_queue_size = max_queue_size
+        self._overflow_policy = overflow_policy
+        self._executor = None
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._running_ids = set()
+        self._queue_depth = 0
+        self._sequence = itertools.count()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "total_wait_time": 0.0,
+            "total_handler_time": 0.0,
+            "max_handler_time": 0.0,
+        }
+
+    def Start(self):
+        """Starts the worker threads."""
+        with self._cond:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self._max_workers)
+
+    def Stop(self):
+        """Stops the worker threads and drops the queued callbacks."""
+        with self._cond:
+            executor = self._executor
+            self._executor = None
+            for tasks in self._pending.values():
+                for task in tasks:
+                    self._stats["dropped"] += 1
+                    task.Finish(False)
+            self._pending.clear()
+            self._queue_depth = 0
+            self._stats["queue_depth"] = 0
+            self._cond.notify_all()
+        if executor:
+            executor.shutdown(wait=False)
+
+    def Submit(self, func_id, func, args):
+        """Queues a callback function call.
+
+        Args:
+            func_id: string, the ID of the callback function.
+            func: the callback function.
+            args: tuple, the args of the callback function.
+
+        Returns:
+            _CallbackTask, which can be waited for. The task is finished
+            as failed if it is dropped.
+        """
+        with self._cond:
+            task = _CallbackTask(func_id, func, args, next(self._sequence))
+            self._stats["submitted"] += 1
+            if self._executor is None:
+                logging.error("Callback dispatcher is not started.")
+                self._stats["dropped"] += 1
+                task.Finish(False)
+                return task
+
+            while self._queue_depth >= self._max_queue_size:
+                if self._overflow_policy == OVERFLOW_BLOCK:
+                    self._cond.wait()
+                    if self._executor is None:
+                        self._stats["dropped"] += 1
+                        task.Finish(False)
+                        return task
+                    continue
+                if self._overflow_policy == OVERFLOW_DROP_NEWEST:
+                    dropped_task = task
+                else:
+                    dropped_task = self._PopOldestTask()
+                logging.warning("Callback queue is full. Dropping callback %s.",
+                                dropped_task.func_id)
+                self._stats["dropped"] += 1
+                dropped_task.Finish(False)
+                if dropped_task is task:
+                    return task
+
+            self._pending.setdefault(func_id, collections.deque()).append(task)
+            self._queue_depth += 1
+            self._stats["queue_depth"] = self._queue_depth
+            self._stats["max_queue_depth"] = max(
+                self._stats["max_queue_depth"], self._queue_depth)
+            if func_id not in self._running_ids:
+                self._running_ids.add(func_id)
+                self._executor.submit(self._RunNext, func_id)
+        return task
+
+    def GetStats(self):
+        """Gets the counters of the dispatcher.
+
+        Returns:
+            dict, including the numbers of submitted, completed, failed, and
+            dropped callbacks, the current and max queue depth, and the total
+            queue wait time, total and max handler time in seconds.
+        """
+        with self._cond:
+            return dict(self._stats)
+
+    def _PopOldestTask(self):
+        """Removes the oldest queued task. Must be called with _cond held.
+
+        Returns:
+            _CallbackTask, the removed task.
+        """
+        tasks = min((tasks for tasks in self._pending.values() if tasks),
+                    key=lambda tasks: tasks[0].sequence)
+        self._queue_depth -= 1
+        self._stats["queue_depth"] = self._queue_depth
+        return tasks.popleft()
+
+    def _RunNext(self, func_id):
+        """Runs the next queued callback of an ID in a worker thread.
+
+        Only one _RunNext of an ID is scheduled at any time. It schedules
+        itself again if more callbacks of the ID are queued, so that a busy ID
+        does not occupy a worker while other IDs are waiting.
+
+        Args:
+            func_id: string, the ID of the callback function.
+        """
+        with self._cond:
+            tasks = self._pending.get(func_id)
+            if not tasks:
+                self._pending.pop(func_id, None)
+                self._running_ids.discard(func_id)
+                return
+            task = tasks.popleft()
+            self._queue_depth -= 1
+            self._stats["queue_depth"] = self._queue_depth
+            self._cond.notify()
+
+        start_time = time.time()
+        succeeded = False
+        try:
+            task.func(*task.args)
+            succeeded = True
+        except Exception as e:
+            logging.exception("Callback function %s raised %s", func_id, e)
+        handler_time = time.time() - start_time
+
+        with self._cond:
+            self._stats["completed" if succeeded else "failed"] += 1
+            self._stats["total_wait_time"] += start_time - task.submit_time
+            self._stats["total_handler_time"] += handler_time
+            self._stats["max_handler_time"] = max(
+                self._stats["max_handler_time"], handler_time)
+            if self._pending.get(func_id) and self._executor is not None:
+                self._executor.submit(self._RunNext, func_id)
+            else:
+                self._pending.pop(func_id, None)
+                self._running_ids.discard(func_id)
+        task.Finish(succeeded)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """A TCPServer that reads each connection in a thread.
+
+    Attributes:
+        dispatcher: CallbackDispatcher, runs the callback functions.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, dispatcher):
+        socketserver.TCPServer.__init__(self, server_address, handler_class)
+        self.dispatcher = dispatcher
+
+
 class CallbackServer(object):
     """This class creates TCPServer in separate thread.
 
+    Each callback connection is read in its own thread, and the callback
+    functions are run by a CallbackDispatcher, so that a slow callback
+    function does not block the callbacks of other IDs.
+
     Attributes:
         _server: an instance of socketserver.TCPServer.
+        _dispatcher: CallbackDispatcher, runs the callback functions.
         _port: this variable maintains the port number used in creating
                the server connection.
         _ip: variable to hold the IP Address of the host.
         _hostname: IP Address to which initial connection is made.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 max_workers=_DEFAULT_MAX_WORKERS,
+                 max_queue_size=_DEFAULT_MAX_QUEUE_SIZE,
+                 overflow_policy=OVERFLOW_BLOCK):
+        """Initializes the server.
+
+        Args:
+            max_workers: int, number of threads running callback functions.
+            max_queue_size: int, max number of callbacks waiting to run.
+            overflow_policy: string, one of the OVERFLOW_* policies, the
+                             action when a callback arrives at a full queue.
+        """
         self._server = None
+        self._dispatcher = CallbackDispatcher(max_workers, max_queue_size,
+                                              overflow_policy)
         self._port = 0  # Port 0 means to select an arbitrary unused port
         self._ip = ""  # Used to store the IP address for the server
         self._hostname = "localhost"  # IP address to which initial connection is made
@@ -128,11 +423,28 @@ class CallbackServer(object):
         """
         try:
             _functions.pop(func_id)
+            _arg_converters.pop(func_id, None)
         except KeyError:
             raise CallbackServerError(
                 "Can't remove function ID '%s', which is not registered." %
                 func_id)
 
+    def SetCallbackArgSpecs(self, func_id, arg_specs):
+        """Sets the specs of the args of a callback function.
+
+        The args of the callback function are converted to Python values by
+        converters compiled from the specs, instead of pb2py.Convert.
+
+        Args:
+            func_id: string, the ID of a registered callback function.
+            arg_specs: list of VariableSpecificationMessage, the specs of the
+                       callback function args.
+        """
+        _arg_converters[func_id] = [
+            converter_compiler.CompilePb2Py(arg_spec)
+            for arg_spec in arg_specs
+        ]
+
     def GetCallbackId(self, callback_func):
         """Get ID of the callback function.  Registers a callback function.
 
@@ -161,9 +473,11 @@ class CallbackServer(object):
             CallbackServerError is raised if the server fails to start.
         """
         try:
-            self._server = socketserver.TCPServer(
-                (self._hostname, port), CallbackRequestHandler)
+            self._server = _ThreadingTCPServer(
+                (self._hostname, port), CallbackRequestHandler,
+                self._dispatcher)
             self._ip, self._port = self._server.server_address
+            self._dispatcher.Start()
 
             # Start a thread with the server.
             # Each request will be handled in a child thread.
@@ -184,6 +498,15 @@ class CallbackServer(object):
         """
         self._server.shutdown()
         self._server.server_close()
+        self._dispatcher.Stop()
+
+    def GetStats(self):
+        """Gets the counters of the callback dispatcher.
+
+        Returns:
+            dict, see CallbackDispatcher.GetStats().
+        """
+        return self._dispatcher.GetStats()
 
     @property
     def ip(self):
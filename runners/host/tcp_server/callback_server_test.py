@@ -15,6 +15,7 @@
 #
 
 import socket
+import threading
 import unittest
 import logging
 import errno
@@ -22,6 +23,7 @@ from socket import error as socket_error
 
 from vts.runners.host import errors
 from vts.proto import AndroidSystemControlMessage_pb2 as SysMsg_pb2
+from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
 from vts.runners.host.tcp_server import callback_server
 
 HOST, PORT = "localhost", 0
@@ -86,7 +88,7 @@ class TestMethods(unittest.TestCase):
         finally:
             sock.close()
 
-    def ConnectToServer(self, func_id):
+    def ConnectToServer(self, func_id, args=()):
         """This function creates a connection to TCP server and sends/receives
             message.
 
@@ -94,6 +96,8 @@ class TestMethods(unittest.TestCase):
             func_id: This is the unique key corresponding to a function and
                 also the id field of the request_message that we send to the
                 server.
+            args: list of VariableSpecificationMessage, the args of the
+                callback function.
 
         Returns:
             response_message: The object that the TCP host returns.
@@ -104,6 +108,8 @@ class TestMethods(unittest.TestCase):
         # This object is sent to the TCP host
         request_message = SysMsg_pb2.AndroidSystemCallbackRequestMessage()
         request_message.id = func_id
+        for arg in args:
+            request_message.arg.add().CopyFrom(arg)
 
         #  The response in string format that we receive from host
         received_message = ""
@@ -148,6 +154,25 @@ class TestMethods(unittest.TestCase):
         self.TestNormalCase()
         self.TestDoRegisterCallback()
 
+    def testCallbackArgSpecs(self):
+        """Tests a callback whose args are converted by the arg specs."""
+        received_args = []
+        func_id = self._callback_server.RegisterCallback(
+            lambda *args: received_args.extend(args))
+
+        arg_spec = CompSpecMsg.VariableSpecificationMessage()
+        arg_spec.type = CompSpecMsg.TYPE_SCALAR
+        arg_spec.scalar_type = "int32_t"
+        self._callback_server.SetCallbackArgSpecs(func_id, [arg_spec])
+
+        arg = CompSpecMsg.VariableSpecificationMessage()
+        arg.CopyFrom(arg_spec)
+        arg.scalar_value.int32_t = 7
+        response_message = self.ConnectToServer(func_id, [arg])
+
+        self.assertEqual(response_message.response_code, SysMsg_pb2.SUCCESS)
+        self.assertEqual(received_args, [7])
+
     def TestNormalCase(self):
         """Tests the normal request to TCPServer.
 
@@ -222,5 +247,91 @@ class TestMethods(unittest.TestCase):
         # also confirm the error message
         self.assertEqual(response_message.response_code, SysMsg_pb2.FAIL)
 
+
+class CallbackDispatcherTest(unittest.TestCase):
+    """Tests the ordering and the overflow policies of CallbackDispatcher."""
+
+    def CreateDispatcher(self, *args, **kwargs):
+        """Creates and starts a dispatcher which is stopped on cleanup."""
+        dispatcher = callback_server.CallbackDispatcher(*args, **kwargs)
+        dispatcher.Start()
+        self.addCleanup(dispatcher.Stop)
+        return dispatcher
+
+    def testOrderPerId(self):
+        """Tests that callbacks of the same ID run in submission order."""
+        dispatcher = self.CreateDispatcher(max_workers=4)
+        results = []
+        tasks = [dispatcher.Submit("0", results.append, (i, ))
+                 for i in range(50)]
+        self.assertTrue(all(task.Wait(5) for task in tasks))
+        self.assertEqual(results, list(range(50)))
+        stats = dispatcher.GetStats()
+        self.assertEqual(stats["completed"], 50)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def testSlowCallbackDoesNotBlockOtherIds(self):
+        """Tests that a blocked callback does not delay other IDs."""
+        dispatcher = self.CreateDispatcher(max_workers=2)
+        release = threading.Event()
+        slow_task = dispatcher.Submit("0", release.wait, (5, ))
+        fast_task = dispatcher.Submit("1", lambda: None, ())
+        self.assertTrue(fast_task.Wait(5))
+        release.set()
+        self.assertTrue(slow_task.Wait(5))
+
+    def testCallbackException(self):
+        """Tests that an exception fails the task but not the dispatcher."""
+        dispatcher = self.CreateDispatcher()
+        self.assertFalse(dispatcher.Submit("0", int, ("x", )).Wait(5))
+        self.assertTrue(dispatcher.Submit("0", int, ("1", )).Wait(5))
+        self.assertEqual(dispatcher.GetStats()["failed"], 1)
+
+    def DoOverflow(self, overflow_policy):
+        """Submits callbacks to a full queue of a dispatcher.
+
+        Args:
+            overflow_policy: string, the overflow policy of the dispatcher.
+
+        Returns:
+            list of _CallbackTask, the three tasks queued behind a blocked
+            callback in a queue of size two.
+        """
+        dispatcher = self.CreateDispatcher(
+            max_workers=1, max_queue_size=2, overflow_policy=overflow_policy)
+        release = threading.Event()
+        started = threading.Event()
+
+        def Block():
+            started.set()
+            release.wait(5)
+
+        blocking_task = dispatcher.Submit("0", Block, ())
+        self.assertTrue(started.wait(5))
+        tasks = [dispatcher.Submit("0", lambda: None, ()) for _ in range(2)]
+        tasks.append(dispatcher.Submit("1", lambda: None, ()))
+        self.assertEqual(dispatcher.GetStats()["dropped"], 1)
+        release.set()
+        self.assertTrue(blocking_task.Wait(5))
+        return tasks
+
+    def testDropNewest(self):
+        """Tests that a full queue rejects the new callback."""
+        tasks = self.DoOverflow(callback_server.OVERFLOW_DROP_NEWEST)
+        self.assertEqual([task.Wait(5) for task in tasks],
+                         [True, True, False])
+
+    def testDropOldest(self):
+        """Tests that a full queue drops the oldest queued callback."""
+        tasks = self.DoOverflow(callback_server.OVERFLOW_DROP_OLDEST)
+        self.assertEqual([task.Wait(5) for task in tasks],
+                         [False, True, True])
+
+    def testUnknownPolicy(self):
+        """Tests that an unknown overflow policy is rejected."""
+        with self.assertRaises(callback_server.CallbackServerError):
+            callback_server.CallbackDispatcher(overflow_policy="unknown")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,167 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Indexes the classes defined in test files without importing them.
+
+The index maps a file to the names of the classes it defines, so that a
+test runner only imports the files of the requested test classes. It is
+saved as a json file, and an entry is parsed again only if the size or
+mtime of its file changes.
+"""
+
+import ast
+import json
+import logging
+import os
+import tempfile
+
+# The default path of the index file.
+DEFAULT_INDEX_FILE = os.path.join(tempfile.gettempdir(),
+                                  "vts_test_module_index.json")
+# The version of the entry format, which invalidates older index files.
+_INDEX_VERSION = 1
+
+
+def ParseTestFile(path):
+    """Finds the classes which a file defines at module level.
+
+    Args:
+        path: string, the path to a python file.
+
+    Returns:
+        list of strings, the class names. None if the file cannot be
+        parsed.
+    """
+    try:
+        with open(path) as test_file:
+            tree = ast.parse(test_file.read(), path)
+    except (IOError, SyntaxError, TypeError) as e:
+        logging.debug("Cannot parse %s: %s", path, e)
+        return None
+    return [node.name for node in tree.body if isinstance(node, ast.ClassDef)]
+
+
+class TestModuleIndex(object):
+    """Keeps the index of test files in a json file.
+
+    Attributes:
+        path: string, the path to the json file.
+        _entries: dict of file path to a dict which has the size and mtime of
+                  the file, and the classes which the file defines.
+        _dirty: bool, whether _entries has changed since loaded.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_FILE):
+        self.path = path
+        self._entries = self._Load()
+        self._dirty = False
+
+    def _Load(self):
+        """Loads the json file.
+
+        Returns:
+            dict, the entries in the file. Empty if the file is not readable.
+        """
+        try:
+            with open(self.path) as index_file:
+                content = json.load(index_file)
+        except (IOError, ValueError) as e:
+            logging.debug("Cannot load test module index: %s", e)
+            return {}
+        if (not isinstance(content, dict) or
+                content.get("version") != _INDEX_VERSION):
+            return {}
+        return content.get("files", {})
+
+    def GetClasses(self, path):
+        """Gets the classes which a file defines.
+
+        The file is parsed if it is not indexed or has changed.
+
+        Args:
+            path: string, the path to a python file.
+
+        Returns:
+            list of strings, the class names. None if the file cannot be
+            parsed.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logging.debug("Cannot stat %s: %s", path, e)
+            return None
+        entry = self._entries.get(path)
+        if (entry and entry.get("size") == stat.st_size and
+                entry.get("mtime") == stat.st_mtime):
+            return entry.get("classes")
+        classes = ParseTestFile(path)
+        self._entries[path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "classes": classes,
+        }
+        self._dirty = True
+        return classes
+
+    def FindFiles(self, file_list, class_names):
+        """Finds the files which define the given classes.
+
+        Args:
+            file_list: list of (directory, module name, extension) tuples,
+                       the test files returned by utils.find_files.
+            class_names: set of strings, the class names to find.
+
+        Returns:
+            list of the tuples in file_list which define any of the classes,
+            or cannot be parsed. None if a class is not found in any file,
+            e.g., a class imported from elsewhere, which means that all
+            files have to be imported to find the class.
+        """
+        selected = []
+        found = set()
+        for file_info in file_list:
+            directory, name, ext = file_info
+            classes = self.GetClasses(os.path.join(directory, name + ext))
+            if classes is None:
+                selected.append(file_info)
+                continue
+            defined = class_names.intersection(classes)
+            if defined:
+                selected.append(file_info)
+                found.update(defined)
+        if found != class_names:
+            return None
+        return selected
+
+    def Save(self):
+        """Saves the index if it has changed.
+
+        The file is replaced atomically so that concurrent runs never read
+        a partial index.
+        """
+        if not self._dirty:
+            return
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path) or ".")
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump({
+                    "version": _INDEX_VERSION,
+                    "files": self._entries
+                }, temp_file)
+            os.rename(temp_path, self.path)
+            self._dirty = False
+        except (IOError, OSError) as e:
+            logging.warning("Cannot save test module index: %s", e)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from vts.runners.host import keys
+from vts.runners.host import test_module_index
+from vts.runners.host import test_runner
+
+_FIRST_TEST = """
+class IndexFirstTest(object):
+    def testOne(self):
+        pass
+"""
+_SECOND_TEST = """
+from index_first_test import IndexFirstTest as AliasTest
+
+class IndexSecondTest(object):
+    pass
+"""
+_BROKEN_TEST = "class IndexBrokenTest(object:\n"
+
+
+class TestModuleIndexTest(unittest.TestCase):
+    """Tests the index of the classes in test files."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_dir = os.path.join(self.temp_dir, "tests")
+        os.mkdir(self.test_dir)
+        self.index_path = os.path.join(self.temp_dir, "index.json")
+        self._WriteTest("index_first_test", _FIRST_TEST)
+        self._WriteTest("index_second_test", _SECOND_TEST)
+        self.file_list = [(self.test_dir, "index_first_test", ".py"),
+                          (self.test_dir, "index_second_test", ".py")]
+
+    def tearDown(self):
+        """TearDown tasks"""
+        shutil.rmtree(self.temp_dir)
+        for name in ("index_first_test", "index_second_test"):
+            sys.modules.pop(name, None)
+        if self.test_dir in sys.path:
+            sys.path.remove(self.test_dir)
+
+    def _WriteTest(self, name, content, mtime=None):
+        path = os.path.join(self.test_dir, name + ".py")
+        with open(path, "w") as test_file:
+            test_file.write(content)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def testParseTestFile(self):
+        """Tests that only classes defined by a file are found."""
+        self.assertEqual(
+            test_module_index.ParseTestFile(
+                os.path.join(self.test_dir, "index_second_test.py")),
+            ["IndexSecondTest"])
+        path = self._WriteTest("index_broken_test", _BROKEN_TEST)
+        self.assertIsNone(test_module_index.ParseTestFile(path))
+
+    def testFindFiles(self):
+        """Tests the files of classes and the fallback to all files."""
+        index = test_module_index.TestModuleIndex(self.index_path)
+        self.assertEqual(
+            index.FindFiles(self.file_list, set(["IndexSecondTest"])),
+            self.file_list[1:])
+        self.assertIsNone(index.FindFiles(self.file_list, set(["AliasTest"])))
+
+        self._WriteTest("index_broken_test", _BROKEN_TEST)
+        broken = (self.test_dir, "index_broken_test", ".py")
+        self.assertEqual(
+            index.FindFiles(self.file_list + [broken],
+                            set(["IndexFirstTest"])),
+            [self.file_list[0], broken])
+
+    def testInvalidation(self):
+        """Tests that a saved entry is used until its file changes."""
+        index = test_module_index.TestModuleIndex(self.index_path)
+        path = os.path.join(self.test_dir, "index_first_test.py")
+        self.assertEqual(index.GetClasses(path), ["IndexFirstTest"])
+        index.Save()
+
+        index = test_module_index.TestModuleIndex(self.index_path)
+        self._WriteTest("index_first_test", _FIRST_TEST.replace("First",
+                                                                "Other"),
+                        mtime=time.time() + 10)
+        self.assertEqual(index.GetClasses(path), ["IndexOtherTest"])
+
+    def testImportTestModules(self):
+        """Tests that TestRunner only imports the requested modules."""
+        runner = test_runner.TestRunner.__new__(test_runner.TestRunner)
+        runner.test_configs = {
+            keys.ConfigKeys.IKEY_TEST_MODULE_INDEX_FILE: self.index_path
+        }
+        runner.run_list = [("IndexFirstTest", None)]
+        test_classes = runner.importTestModules([self.test_dir])
+        self.assertIn("IndexFirstTest", test_classes)
+        self.assertIn("index_first_test", sys.modules)
+        self.assertNotIn("index_second_test", sys.modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
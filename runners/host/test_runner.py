@@ -15,6 +15,7 @@
 #
 
 from future import standard_library
+from future.utils import raise_
 standard_library.install_aliases()
 
 import copy
@@ -26,15 +27,21 @@ import pkgutil
 import signal
 import sys
 import threading
+import time
 
 from vts.runners.host import base_test
 from vts.runners.host import config_parser
 from vts.runners.host import keys
 from vts.runners.host import logger
 from vts.runners.host import records
+from vts.runners.host import result_stream
 from vts.runners.host import signals
+from vts.runners.host import test_module_index
+from vts.runners.host import test_sharding
 from vts.runners.host import utils
+from vts.utils.python.common import cmd_utils
 from vts.utils.python.common import timeout_utils
+from vts.utils.python.controllers import android_device
 from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
 
 
@@ -67,7 +74,11 @@ def main():
         logging.error("Expected 1 test class per file, found %s (%s).",
                       len(test_classes), test_classes)
         sys.exit(1)
-    test_result = runTestClass(test_classes[0])
+    cmd_utils.AddCommandStatsListener(tfi.RecordCommandStats)
+    try:
+        test_result = runTestClass(test_classes[0])
+    finally:
+        cmd_utils.RemoveCommandStatsListener(tfi.RecordCommandStats)
     event.End()
     tfi.CompileResults()
     return test_result
@@ -153,6 +164,8 @@ class TestRunner(object):
         run_list: A list of tuples specifying what tests to run.
         results: The test result object used to record the results of
                  this test run.
+        result_stream: The ResultStreamWriter object which the records of
+                       the test classes are written to as they are added.
         running: A boolean signifies whether this test run is ongoing or
                  not.
         test_cls_instances: list of test class instances that were executed
@@ -187,6 +200,9 @@ class TestRunner(object):
         self.controller_destructors = {}
         self.run_list = run_list
         self.results = records.TestResult()
+        self.result_stream = result_stream.ResultStreamWriter(
+            os.path.join(self.log_path,
+                         result_stream.RESULT_STREAM_FILE_NAME))
         self.running = False
         self.test_cls_instances = []
 
@@ -200,7 +216,9 @@ class TestRunner(object):
         """Imports test classes from test scripts.
 
         1. Locate all .py files under test paths.
-        2. Import the .py files as modules.
+        2. Import the .py files which define the test classes in the run
+           list according to the module index. If a class is not in the
+           index, import all the .py files.
         3. Find the module members that are test classes.
         4. Categorize the test classes by name.
 
@@ -219,6 +237,19 @@ class TestRunner(object):
             return False
 
         file_list = utils.find_files(test_paths, is_testfile_name)
+        index_path = self.test_configs.get(
+            keys.ConfigKeys.IKEY_TEST_MODULE_INDEX_FILE,
+            test_module_index.DEFAULT_INDEX_FILE)
+        if index_path:
+            index = test_module_index.TestModuleIndex(index_path)
+            selected = index.FindFiles(
+                file_list, set(name for name, _ in self.run_list))
+            index.Save()
+            if selected is None:
+                logging.debug("Test classes not found in the module index. "
+                              "Importing all test modules.")
+            else:
+                file_list = selected
         test_classes = {}
         for path, name, _ in file_list:
             sys.path.append(path)
@@ -393,6 +424,9 @@ class TestRunner(object):
         executed instead. If self.tests is empty as well, no test case in this
         test class will be executed.
 
+        If test sharding is enabled and the test bed has more than one
+        identical device, the test cases are sharded across the devices.
+
         Args:
             test_cls: The test class to be instantiated and executed.
             test_cases: List of test case names to execute within the class.
@@ -402,7 +436,18 @@ class TestRunner(object):
             number of test cases at index 1.
         """
         self.running = True
+        devices = self._getShardDevices(test_cls)
+        if len(devices) > 1:
+            try:
+                self._runTestClassShards(test_cls, test_cases, devices)
+            finally:
+                self.unregisterControllers()
+            return
+
         with test_cls(self.test_run_info) as test_cls_instance:
+            test_cls_instance.results.setStream(self.result_stream)
+            if devices:
+                test_cls_instance.android_devices = devices
             try:
                 if test_cls_instance not in self.test_cls_instances:
                     self.test_cls_instances.append(test_cls_instance)
@@ -410,6 +455,135 @@ class TestRunner(object):
             finally:
                 self.unregisterControllers()
 
+    def _getShardDevices(self, test_cls):
+        """Registers the devices which a test class can be sharded across.
+
+        The devices are identical if they have the same product type as the
+        first device.
+
+        Args:
+            test_cls: The test class to be instantiated and executed.
+
+        Returns:
+            A list of AndroidDevice objects. Empty if sharding is disabled.
+        """
+        if not self.test_configs.get(keys.ConfigKeys.IKEY_TEST_SHARDING,
+                                     False):
+            return []
+        devices = self.registerController(
+            android_device, start_services=test_cls.start_vts_agents)
+        if not devices:
+            return devices
+        product_type = devices[0].product_type
+        identical = [
+            device for device in devices
+            if device.product_type == product_type
+        ]
+        if len(identical) < len(devices):
+            logging.warning("Not sharding across devices of other product "
+                            "types than %s.", product_type)
+        return identical
+
+    def _runTestClassShards(self, test_cls, test_cases, devices):
+        """Runs the test cases of a test class across devices concurrently.
+
+        Every device gets an instance of the test class, which runs a shard
+        of the test cases in a thread. The shards are balanced by the
+        durations in the summaries listed by IKEY_TEST_DURATION_FILES.
+
+        The instances are appended to self.test_cls_instances in shard order,
+        so that stop merges the results in the same order regardless of which
+        shard finishes first.
+
+        A generate* function is one unit of the sharding because the test
+        cases it generates are unknown before it runs.
+
+        The instances don't time out by a signal or a timer, which would stop
+        the whole process. The main thread checks their deadlines instead,
+        and records a class error for a shard which times out without
+        waiting for it any longer.
+
+        Args:
+            test_cls: The test class to be instantiated and executed.
+            test_cases: List of test case names to execute within the class.
+            devices: A list of AndroidDevice objects to shard across.
+
+        Raises:
+            The first exception raised by a shard, in shard order, after all
+            shards finish or time out.
+        """
+        instances = [test_cls(self.test_run_info)]
+        test_module_name = instances[0].test_module_name
+        history = test_sharding.LoadDurations(
+            self.test_configs.get(keys.ConfigKeys.IKEY_TEST_DURATION_FILES,
+                                  []))
+        durations = dict((name, duration)
+                         for (cls_name, name), duration in history.items()
+                         if cls_name == test_module_name)
+        test_names = [name for name, _ in instances[0].getTests(test_cases)]
+        shards = test_sharding.PartitionTestCases(test_names, durations,
+                                                  len(devices))
+        if not shards:
+            # Let the test class report that it has no test case.
+            shards = [test_names]
+        instances.extend(
+            test_cls(self.test_run_info) for _ in range(len(shards) - 1))
+
+        shard_errors = [None] * len(shards)
+        done_events = [threading.Event() for _ in shards]
+
+        def _runShard(index, instance, shard):
+            try:
+                with instance:
+                    instance.run(shard)
+            except Exception:
+                logging.exception("Shard %d of %s failed.", index,
+                                  test_module_name)
+                shard_errors[index] = sys.exc_info()
+            finally:
+                done_events[index].set()
+
+        for index, shard in enumerate(shards):
+            instance = instances[index]
+            instance.android_devices = [devices[index]]
+            instance.results.setStream(self.result_stream)
+            instance.useDeadline()
+            self.test_cls_instances.append(instance)
+            logging.info("Running %d test cases of %s on %s.", len(shard),
+                         test_module_name, devices[index].serial)
+            thread = threading.Thread(
+                target=_runShard,
+                args=(index, instance, shard),
+                name="shard_%d" % index)
+            thread.daemon = True
+            thread.start()
+
+        timed_out = set()
+        pending = list(range(len(shards)))
+        while pending:
+            for index in list(pending):
+                deadline = instances[index].getDeadline()
+                if done_events[index].is_set():
+                    pending.remove(index)
+                elif deadline is not None and time.time() > deadline:
+                    # The shard thread keeps running, but as a daemon thread
+                    # it does not block the interpreter exit.
+                    logging.error("Shard %d of %s on %s timed out.", index,
+                                  test_module_name, devices[index].serial)
+                    pending.remove(index)
+                    timed_out.add(index)
+                    instances[index].results.failClass(
+                        test_module_name,
+                        utils.TimeoutError("Shard on %s timed out." %
+                                           devices[index].serial))
+            if pending:
+                # A timed wait lets the main thread receive KeyboardInterrupt.
+                done_events[pending[0]].wait(1)
+
+        for index, error in enumerate(shard_errors):
+            if error and index not in timed_out:
+                raise_(*error)
+
     def run(self):
         """Executes test cases.
 
@@ -473,6 +647,8 @@ class TestRunner(object):
 
             msg = "\nSummary for test run %s: %s\n" % (self.id,
                                                        self.results.summary())
+            self.result_stream.writeSummary(self.results)
+            self.result_stream.close()
             self._writeResultsJsonString()
             logging.info(msg.strip())
             logger.killTestLogger(logging.getLogger())
@@ -480,7 +656,8 @@ class TestRunner(object):
 
     def _writeResultsJsonString(self):
         """Writes out a json file with the test result info for easy parsing.
+
+        The file is converted from the result stream one record at a time.
         """
         path = os.path.join(self.log_path, "test_run_summary.json")
-        with open(path, 'w') as f:
-            f.write(self.results.jsonString())
+        result_stream.WriteLegacyJson(self.result_stream.path, path)
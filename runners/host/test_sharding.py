@@ -0,0 +1,120 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Shards the test cases of a test class across identical devices.
+
+The test cases are weighted by their durations in the test_run_summary.json
+files of prior runs, and are assigned longest first to the shard with the
+least total duration.
+"""
+
+import heapq
+import json
+import logging
+
+from vts.runners.host.records import TestResultEnums
+
+# The duration of a test case without history, in seconds.
+_DEFAULT_DURATION = 1.0
+
+
+def LoadDurations(summary_paths):
+    """Reads the durations of test cases from test run summaries.
+
+    Args:
+        summary_paths: list of strings, the paths to test_run_summary.json
+                       files. A later file overrides the durations of the
+                       earlier ones.
+
+    Returns:
+        dict of (test class, test name) to the duration in seconds.
+    """
+    durations = {}
+    for path in summary_paths:
+        try:
+            with open(path) as summary_file:
+                results = json.load(summary_file).get("Results", [])
+        except (IOError, ValueError, AttributeError) as e:
+            logging.warning("Cannot load test durations from %s: %s", path, e)
+            continue
+        for record in results:
+            begin_time = record.get(TestResultEnums.RECORD_BEGIN_TIME)
+            end_time = record.get(TestResultEnums.RECORD_END_TIME)
+            if begin_time is None or end_time is None:
+                continue
+            key = (record.get(TestResultEnums.RECORD_CLASS),
+                   record.get(TestResultEnums.RECORD_NAME))
+            # The record times are epoch milliseconds.
+            durations[key] = max(0, end_time - begin_time) / 1000.0
+    return durations
+
+
+def PartitionUnits(units, durations, shard_count):
+    """Splits units of test cases into shards of similar total durations.
+
+    This is the longest-processing-time-first heuristic. A unit is assigned
+    as a whole to the shard with the least total duration, longest unit
+    first. The result only depends on the arguments, so that a rerun with
+    the same history gets the same shards.
+
+    Args:
+        units: list of lists of strings, the test cases to run. The cases
+               of a unit stay in one shard.
+        durations: dict of test name to the duration in seconds. A case
+                   without history counts as the average duration.
+        shard_count: int, max number of shards.
+
+    Returns:
+        list of lists of strings, the non-empty shards. The cases in a shard
+        keep the order of units.
+    """
+    names = [name for unit in units for name in unit]
+    if not names:
+        return []
+    known = [durations[name] for name in names if name in durations]
+    default = sum(known) / len(known) if known else _DEFAULT_DURATION
+
+    weights = [
+        sum(durations.get(name, default) for name in unit) for unit in units
+    ]
+    heap = [(0.0, index) for index in range(min(shard_count, len(units)))]
+    assignment = {}
+    for position in sorted(
+            range(len(units)), key=lambda item: (-weights[item], item)):
+        load, index = heapq.heappop(heap)
+        assignment[position] = index
+        heapq.heappush(heap, (load + weights[position], index))
+
+    shards = [[] for _ in heap]
+    for position, unit in enumerate(units):
+        shards[assignment[position]].extend(unit)
+    return [shard for shard in shards if shard]
+
+
+def PartitionTestCases(test_names, durations, shard_count):
+    """Splits test cases into shards of similar total durations.
+
+    Args:
+        test_names: list of strings, the test cases to run.
+        durations: dict of test name to the duration in seconds. A case
+                   without history counts as the average duration.
+        shard_count: int, max number of shards.
+
+    Returns:
+        list of lists of strings, the non-empty shards. The cases in a shard
+        keep the order of test_names.
+    """
+    return PartitionUnits([[name] for name in test_names], durations,
+                          shard_count)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from vts.runners.host import keys
+from vts.runners.host import records
+from vts.runners.host import signals
+from vts.runners.host import test_runner
+from vts.runners.host import test_sharding
+
+_MODULE_NAME = "FakeModule"
+_TEST_NAMES = ["test_a", "test_b", "test_c", "test_d"]
+
+
+class FakeDevice(object):
+    def __init__(self, serial, product_type="product"):
+        self.serial = serial
+        self.product_type = product_type
+
+
+class FakeTestClass(object):
+    """A test class which passes every test case it runs."""
+
+    start_vts_agents = True
+    abort_test = None
+    hang_test = None
+    hang_event = threading.Event()
+
+    def __init__(self, configs):
+        self.results = records.TestResult()
+        self.test_module_name = _MODULE_NAME
+        self.deadline = None
+
+    def useDeadline(self):
+        pass
+
+    def getDeadline(self):
+        return self.deadline
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def getTests(self, test_names=None):
+        return [(name, None) for name in test_names or _TEST_NAMES]
+
+    def run(self, test_names=None):
+        for name, _ in self.getTests(test_names):
+            if name == self.abort_test:
+                raise signals.TestAbortAll("abort")
+            if name == self.hang_test:
+                self.deadline = time.time()
+                self.hang_event.wait()
+            record = records.TestResultRecord(name, self.test_module_name)
+            record.testBegin()
+            record.testPass()
+            self.results.addRecord(record)
+        return self.results
+
+
+class TestShardingTest(unittest.TestCase):
+    """Tests the duration history and the partition of test cases."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """TearDown tasks"""
+        shutil.rmtree(self.temp_dir)
+
+    def _WriteSummary(self, name, durations):
+        path = os.path.join(self.temp_dir, name)
+        results = [{
+            records.TestResultEnums.RECORD_CLASS: _MODULE_NAME,
+            records.TestResultEnums.RECORD_NAME: test_name,
+            records.TestResultEnums.RECORD_BEGIN_TIME: 1000,
+            records.TestResultEnums.RECORD_END_TIME: 1000 + duration * 1000,
+        } for test_name, duration in durations.items()]
+        with open(path, "w") as summary_file:
+            json.dump({"Results": results}, summary_file)
+        return path
+
+    def testLoadDurations(self):
+        """Tests that later summaries override earlier ones."""
+        first = self._WriteSummary("first.json", {"test_a": 3, "test_b": 1})
+        second = self._WriteSummary("second.json", {"test_a": 5})
+        missing = os.path.join(self.temp_dir, "missing.json")
+        self.assertEqual(
+            test_sharding.LoadDurations([first, missing, second]), {
+                (_MODULE_NAME, "test_a"): 5.0,
+                (_MODULE_NAME, "test_b"): 1.0
+            })
+
+    def testPartitionTestCases(self):
+        """Tests that the longest cases are spread and order is kept."""
+        durations = {"test_a": 1, "test_b": 8, "test_c": 4, "test_d": 3}
+        shards = test_sharding.PartitionTestCases(_TEST_NAMES, durations, 2)
+        self.assertEqual(shards, [["test_b"], ["test_a", "test_c", "test_d"]])
+        self.assertEqual(
+            test_sharding.PartitionTestCases(_TEST_NAMES, durations, 2),
+            shards)
+
+        shards = test_sharding.PartitionTestCases(["test_a", "test_b"], {}, 3)
+        self.assertEqual(shards, [["test_a"], ["test_b"]])
+        self.assertEqual(test_sharding.PartitionTestCases([], {}, 2), [])
+
+    def testPartitionUnits(self):
+        """Tests that the cases of a unit stay in one shard."""
+        units = [["test_a", "test_b"], ["test_c"], ["test_d"]]
+        durations = {"test_a": 1, "test_b": 1, "test_c": 3, "test_d": 1}
+        self.assertEqual(
+            test_sharding.PartitionUnits(units, durations, 2),
+            [["test_c"], ["test_a", "test_b", "test_d"]])
+
+
+class TestRunnerShardTest(unittest.TestCase):
+    """Tests that TestRunner runs shards of a test class on devices."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.devices = [
+            FakeDevice("serial1"), FakeDevice("serial2"),
+            FakeDevice("serial3", "other")
+        ]
+        self.runner = test_runner.TestRunner.__new__(test_runner.TestRunner)
+        self.runner.test_configs = {keys.ConfigKeys.IKEY_TEST_SHARDING: True}
+        self.runner.test_run_info = {}
+        self.runner.test_cls_instances = []
+        self.runner.result_stream = None
+        self.runner.registerController = (
+            lambda module, start_services=True: self.devices)
+        self.runner.unregisterControllers = lambda: None
+
+    def tearDown(self):
+        """TearDown tasks"""
+        FakeTestClass.abort_test = None
+        FakeTestClass.hang_test = None
+        FakeTestClass.hang_event.set()
+
+    def testRunShards(self):
+        """Tests that identical devices run shards and results merge."""
+        self.runner.runTestClass(FakeTestClass)
+        instances = self.runner.test_cls_instances
+        self.assertEqual(len(instances), 2)
+        self.assertEqual([instance.android_devices for instance in instances],
+                         [[self.devices[0]], [self.devices[1]]])
+        result = instances[0].results + instances[1].results
+        self.assertEqual(
+            sorted(record.test_name for record in result.passed),
+            _TEST_NAMES)
+        self.assertEqual([record.test_name for record in result.executed],
+                         ["test_a", "test_c", "test_b", "test_d"])
+
+    def testShardError(self):
+        """Tests that a shard error is raised after all shards finish."""
+        FakeTestClass.abort_test = "test_a"
+        with self.assertRaises(signals.TestAbortAll):
+            self.runner.runTestClass(FakeTestClass)
+        instances = self.runner.test_cls_instances
+        self.assertEqual(
+            [record.test_name for record in instances[1].results.passed],
+            ["test_b", "test_d"])
+
+    def testShardTimeout(self):
+        """Tests that a shard which times out fails only that shard."""
+        FakeTestClass.hang_test = "test_a"
+        FakeTestClass.hang_event.clear()
+        self.runner.runTestClass(FakeTestClass)
+        instances = self.runner.test_cls_instances
+        self.assertEqual(len(instances[0].results.class_errors), 1)
+        self.assertIn("timed out", instances[0].results.class_errors[0])
+        self.assertEqual(instances[1].results.class_errors, [])
+        self.assertEqual(
+            [record.test_name for record in instances[1].results.passed],
+            ["test_b", "test_d"])
+
+    def testShardingDisabled(self):
+        """Tests that one instance runs when sharding is disabled."""
+        self.runner.test_configs = {}
+        self.runner.registerController = None
+        self.runner.runTestClass(FakeTestClass)
+        self.assertEqual(len(self.runner.test_cls_instances), 1)
+        self.assertEqual(len(self.runner.test_cls_instances[0].results.passed),
+                         4)
+
+
+if __name__ == "__main__":
+    unittest.main()
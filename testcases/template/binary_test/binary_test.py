@@ -45,6 +45,8 @@ class BinaryTest(base_test.BaseTestClass):
         shell: ShellMirrorObject, shell mirror
         testcases: list of BinaryTestCase objects, list of test cases to run
         tags: all the tags that appeared in binary list
+        binary_host_paths: dict of string to string, the device path of each
+                           pushed binary file to its host path
         DEVICE_TMP_DIR: string, temp location for storing binary
         TAG_DELIMITER: string, separator used to separate tag and path
     '''
@@ -251,10 +253,13 @@ class BinaryTest(base_test.BaseTestClass):
         logging.debug('Parsed test sources: %s', source_list)
 
         # Push source files first
+        self.binary_host_paths = {}
         for src, dst, tag in source_list:
             if src:
                 if os.path.isdir(src):
                     src = os.path.join(src, '.')
+                else:
+                    self.binary_host_paths[dst] = src
                 logging.debug('Pushing from %s to %s.', src, dst)
                 self._dut.adb.push('{src} {dst}'.format(src=src, dst=dst))
                 self.shell.Execute('ls %s' % dst)
@@ -14,22 +14,120 @@
 # limitations under the License.
 #
 
+import copy
 import logging
 import os
+import pipes
 import re
 import tempfile
+import threading
 import xml.etree.ElementTree
 
+from future.moves import queue
+
 from vts.runners.host import asserts
 from vts.runners.host import const
 from vts.runners.host import keys
+from vts.runners.host import signals
 from vts.runners.host import test_runner
 
 from vts.testcases.template.binary_test import binary_test
 from vts.testcases.template.binary_test import binary_test_case
+from vts.testcases.template.gtest_binary_test import gtest_list_cache
+from vts.testcases.template.gtest_binary_test import gtest_planner
 from vts.testcases.template.gtest_binary_test import gtest_test_case
+from vts.utils.python.mirror import shell_mirror
+from vts.utils.python.os import path_utils
 
 _GTEST_RESULT_ATTRIBUTE_WHITE_LIST = ('properties',)
+# The device path of the gtest flag file of a batch shard.
+_FILTER_FILE_PATH = '/data/local/tmp/filter_file_%d'
+
+
+def ParseGtestList(output):
+    '''Parses the output of --gtest_list_tests.
+
+    Args:
+        output: string, the output of a gtest binary.
+
+    Returns:
+        list of (string, string), the suite and test names in the listed
+        order.
+    '''
+    listing = []
+    test_suite = ''
+    for line in output.split('\n'):
+        line = str(line)
+        if not len(line.strip()):
+            continue
+        elif line.startswith(' '):  # Test case name
+            listing.append((test_suite, line.split('#')[0].strip()))
+        else:  # Test suite name
+            test_suite = line.strip()
+            if test_suite.endswith('.'):
+                test_suite = test_suite[:-1]
+    return listing
+
+
+class _ChunkReader(object):
+    '''A file-like object which reads from an iterable of chunks.
+
+    Attributes:
+        _chunks: iterator of strings, the chunks not read yet.
+        _buffer: string, the data read from _chunks but not returned.
+    '''
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        '''Reads at most size bytes. Reads everything if size is negative.'''
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+
+def IterGtestXml(chunks):
+    '''Parses gtest XML output incrementally.
+
+    Each testcase element is yielded as soon as it ends, and is cleared and
+    removed from the tree after the caller resumes the iteration, so that
+    memory does not grow with the number of test cases.
+
+    Args:
+        chunks: iterable of strings, the XML output.
+
+    Yields:
+        A tuple of the suite name and the testcase element.
+
+    Raises:
+        xml.etree.ElementTree.ParseError if the output is malformed or
+        truncated. The test cases before the error have been yielded.
+    '''
+    parents = []
+    for event, element in xml.etree.ElementTree.iterparse(
+            _ChunkReader(chunks), events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag == 'testcase' and len(parents) >= 2:
+            test_suite = parents[-1]
+            yield test_suite.get('name'), element
+            test_suite.remove(element)
+            element.clear()
+        elif element.tag == 'testsuite' and parents:
+            logging.debug('Test tag: %s, attribute: %s', element.tag,
+                          element.attrib)
+            parents[-1].remove(element)
 
 
 class GtestBinaryTest(binary_test.BinaryTest):
@@ -42,8 +140,16 @@ class GtestBinaryTest(binary_test.BinaryTest):
         tags: all the tags that appeared in binary list
         testcases: list of GtestTestCase objects, list of test cases to run
         _dut: AndroidDevice, the device under test as config
-        _gtest_results: list of GtestResult objects, used during batch mode
-                        for result storage and parsing
+        _batch_shard_count: int, number of gtest processes a batch is split
+                            into.
+        _batch_max_parallel: int, max number of the processes running
+                             concurrently.
+        _batch_cpu_affinity: bool, whether to pin the concurrent processes
+                             to different CPUs.
+        _duration_store: GtestDurationStore, the historical durations used
+                         for sharding.
+        _list_cache: GtestListCache, the cached test case listings. None if
+                     the cache is disabled.
     '''
 
     # @Override
@@ -53,13 +159,31 @@ class GtestBinaryTest(binary_test.BinaryTest):
             keys.ConfigKeys.IKEY_COLLECT_TESTS_ONLY, default_value=False)
         self.batch_mode = self.getUserParam(
             keys.ConfigKeys.IKEY_GTEST_BATCH_MODE, default_value=False)
+        if not hasattr(self, '_list_cache'):
+            cache_dir = self.getUserParam(
+                keys.ConfigKeys.IKEY_GTEST_LIST_CACHE_DIR,
+                default_value=gtest_list_cache.DEFAULT_CACHE_DIR)
+            self._list_cache = (gtest_list_cache.GtestListCache(cache_dir)
+                                if cache_dir else None)
 
         if self.batch_mode:
             if self.collect_tests_only:
                 self.batch_mode = False
                 logging.debug("Disable batch mode when collecting tests.")
             else:
-                self._gtest_results = []
+                self._batch_shard_count = max(1, int(self.getUserParam(
+                    keys.ConfigKeys.IKEY_GTEST_BATCH_SHARD_COUNT,
+                    default_value=1)))
+                self._batch_max_parallel = max(1, int(self.getUserParam(
+                    keys.ConfigKeys.IKEY_GTEST_BATCH_MAX_PARALLEL,
+                    default_value=self._batch_shard_count)))
+                self._batch_cpu_affinity = self.getUserParam(
+                    keys.ConfigKeys.IKEY_GTEST_BATCH_CPU_AFFINITY,
+                    default_value=False)
+                self._duration_store = gtest_planner.GtestDurationStore(
+                    self.getUserParam(
+                        keys.ConfigKeys.IKEY_GTEST_DURATION_FILE,
+                        default_value=gtest_planner.DEFAULT_DURATION_FILE))
 
         super(GtestBinaryTest, self).setUpClass()
 
@@ -80,8 +204,10 @@ class GtestBinaryTest(binary_test.BinaryTest):
             the provided path; the returned list will always be a one object
             list in batch mode. Test case names are stored in full_name
             property in the object, delimited by ':' according to gtest
-            documentation, after being filtered and processed according to
-            host configuration.
+            documentation. The listed GtestTestCase objects are stored in
+            test_cases property, and the full names of all listed cases,
+            including the ones which are never run, are stored in
+            listed_names property.
         '''
         working_directory = self.working_directory[
             tag] if tag in self.working_directory else None
@@ -104,33 +230,21 @@ class GtestBinaryTest(binary_test.BinaryTest):
             profiling_library_path,
             envp=envp,
             args=gtest_list_args)
-        cmd = ['chmod 755 %s' % path, list_test_case.GetRunCommand()]
-        cmd_results = self.shell.Execute(cmd)
-        test_cases = []
-        asserts.assertFalse(any(cmd_results[const.EXIT_CODE]),
-                'Failed to list test cases from %s. Command: %s, Result: %s.' %
-                (path, cmd, cmd_results))
+        listing = self._ListTestCases(list_test_case)
 
-        test_suite = ''
-        for line in cmd_results[const.STDOUT][1].split('\n'):
-            line = str(line)
-            if not len(line.strip()):
+        listed_names = []
+        test_cases = []
+        for test_suite, test_name in listing:
+            listed_names.append('%s.%s' % (test_suite, test_name))
+            # Skip any test that doesn't instantiate the parameterized gtest
+            if re.match('UninstantiatedParamaterizedTestSuite<(.*)>', test_name):
                 continue
-            elif line.startswith(' '):  # Test case name
-                test_name = line.split('#')[0].strip()
-                # Skip any test that doesn't instantiate the parameterized gtest
-                if re.match('UninstantiatedParamaterizedTestSuite<(.*)>', test_name):
-                    continue
-                test_case = gtest_test_case.GtestTestCase(
-                    test_suite, test_name, path, tag, self.PutTag,
-                    working_directory, ld_library_path, profiling_library_path,
-                    envp=envp, args=args)
-                logging.debug('Gtest test case: %s' % test_case)
-                test_cases.append(test_case)
-            else:  # Test suite name
-                test_suite = line.strip()
-                if test_suite.endswith('.'):
-                    test_suite = test_suite[:-1]
+            test_case = gtest_test_case.GtestTestCase(
+                test_suite, test_name, path, tag, self.PutTag,
+                working_directory, ld_library_path, profiling_library_path,
+                envp=envp, args=args)
+            logging.debug('Gtest test case: %s' % test_case)
+            test_cases.append(test_case)
 
         if not self.batch_mode:
             return test_cases
@@ -142,8 +256,53 @@ class GtestBinaryTest(binary_test.BinaryTest):
             path, '', path, tag, self.PutTag, working_directory,
             ld_library_path, profiling_library_path, envp=envp)
         gtest_batch.full_name = ':'.join(test_names)
+        gtest_batch.test_cases = test_cases
+        gtest_batch.listed_names = listed_names
         return [gtest_batch]
 
+    def _ListTestCases(self, list_test_case):
+        '''Lists the test cases of a gtest binary.
+
+        The listing is looked up in the list cache by the content of the
+        binary on host, the build fingerprint of the device, and the listing
+        command. The parameterized suites depend on the HALs of the device
+        build, so a reflashed device gets new listings. The device is queried
+        only if the listing is not cached, or the binary is not pushed from
+        host, or the fingerprint cannot be read.
+
+        Args:
+            list_test_case: BinaryTestCase object, the command which lists
+                            the test cases.
+
+        Returns:
+            list of (string, string), the suite and test names in the listed
+            order.
+        '''
+        path = list_test_case.path
+        host_path = getattr(self, 'binary_host_paths', {}).get(path)
+        key = None
+        if host_path and self._list_cache:
+            fingerprint = self._dut.getProp('ro.build.fingerprint')
+            if fingerprint:
+                key = self._list_cache.GetKey(
+                    host_path, self._dut.serial, fingerprint, path,
+                    list_test_case.GetRunCommand())
+        if key:
+            listing = self._list_cache.Get(key)
+            if listing is not None:
+                logging.debug('Gtest list cache hit: %s', path)
+                return listing
+
+        cmd = ['chmod 755 %s' % path, list_test_case.GetRunCommand()]
+        cmd_results = self.shell.Execute(cmd)
+        asserts.assertFalse(any(cmd_results[const.EXIT_CODE]),
+                'Failed to list test cases from %s. Command: %s, Result: %s.' %
+                (path, cmd, cmd_results))
+        listing = ParseGtestList(cmd_results[const.STDOUT][1])
+        if key:
+            self._list_cache.Put(key, listing)
+        return listing
+
     # @Override
     def VerifyTestResult(self, test_case, command_results):
         '''Parse Gtest xml result output.
@@ -183,7 +342,11 @@ class GtestBinaryTest(binary_test.BinaryTest):
         xml_str = command_results[const.STDOUT][1]
 
         if self.batch_mode:
-            self._ParseBatchResults(test_case, xml_str)
+            try:
+                for result in self._IterBatchResults(test_case, [xml_str]):
+                    self._EmitBatchResult(result)
+            except xml.etree.ElementTree.ParseError:
+                asserts.fail('Result xml content is corrupted.')
             return
 
         asserts.assertFalse(
@@ -231,40 +394,285 @@ class GtestBinaryTest(binary_test.BinaryTest):
         except:
             asserts.fail('Result xml content is corrupted.')
 
-    def _ParseBatchResults(self, test_case_original, xml_str):
-        '''Parse batch mode gtest results
+    def _CreateBatchResultFromXml(self, test_case_original, test_suite,
+                                  element):
+        '''Creates the result object of a testcase element in batch mode.
+
+        Args:
+            test_case_original: GtestTestCase object, the batch test case.
+            test_suite: string, the gtest suite name.
+            element: xml.etree.ElementTree.Element, the testcase element.
+
+        Returns:
+            GtestTestCase object with failure_message and duration.
+        '''
+        result = self._CreateBatchResult(test_case_original, test_suite,
+                                         element.get('name'))
+        try:
+            result.duration = float(element.get('time'))
+        except (TypeError, ValueError):
+            pass
+
+        failure_message = None
+        for sub in element:
+            if sub.tag == 'failure':
+                failure_message = sub.get('message')
+
+        test_case_filtered = filter(
+            lambda sub: sub.tag not in _GTEST_RESULT_ATTRIBUTE_WHITE_LIST, element)
+        if len(test_case_filtered) and not failure_message:
+            failure_message = 'Error: %s\n' % element.attrib
+            for sub in test_case_filtered:
+                failure_message += '%s: %s\n' % (sub.tag, sub.attrib)
+
+        result.failure_message = failure_message
+        return result
+
+    def _IterBatchResults(self, test_case_original, chunks):
+        '''Parses batch mode gtest results incrementally.
 
         Args:
             test_case_original: GtestTestCase object, original batch test case object
-            xml_str: string, result xml output content
+            chunks: iterable of strings, the result xml output content.
+
+        Yields:
+            GtestTestCase objects, the results in the order of the output.
+
+        Raises:
+            xml.etree.ElementTree.ParseError if the output is malformed or
+            truncated. The results before the error have been yielded.
         '''
-        root = self._ParseResultXmlString(xml_str)
+        for test_suite, element in IterGtestXml(chunks):
+            yield self._CreateBatchResultFromXml(test_case_original,
+                                                 test_suite, element)
+
+    def _CreateBatchResult(self, test_case_original, test_suite, test_name):
+        '''Creates the result object of a test case in batch mode.
+
+        Args:
+            test_case_original: GtestTestCase object, the batch test case.
+            test_suite: string, the gtest suite name.
+            test_name: string, the gtest case name.
+
+        Returns:
+            GtestTestCase object whose failure_message is None.
+        '''
+        result = gtest_test_case.GtestTestCase(
+            test_suite, test_name, '', test_case_original.tag,
+            self.PutTag, name_appendix=test_case_original.name_appendix)
+        result.failure_message = None
+        return result
+
+    def _EmitBatchResult(self, gtest_result):
+        '''Records the result of one test case in batch mode.
 
-        for test_suite in root:
-            logging.debug('Test tag: %s, attribute: %s',
-                          test_suite.tag,
-                          test_suite.attrib)
-            for test_case in test_suite:
-                result = gtest_test_case.GtestTestCase(
-                    test_suite.get('name'),
-                    test_case.get('name'), '', test_case_original.tag,
-                    self.PutTag, name_appendix=test_case_original.name_appendix)
+        Args:
+            gtest_result: GtestTestCase object, representing gtest result
+        '''
+        self.runGeneratedTests(
+            test_func=self._VerifyBatchResult,
+            settings=[gtest_result],
+            name_func=str)
+
+    def _RunBatch(self, test_case):
+        '''Runs the test cases of a batch which pass the host filters.
 
-                failure_message = None
-                for sub in test_case:
-                    if sub.tag == 'failure':
-                        failure_message = sub.get('message')
+        The cases which the filters silently exclude are not run. The cases
+        which the filters skip are not run either, but their results are
+        emitted so that runGeneratedTests records them as skipped. The other
+        cases are sharded by their historical durations. The shards run as
+        concurrent gtest processes, each of which has a compact
+        --gtest_filter converted from the host filters.
 
-                test_case_filtered = filter(
-                    lambda sub: sub.tag not in _GTEST_RESULT_ATTRIBUTE_WHITE_LIST, test_case)
-                if len(test_case_filtered) and not failure_message:
-                    failure_message = 'Error: %s\n' % test_case.attrib
-                    for sub in test_case_filtered:
-                        failure_message += '%s: %s\n' % (sub.tag, sub.attrib)
+        Each result is recorded as soon as it is parsed from the output of
+        its shard. The selected cases without results are recorded as
+        failures at the end.
 
-                result.failure_message = failure_message
+        Args:
+            test_case: GtestTestCase object, the batch test case.
+        '''
+        selected = []
+        for listed_case in test_case.test_cases:
+            result = self._CreateBatchResult(
+                test_case, listed_case.test_suite, listed_case.test_name)
+            try:
+                self.filterOneTest(str(result))
+            except signals.TestSilent:
+                continue
+            except signals.TestSkip:
+                self._EmitBatchResult(result)
+                continue
+            selected.append(result.full_name)
+        logging.info('Running %s of %s test cases in batch.', len(selected),
+                     len(test_case.test_cases))
+
+        binary_key = self.PutTag(test_case.path, test_case.tag)
+        shards = gtest_planner.ShardTestCases(
+            selected, self._duration_store.Get(binary_key),
+            self._batch_shard_count)
+        pending = set(selected)
+        durations = {}
+        for result in self._RunBatchShards(test_case, shards):
+            if result.full_name not in pending:
+                continue
+            pending.discard(result.full_name)
+            if getattr(result, 'duration', None) is not None:
+                durations[result.full_name] = result.duration
+            self._EmitBatchResult(result)
+        self._duration_store.Update(binary_key, durations)
+
+        for full_name in selected:
+            if full_name in pending:
+                result = self._CreateBatchResult(
+                    test_case, *full_name.split('.', 1))
+                result.failure_message = 'Error: no result in gtest output.'
+                self._EmitBatchResult(result)
+
+    def _RunBatchShards(self, test_case, shards):
+        '''Runs shards of a batch as concurrent gtest processes.
+
+        The shards are distributed to at most _batch_max_parallel lanes.
+        Each lane is a thread which runs its shards one after another, each
+        in its own device shell call which is optionally pinned to one CPU.
+        As soon as a shard process exits, its XML output is streamed from
+        the device and parsed incrementally, without waiting for the other
+        lanes.
 
-                self._gtest_results.append(result)
+        Args:
+            test_case: GtestTestCase object, the batch test case.
+            shards: list of lists of strings, the full names of each shard.
+
+        Yields:
+            GtestTestCase objects, the results in the order they are parsed.
+            The results of concurrent lanes are interleaved.
+        '''
+        if not shards:
+            return
+        output_dir = path_utils.TargetDirName(test_case.path)
+        binary_name = re.sub(r'\W+', '_',
+                             path_utils.TargetBaseName(test_case.path))
+        runs = []
+        for index, shard_names in enumerate(shards):
+            gtest_filter = gtest_planner.BuildGtestFilter(
+                shard_names, test_case.listed_names)
+            logging.debug('Shard %d: %d test cases, filter length %d.',
+                          index, len(shard_names), len(gtest_filter))
+            temp = tempfile.NamedTemporaryFile()
+            try:
+                temp.write('--gtest_filter=%s' % gtest_filter)
+                temp.flush()
+                self._dut.adb.push('{src} {dst}'.format(
+                    src=temp.name, dst=_FILTER_FILE_PATH % index))
+            finally:
+                temp.close()
+            shard = copy.copy(test_case)
+            shard.filter_file = _FILTER_FILE_PATH % index
+            output_path = '{directory}/gtest_output_{name}_{index}.xml'.format(
+                directory=output_dir, name=binary_name, index=index)
+            run_command = shard.GetRunCommand(output_file_path=output_path)[0]
+            runs.append((index, run_command, shard.output_file_path))
+
+        lane_count = min(self._batch_max_parallel, len(shards))
+        cpu_count = self._GetDeviceCpuCount() if (
+            self._batch_cpu_affinity and lane_count > 1) else 0
+
+        if self.profiling.enabled:
+            self.profiling.EnableVTSProfiling(self.shell,
+                                              test_case.profiling_library_path)
+        # A lane puts None after its last result.
+        results = queue.Queue()
+        for lane in range(lane_count):
+            cpu_mask = 1 << (lane % cpu_count) if cpu_count else 0
+            thread = threading.Thread(
+                target=self._RunBatchLane,
+                args=(test_case, runs[lane::lane_count], cpu_mask, results),
+                name='gtest_lane_%d' % lane)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            running_lanes = lane_count
+            while running_lanes:
+                try:
+                    # A timed get lets the thread receive KeyboardInterrupt.
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if result is None:
+                    running_lanes -= 1
+                else:
+                    yield result
+        finally:
+            if self.profiling.enabled:
+                self.profiling.ProcessTraceDataForTestCase(self._dut)
+                self.profiling.DisableVTSProfiling(self.shell)
+            self.shell.Execute('rm -f %s' % ' '.join(
+                _FILTER_FILE_PATH % index for index in range(len(shards))))
+
+    def _RunBatchLane(self, test_case, runs, cpu_mask, results):
+        '''Runs shards of a batch one after another and parses the outputs.
+
+        This method runs in a lane thread of _RunBatchShards. The stdout of
+        the gtest process is streamed and discarded, which keeps the adb
+        connection active while the tests run.
+
+        Args:
+            test_case: GtestTestCase object, the batch test case.
+            runs: list of (index, run command, output path) tuples, the
+                  shards of the lane.
+            cpu_mask: int, the CPU affinity mask of the lane. 0 for no
+                      affinity.
+            results: Queue object, where the parsed GtestTestCase objects
+                     are put, followed by None.
+        '''
+        try:
+            for index, run_command, output_path in runs:
+                command = 'sh -c %s' % pipes.quote(run_command)
+                if cpu_mask:
+                    command = 'taskset %x %s' % (cpu_mask, command)
+                logging.debug('Executing gtest batch command: %s', command)
+                try:
+                    for _ in self.shell.ExecuteStream(command):
+                        pass
+                except shell_mirror.ShellStreamError as e:
+                    # The exit code is not 0 if any test case fails.
+                    logging.error(e)
+                try:
+                    for result in self._IterBatchResults(
+                            test_case, self._StreamOutputFile(output_path)):
+                        results.put(result)
+                except xml.etree.ElementTree.ParseError as e:
+                    logging.error('Cannot parse results of shard %d: %s',
+                                  index, e)
+        except Exception:
+            logging.exception('Failed to run gtest batch lane.')
+        finally:
+            results.put(None)
+
+    def _StreamOutputFile(self, output_path):
+        '''Reads and removes a gtest output file on the device.
+
+        Args:
+            output_path: string, the path to the file on the device.
+
+        Returns:
+            An iterable of strings, the chunks of the file content.
+        '''
+        return self.shell.ExecuteStream(
+            'cat {output}; rm -f {output}'.format(output=output_path))
+
+    def _GetDeviceCpuCount(self):
+        '''Gets the number of online CPUs of the device.
+
+        Returns:
+            int, the number of CPUs. 0 if it cannot be read.
+        '''
+        results = self.shell.Execute('nproc')
+        try:
+            return int(results[const.STDOUT][0].strip())
+        except (IndexError, ValueError):
+            logging.warning('Cannot get CPU count: %s', results)
+            return 0
 
     def _VerifyBatchResult(self, gtest_result):
         '''Check a gtest test case result in batch mode
@@ -281,34 +689,14 @@ class GtestBinaryTest(binary_test.BinaryTest):
 
         If the test cases should run in batch mode, this method executes the
         gtest commands without adding test records, and then parses the XML
-        reports to records.
+        reports to records incrementally.
         If the test cases should run in batch mode but be skipped (e.g., HAL is
         not implemented), this method applies the filters in base_test, skips
         the batch test cases, and adds one record for each of them.
         '''
         if self.batch_mode and not self.isSkipAllTests():
-            # TODO(b/126412742): Convert filters to --gtest_filter.
             for test_case in self.testcases:
-                logging.info('Running %s test cases in batch.',
-                             len(test_case.full_name.split(':')))
-                gtest_filter_flag=('--gtest_filter={test}').format(test = test_case)
-                dst = '/data/local/tmp/filter_file'
-                temp = tempfile.NamedTemporaryFile()
-                try:
-                    temp.write(gtest_filter_flag)
-                    self._dut.adb.push('{src} {dst}'.format(src=temp.name, dst=dst))
-                finally:
-                    temp.close()
-                test_case.filter_file = dst
-                self.RunTestCase(test_case)
-
-                self.shell.Execute('rm %s' % dst)
-                self.runGeneratedTests(
-                    test_func=self._VerifyBatchResult,
-                    settings=self._gtest_results,
-                    name_func=str)
-
-                self._gtest_results = []
+                self._RunBatch(test_case)
             return
 
         self.runGeneratedTests(
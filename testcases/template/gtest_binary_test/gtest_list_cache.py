@@ -0,0 +1,150 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Caches the test cases which gtest binaries list on host.
+
+An entry is keyed by the content hash of the host binary and the options of
+the listing, e.g., the device build and the listing command, so that a
+rebuilt binary or a reflashed device gets a new entry.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# The default directory of the cache files.
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(),
+                                 "vts_gtest_list_cache")
+# Size of one read when hashing a file.
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime) to the content hash of a file.
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def HashFile(path):
+    """Computes the SHA-1 of a file's content.
+
+    The hash is remembered for the path, size, and mtime of the file, so that
+    a file is read once per process unless it changes.
+
+    Args:
+        path: string, the path to the file.
+
+    Returns:
+        string, the hex digest. None if the file cannot be read.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logging.debug("Cannot stat %s: %s", path, e)
+        return None
+    stamp = (path, stat.st_size, stat.st_mtime)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(stamp)
+    if digest:
+        return digest
+    sha1 = hashlib.sha1()
+    try:
+        with open(path, "rb") as binary_file:
+            for chunk in iter(lambda: binary_file.read(_HASH_CHUNK_SIZE),
+                              b""):
+                sha1.update(chunk)
+    except IOError as e:
+        logging.debug("Cannot read %s: %s", path, e)
+        return None
+    digest = sha1.hexdigest()
+    with _file_hashes_lock:
+        _file_hashes[stamp] = digest
+    return digest
+
+
+class GtestListCache(object):
+    """Keeps gtest listings in memory and in a directory of json files.
+
+    Attributes:
+        cache_dir: string, the directory of the cache files.
+        _entries: dict of key to the listing which has been loaded or stored.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._entries = {}
+
+    def GetKey(self, host_path, *options):
+        """Creates the key of a binary and the options of its listing.
+
+        Args:
+            host_path: string, the path to the binary on host.
+            *options: strings, everything else which the listing depends on,
+                      e.g., the device build fingerprint, args, and envp.
+
+        Returns:
+            string, the key. None if the binary cannot be hashed.
+        """
+        digest = HashFile(host_path)
+        if not digest:
+            return None
+        return hashlib.sha1(json.dumps([digest] + list(options))).hexdigest()
+
+    def Get(self, key):
+        """Gets a listing.
+
+        Args:
+            key: string, the key returned by GetKey.
+
+        Returns:
+            list of (string, string), the suite and test names in the listed
+            order. None if the key is not cached.
+        """
+        if key in self._entries:
+            return self._entries[key]
+        try:
+            with open(self._GetPath(key)) as cache_file:
+                listing = [tuple(item) for item in json.load(cache_file)]
+        except (IOError, ValueError, TypeError) as e:
+            logging.debug("Gtest list cache miss %s: %s", key, e)
+            return None
+        self._entries[key] = listing
+        return listing
+
+    def Put(self, key, listing):
+        """Stores a listing.
+
+        The file is replaced atomically so that concurrent runs never read
+        a partial listing.
+
+        Args:
+            key: string, the key returned by GetKey.
+            listing: list of (string, string), the suite and test names.
+        """
+        self._entries[key] = listing
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(listing, temp_file)
+            os.rename(temp_path, self._GetPath(key))
+        except (IOError, OSError) as e:
+            logging.warning("Cannot save gtest list cache: %s", e)
+
+    def _GetPath(self, key):
+        """Gets the path to the file of a key."""
+        return os.path.join(self.cache_dir, key + ".json")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from vts.runners.host import const
+from vts.testcases.template.binary_test import binary_test_case
+from vts.testcases.template.gtest_binary_test import gtest_binary_test
+from vts.testcases.template.gtest_binary_test import gtest_list_cache
+
+_DEVICE_PATH = "/data/local/tmp/binary"
+_LIST_OUTPUT = ("Suite1.\n"
+                "  test1\n"
+                "  test2  # GetParam() = 1\n"
+                "Suite2.\n"
+                "  test3\n")
+
+
+class FakeDevice(object):
+    serial = "fake-serial"
+    fingerprint = "build/1"
+
+    def getProp(self, name):
+        return self.fingerprint if name == "ro.build.fingerprint" else ""
+
+
+class FakeShell(object):
+    """A fake shell which counts the listing commands."""
+
+    def __init__(self):
+        self.count = 0
+
+    def Execute(self, cmd):
+        self.count += 1
+        return {
+            const.STDOUT: ["", _LIST_OUTPUT],
+            const.STDERR: ["", ""],
+            const.EXIT_CODE: [0, 0],
+        }
+
+
+class GtestListCacheTest(unittest.TestCase):
+    """Tests that listings are cached by binary content."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.host_path = os.path.join(self.temp_dir, "binary")
+        with open(self.host_path, "wb") as binary_file:
+            binary_file.write(b"version 1")
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+
+        self.test = gtest_binary_test.GtestBinaryTest.__new__(
+            gtest_binary_test.GtestBinaryTest)
+        self.test._dut = FakeDevice()
+        self.test.shell = FakeShell()
+        self.test.binary_host_paths = {_DEVICE_PATH: self.host_path}
+        self.test._list_cache = gtest_list_cache.GtestListCache(
+            self.cache_dir)
+        self.list_test_case = binary_test_case.BinaryTestCase(
+            "gtest_list_tests", _DEVICE_PATH, _DEVICE_PATH,
+            args="--gtest_list_tests")
+
+    def tearDown(self):
+        """TearDown tasks"""
+        shutil.rmtree(self.temp_dir)
+
+    def testParseGtestList(self):
+        """Tests parsing the listing output."""
+        self.assertEqual(
+            gtest_binary_test.ParseGtestList(_LIST_OUTPUT),
+            [("Suite1", "test1"), ("Suite1", "test2"), ("Suite2", "test3")])
+
+    def testCacheHit(self):
+        """Tests that a repeated listing does not query the device."""
+        listing = self.test._ListTestCases(self.list_test_case)
+        self.assertEqual(self.test.shell.count, 1)
+        self.assertEqual(self.test._ListTestCases(self.list_test_case),
+                         listing)
+        self.assertEqual(self.test.shell.count, 1)
+
+        # A new process loads the listing from the cache directory.
+        self.test._list_cache = gtest_list_cache.GtestListCache(
+            self.cache_dir)
+        self.assertEqual(self.test._ListTestCases(self.list_test_case),
+                         listing)
+        self.assertEqual(self.test.shell.count, 1)
+
+    def testInvalidation(self):
+        """Tests that a changed binary or command is listed again."""
+        self.test._ListTestCases(self.list_test_case)
+        with open(self.host_path, "wb") as binary_file:
+            binary_file.write(b"version 2")
+        os.utime(self.host_path, (time.time() + 10, time.time() + 10))
+        self.test._ListTestCases(self.list_test_case)
+        self.assertEqual(self.test.shell.count, 2)
+
+        self.list_test_case.envp = "FOO=1"
+        self.test._ListTestCases(self.list_test_case)
+        self.assertEqual(self.test.shell.count, 3)
+
+    def testFingerprintChange(self):
+        """Tests that a reflashed device is listed again."""
+        self.test._ListTestCases(self.list_test_case)
+        self.test._dut.fingerprint = "build/2"
+        self.test._ListTestCases(self.list_test_case)
+        self.assertEqual(self.test.shell.count, 2)
+
+        self.test._dut.fingerprint = ""
+        self.test._ListTestCases(self.list_test_case)
+        self.test._ListTestCases(self.list_test_case)
+        self.assertEqual(self.test.shell.count, 4)
+
+    def testBinaryNotFromHost(self):
+        """Tests that a binary without host file is always listed."""
+        self.test.binary_host_paths = {}
+        self.test._ListTestCases(self.list_test_case)
+        self.test._ListTestCases(self.list_test_case)
+        self.assertEqual(self.test.shell.count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
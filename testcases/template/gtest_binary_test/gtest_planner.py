@@ -0,0 +1,197 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Plans the gtest processes of a batch mode binary.
+
+The planner converts the test cases selected by the host filters to a
+compact --gtest_filter, and shards them into batches of similar durations.
+"""
+
+import collections
+import json
+import logging
+import os
+import tempfile
+
+from vts.runners.host import test_sharding
+
+# The default path of the historical test case durations.
+DEFAULT_DURATION_FILE = os.path.join(tempfile.gettempdir(),
+                                     "vts_gtest_durations.json")
+
+_GTEST_FILTER_SEPARATOR = ":"
+_GTEST_NEGATIVE_SEPARATOR = "-"
+_GTEST_WILDCARD = "*"
+
+
+def _SplitName(full_name):
+    """Splits a gtest full name into suite and test names.
+
+    Args:
+        full_name: string, '<suite>.<test>'.
+
+    Returns:
+        A tuple of strings, the suite name and the test name.
+    """
+    suite, _, name = full_name.partition(".")
+    return suite, name
+
+
+def BuildGtestFilter(selected_names, listed_names):
+    """Converts a selection of test cases to a compact gtest filter.
+
+    A suite is written as '<suite>.*' followed by negative patterns of its
+    unselected cases if that is shorter than listing the selected cases.
+    If all suites are selected, '*' with negative patterns is used when
+    shorter.
+
+    Args:
+        selected_names: iterable of strings, the full names to run.
+        listed_names: list of strings, all full names which the binary lists,
+                      including the ones which are never run.
+
+    Returns:
+        string, the value of --gtest_filter.
+    """
+    selected = set(selected_names)
+    suites = collections.OrderedDict()
+    for full_name in listed_names:
+        suites.setdefault(_SplitName(full_name)[0], []).append(full_name)
+
+    positive = []
+    negative = []
+    for suite, names in suites.items():
+        included = [name for name in names if name in selected]
+        if not included:
+            continue
+        excluded = [name for name in names if name not in selected]
+        wildcard = "%s.%s" % (suite, _GTEST_WILDCARD)
+        if len(wildcard) + sum(len(name) + 1 for name in excluded) < sum(
+                len(name) + 1 for name in included):
+            positive.append(wildcard)
+            negative.extend(excluded)
+        else:
+            positive.extend(included)
+
+    result = _JoinGtestFilter(positive, negative)
+    unselected = [name for name in listed_names if name not in selected]
+    if len(unselected) < len(listed_names):
+        everything = _JoinGtestFilter([_GTEST_WILDCARD], unselected)
+        if len(everything) < len(result):
+            result = everything
+    return result
+
+
+def _JoinGtestFilter(positive, negative):
+    """Joins positive and negative gtest patterns.
+
+    Args:
+        positive: list of strings, the positive patterns.
+        negative: list of strings, the negative patterns.
+
+    Returns:
+        string, the value of --gtest_filter.
+    """
+    result = _GTEST_FILTER_SEPARATOR.join(positive)
+    if negative:
+        result += _GTEST_NEGATIVE_SEPARATOR + _GTEST_FILTER_SEPARATOR.join(
+            negative)
+    return result
+
+
+def ShardTestCases(full_names, durations, shard_count):
+    """Splits test cases into shards of similar total durations.
+
+    The cases of a suite stay in one shard unless there are fewer suites
+    than shards. The cases in a shard keep the listed order.
+
+    Args:
+        full_names: list of strings, the full names to run, grouped by suite.
+        durations: dict of full name to the duration in seconds. A case
+                   without history counts as the average duration.
+        shard_count: int, max number of shards.
+
+    Returns:
+        list of lists of strings, the non-empty shards.
+    """
+    suites = collections.OrderedDict()
+    for full_name in full_names:
+        suites.setdefault(_SplitName(full_name)[0], []).append(full_name)
+    if len(suites) < shard_count:
+        units = [[full_name] for full_name in full_names]
+    else:
+        units = list(suites.values())
+    return test_sharding.PartitionUnits(units, durations, shard_count)
+
+
+class GtestDurationStore(object):
+    """Keeps the durations of gtest cases between runs in a json file.
+
+    Attributes:
+        path: string, the path to the json file.
+        _durations: dict of binary key to a dict of full name to seconds.
+    """
+
+    def __init__(self, path=DEFAULT_DURATION_FILE):
+        self.path = path
+        self._durations = self._Load()
+
+    def _Load(self):
+        """Loads the json file.
+
+        Returns:
+            dict, the content of the file. Empty if the file is not readable.
+        """
+        try:
+            with open(self.path) as duration_file:
+                content = json.load(duration_file)
+        except (IOError, ValueError) as e:
+            logging.debug("Cannot load gtest durations: %s", e)
+            return {}
+        return content if isinstance(content, dict) else {}
+
+    def Get(self, binary_key):
+        """Gets the durations of a binary.
+
+        Args:
+            binary_key: string, identifies the binary.
+
+        Returns:
+            dict of full name to duration in seconds.
+        """
+        return self._durations.get(binary_key, {})
+
+    def Update(self, binary_key, durations):
+        """Updates the durations of a binary and saves the file.
+
+        The file is reloaded before the update so that concurrent runs do not
+        drop each other's durations, and is replaced atomically.
+
+        Args:
+            binary_key: string, identifies the binary.
+            durations: dict of full name to duration in seconds.
+        """
+        if not durations:
+            return
+        self._durations = self._Load()
+        self._durations.setdefault(binary_key, {}).update(durations)
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path) or ".")
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(self._durations, temp_file)
+            os.rename(temp_path, self.path)
+        except (IOError, OSError) as e:
+            logging.warning("Cannot save gtest durations: %s", e)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import fnmatch
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+import xml.etree.ElementTree
+
+from vts.runners.host import const
+from vts.runners.host import signals
+from vts.testcases.template.gtest_binary_test import gtest_binary_test
+from vts.testcases.template.gtest_binary_test import gtest_planner
+from vts.testcases.template.gtest_binary_test import gtest_test_case
+
+_LISTED_NAMES = ["A.a1", "A.a2", "A.a3", "A.a4", "B.b1", "B.b2", "C.c1"]
+
+
+def _MatchGtestFilter(full_name, gtest_filter):
+    """Matches a name against a gtest filter in the way of gtest."""
+    positive, _, negative = gtest_filter.partition("-")
+
+    def _Match(patterns):
+        return any(
+            fnmatch.fnmatchcase(full_name, pattern)
+            for pattern in patterns.split(":") if pattern)
+
+    return _Match(positive or "*") and not _Match(negative)
+
+
+class GtestPlannerTest(unittest.TestCase):
+    """Tests the gtest filter conversion and the sharding."""
+
+    def _AssertFilter(self, selected, expected):
+        gtest_filter = gtest_planner.BuildGtestFilter(selected, _LISTED_NAMES)
+        self.assertEqual(gtest_filter, expected)
+        self.assertEqual(
+            [name for name in _LISTED_NAMES
+             if _MatchGtestFilter(name, gtest_filter)], selected)
+
+    def testBuildGtestFilter(self):
+        """Tests wildcards, negative patterns, and explicit names."""
+        self._AssertFilter(_LISTED_NAMES, "*")
+        self._AssertFilter(["A.a1", "A.a2", "A.a3", "B.b1"], "A.*:B.b1-A.a4")
+        self._AssertFilter(["A.a1", "C.c1"], "A.a1:C.*")
+        self._AssertFilter(_LISTED_NAMES[:-1], "*-C.c1")
+
+    def testShardTestCases(self):
+        """Tests that shards are balanced by durations."""
+        durations = {"A.a1": 10, "A.a2": 10, "B.b1": 15, "C.c1": 4}
+        shards = gtest_planner.ShardTestCases(
+            ["A.a1", "A.a2", "B.b1", "C.c1"], durations, 2)
+        self.assertEqual(shards, [["A.a1", "A.a2"], ["B.b1", "C.c1"]])
+
+        shards = gtest_planner.ShardTestCases(["A.a1", "A.a2", "A.a3"],
+                                              {"A.a1": 5}, 3)
+        self.assertEqual(shards, [["A.a1"], ["A.a2"], ["A.a3"]])
+        self.assertEqual(gtest_planner.ShardTestCases([], {}, 2), [])
+
+    def testDurationStore(self):
+        """Tests that durations are saved and reloaded."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "durations.json")
+            store = gtest_planner.GtestDurationStore(path)
+            self.assertEqual(store.Get("binary"), {})
+            store.Update("binary", {"A.a1": 1.5})
+            store.Update("binary", {"A.a2": 2.5})
+            self.assertEqual(
+                gtest_planner.GtestDurationStore(path).Get("binary"),
+                {"A.a1": 1.5, "A.a2": 2.5})
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class FakeAdb(object):
+    """A fake AdbProxy which keeps pushed files in a dict."""
+
+    def __init__(self):
+        self.files = {}
+
+    def push(self, src_dst):
+        src, dst = src_dst.split(" ")
+        with open(src) as src_file:
+            self.files[dst] = src_file.read()
+
+
+class FakeDevice(object):
+    def __init__(self):
+        self.adb = FakeAdb()
+
+
+class FakeProfiling(object):
+    enabled = False
+
+
+class FakeShell(object):
+    """A fake shell which outputs gtest XML of the pushed filter files.
+
+    Like MirrorTracker, the unknown attributes are None.
+    """
+
+    def __init__(self, adb, crashed_shard=None):
+        self.adb = adb
+        self.crashed_shard = crashed_shard
+        self.blocked_shard = None
+        self.unblock_event = threading.Event()
+        self.unblocked = None
+        self.commands = []
+        self.outputs = {}
+
+    def __getattr__(self, name):
+        return None
+
+    def Execute(self, cmd):
+        self.commands.append(cmd)
+        return {
+            const.STDOUT: [""],
+            const.STDERR: [""],
+            const.EXIT_CODE: [0],
+        }
+
+    def ExecuteStream(self, cmd, chunk_size=None):
+        self.commands.append(cmd)
+        if "--gtest_output" in cmd:
+            self._RunShard(cmd)
+            return iter(["[ RUN      ]"])
+        output = self.outputs.pop(cmd.split(" ")[1].rstrip(";"), "")
+        return iter([output[i:i + 16] for i in range(0, len(output), 16)])
+
+    def _RunShard(self, run_command):
+        """Writes the XML output of the shard in a run command."""
+        filter_path = re.search(r"--gtest_flagfile=(\S+)",
+                                run_command).group(1)
+        output_path = re.search(r"--gtest_output=xml:([^\s']+)",
+                                run_command).group(1)
+        index = int(filter_path.rsplit("_", 1)[1])
+        if index == self.blocked_shard:
+            self.unblocked = self.unblock_event.wait(5)
+        flag = self.adb.files[filter_path]
+        gtest_filter = flag[len("--gtest_filter="):]
+        xml = ['<testsuites>']
+        for suite in ("A", "B", "C"):
+            xml.append('<testsuite name="%s">' % suite)
+            for name in _LISTED_NAMES:
+                if (name.startswith(suite + ".") and
+                        _MatchGtestFilter(name, gtest_filter)):
+                    xml.append('<testcase name="%s" time="0.5"/>' %
+                               name.split(".")[1])
+            xml.append('</testsuite>')
+        xml.append('</testsuites>')
+        xml = "".join(xml)
+        if index == self.crashed_shard:
+            xml = xml[:len(xml) // 2]
+        self.outputs[output_path] = xml
+
+
+class GtestBatchTest(unittest.TestCase):
+    """Tests the batch mode of GtestBinaryTest with a fake device."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test = gtest_binary_test.GtestBinaryTest.__new__(
+            gtest_binary_test.GtestBinaryTest)
+        self.test._dut = FakeDevice()
+        self.test.shell = FakeShell(self.test._dut.adb)
+        self.test.profiling = FakeProfiling()
+        self.results = []
+        self.test._EmitBatchResult = self.results.append
+        self.test._batch_shard_count = 2
+        self.test._batch_max_parallel = 2
+        self.test._batch_cpu_affinity = False
+        self.test._duration_store = gtest_planner.GtestDurationStore(
+            os.path.join(self.temp_dir, "durations.json"))
+        self.test.filterOneTest = self._FilterOneTest
+
+        self.batch = gtest_test_case.GtestTestCase(
+            "/data/local/tmp/binary", "", "/data/local/tmp/binary", "_64bit",
+            self.test.PutTag)
+        self.batch.test_cases = [
+            gtest_test_case.GtestTestCase(
+                name.split(".")[0], name.split(".")[1], "/data/local/tmp/binary")
+            for name in _LISTED_NAMES
+        ]
+        self.batch.listed_names = _LISTED_NAMES
+
+    def tearDown(self):
+        """TearDown tasks"""
+        shutil.rmtree(self.temp_dir)
+
+    def _FilterOneTest(self, test_name):
+        if test_name == "A.a2_64bit":
+            raise signals.TestSilent("filtered")
+        if test_name == "C.c1_64bit":
+            raise signals.TestSkip("skipped")
+
+    def testRunBatch(self):
+        """Tests that filtered cases are not run and skipped cases first."""
+        self.test._RunBatch(self.batch)
+        self.assertEqual(str(self.results[0]), "C.c1_64bit")
+        self.assertEqual(
+            sorted(str(result) for result in self.results[1:]),
+            ["A.a1_64bit", "A.a3_64bit", "A.a4_64bit", "B.b1_64bit",
+             "B.b2_64bit"])
+        self.assertFalse(
+            any(result.failure_message for result in self.results))
+        run_commands = [
+            cmd for cmd in self.test.shell.commands if "--gtest_output" in cmd
+        ]
+        self.assertEqual(len(run_commands), 2)
+        self.assertEqual(len(self.test.shell.commands), 5)
+        self.assertFalse(self.test.shell.outputs)
+        self.assertEqual(
+            sorted(self.test._duration_store.Get(
+                "/data/local/tmp/binary_64bit")),
+            ["A.a1", "A.a3", "A.a4", "B.b1", "B.b2"])
+
+    def testProgressiveResults(self):
+        """Tests that a shard's results don't wait for the other lanes."""
+        self.test.shell.blocked_shard = 1
+
+        def _Emit(result):
+            self.results.append(result)
+            # The first result is the skipped case, which doesn't run.
+            if len(self.results) > 1:
+                self.test.shell.unblock_event.set()
+
+        self.test._EmitBatchResult = _Emit
+        self.test._RunBatch(self.batch)
+        self.assertTrue(self.test.shell.unblocked)
+        self.assertEqual(len(self.results), 6)
+        self.assertFalse(
+            any(result.failure_message for result in self.results))
+
+    def testCrashedShard(self):
+        """Tests that the cases missing from a truncated output fail."""
+        self.test.shell.crashed_shard = 0
+        self.test._RunBatch(self.batch)
+        self.assertEqual(len(self.results), 6)
+        failed = [
+            str(result) for result in self.results if result.failure_message
+        ]
+        passed = [
+            str(result) for result in self.results
+            if not result.failure_message
+        ]
+        self.assertTrue(failed)
+        self.assertIn("A.a1_64bit", passed)
+        self.assertNotIn("C.c1_64bit", failed)
+        self.assertEqual(self.results[-1].failure_message,
+                         "Error: no result in gtest output.")
+
+
+class IterGtestXmlTest(unittest.TestCase):
+    """Tests the incremental parsing of gtest XML output."""
+
+    _XML = ('<testsuites tests="3">'
+            '<testsuite name="A">'
+            '<testcase name="a1" time="0.1"/>'
+            '<testcase name="a2" time="0.2">'
+            '<failure message="expected 1"/>'
+            '</testcase>'
+            '</testsuite>'
+            '<testsuite name="B"><testcase name="b1"/></testsuite>'
+            '</testsuites>')
+
+    def _Chunks(self, size):
+        return [self._XML[i:i + size] for i in range(0, len(self._XML), size)]
+
+    def testChunks(self):
+        """Tests that the cases are parsed from small chunks."""
+        cases = [(suite, element.get("name"), len(element))
+                 for suite, element in gtest_binary_test.IterGtestXml(
+                     self._Chunks(7))]
+        self.assertEqual(cases, [("A", "a1", 0), ("A", "a2", 1),
+                                 ("B", "b1", 0)])
+
+    def testClearElements(self):
+        """Tests that the elements are cleared after they are processed."""
+        iterator = gtest_binary_test.IterGtestXml([self._XML])
+        next(iterator)
+        _, element = next(iterator)
+        self.assertEqual(len(element), 1)
+        next(iterator)
+        self.assertEqual(len(element), 0)
+        self.assertIsNone(element.get("name"))
+
+    def testTruncated(self):
+        """Tests that the cases before a truncation are yielded."""
+        names = []
+        iterator = gtest_binary_test.IterGtestXml(
+            [self._XML[:self._XML.index("<testsuite name=\"B\">")]])
+        with self.assertRaises(xml.etree.ElementTree.ParseError):
+            for _, element in iterator:
+                names.append(element.get("name"))
+        self.assertEqual(names, ["a1", "a2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -135,7 +135,7 @@ class MoblyTest(base_test.BaseTestClass):
                 and line.endswith(LIST_TEST_OUTPUT_END)):
                 test_names.append(line)
                 tr_record = records.TestResultRecord(line, self.test_module_name)
-                self.results.requested.append(tr_record)
+                self.results.requestRecord(tr_record)
 
         return test_names
 
@@ -13,9 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import concurrent.futures
+import errno
+import heapq
 import logging
+import os
+import re
 import subprocess
 import threading
+import time
 
 from vts.runners.host import utils
 
@@ -29,6 +36,206 @@ EXIT_CODE_TIMEOUT_ON_LINUX = -15
 # Same as EXIT_CODE_TIMEOUT_ON_LINUX but on Windows systems.
 EXIT_CODE_TIMEOUT_ON_WINDOWS = -1073741510
 
+# Default max number of commands which ExecuteShellCommand runs concurrently.
+DEFAULT_MAX_PARALLEL_COMMANDS = 8
+
+# A command containing any of these characters is run by the shell.
+_SHELL_SPECIAL_CHARS = re.compile(r"""[|&;<>()$`\\"'*?\[\]#~=%{}!\n]""")
+
+# The wall time and CPU time of a command in seconds. cpu_time is the user
+# and system time of the process, or None if it is not available.
+CommandStats = collections.namedtuple(
+    "CommandStats", ["command", "wall_time", "cpu_time", "exit_code"])
+
+_stats_listeners = []
+
+
+def AddCommandStatsListener(listener):
+    """Adds a function which receives the CommandStats of every command.
+
+    Args:
+        listener: function which takes a CommandStats object. It is called in
+                  the thread which executes the command.
+    """
+    _stats_listeners.append(listener)
+
+
+def RemoveCommandStatsListener(listener):
+    """Removes a function added by AddCommandStatsListener.
+
+    Args:
+        listener: the function to remove.
+    """
+    if listener in _stats_listeners:
+        _stats_listeners.remove(listener)
+
+
+def _NotifyCommandStats(stats):
+    """Sends CommandStats to the listeners.
+
+    Args:
+        stats: CommandStats object.
+    """
+    for listener in list(_stats_listeners):
+        try:
+            listener(stats)
+        except Exception as e:
+            logging.exception("Command stats listener failed: %s", e)
+
+
+class _ResourcePopen(subprocess.Popen):
+    """A Popen which records the resource usage of the process it reaps.
+
+    Attributes:
+        rusage: the resource usage returned by os.wait4. None if the process
+                is not reaped by wait, or os.wait4 is not available.
+    """
+
+    rusage = None
+
+    def wait(self, timeout=None):
+        """Waits for the process with os.wait4 and records the usage."""
+        if (timeout is None and self.returncode is None and
+                hasattr(os, "wait4")):
+            while True:
+                try:
+                    _, status, self.rusage = os.wait4(self.pid, 0)
+                    self._handle_exitstatus(status)
+                    break
+                except OSError as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    # ECHILD: the process has been reaped elsewhere.
+                    break
+        if timeout is None:
+            return subprocess.Popen.wait(self)
+        return subprocess.Popen.wait(self, timeout)
+
+    @property
+    def cpu_time(self):
+        """The user and system time of the process in seconds, or None."""
+        if self.rusage is None:
+            return None
+        return self.rusage.ru_utime + self.rusage.ru_stime
+
+
+class _TimeoutWatchdog(object):
+    """Terminates processes at their deadlines with one shared thread.
+
+    Attributes:
+        _heap: list of [deadline, sequence number, Popen] entries. The Popen
+               is None for the cancelled entries.
+        _condition: threading.Condition, protects _heap.
+        _sequence: int, the sequence number of the next entry.
+        _thread: threading.Thread, the watchdog thread.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._thread = None
+
+    def Watch(self, proc, timeout):
+        """Starts watching a process.
+
+        Args:
+            proc: Popen object in its own process group.
+            timeout: float, seconds before the process group is terminated.
+
+        Returns:
+            The entry which is passed to Cancel.
+        """
+        with self._condition:
+            entry = [time.time() + timeout, self._sequence, proc]
+            self._sequence += 1
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._Run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return entry
+
+    def Cancel(self, entry):
+        """Stops watching a process.
+
+        Args:
+            entry: the object returned by Watch.
+        """
+        with self._condition:
+            entry[2] = None
+            self._condition.notify()
+
+    def _Run(self):
+        """Terminates the processes whose deadlines pass."""
+        with self._condition:
+            while True:
+                while self._heap and self._heap[0][2] is None:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, proc = self._heap[0]
+                remaining = deadline - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+                if proc.returncode is None:
+                    utils.kill_process_group(proc)
+
+
+_watchdog = _TimeoutWatchdog()
+
+
+def _SplitCommand(cmd):
+    """Splits a command into arguments if it does not need a shell.
+
+    Args:
+        cmd: string, the command.
+
+    Returns:
+        list of strings, the arguments. None if the command must be run by
+        the shell.
+    """
+    if utils.is_on_windows() or _SHELL_SPECIAL_CHARS.search(cmd):
+        return None
+    args = cmd.split()
+    return args if args else None
+
+
+def _StartProcess(cmd, new_process_group):
+    """Starts a command without the shell when possible.
+
+    Args:
+        cmd: string, the command.
+        new_process_group: bool, whether to start the process in a new
+                           process group, which can be terminated as a
+                           whole.
+
+    Returns:
+        _ResourcePopen object.
+    """
+    kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.PIPE}
+    if new_process_group:
+        # On Windows, subprocess.Popen(shell=True) starts two processes,
+        # cmd.exe and the command. The Popen object represents the cmd.exe
+        # process, so calling Popen.kill() does not terminate the command.
+        # Process group ensures command termination.
+        if utils.is_on_windows():
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["preexec_fn"] = os.setpgrp
+    args = _SplitCommand(cmd)
+    if args is not None:
+        try:
+            return _ResourcePopen(args, **kwargs)
+        except OSError as e:
+            # Lets the shell report the error, e.g., command not found.
+            logging.debug("Cannot execute %s directly: %s", args, e)
+    return _ResourcePopen(cmd, shell=True, **kwargs)
+
 
 def _ExecuteOneShellCommandWithTimeout(cmd,
                                        timeout,
@@ -36,11 +243,11 @@ def _ExecuteOneShellCommandWithTimeout(cmd,
                                        *args):
     """Executes a command with timeout.
 
-    If the process times out, this function terminates it and continues
-    waiting.
+    If the process times out, the shared watchdog terminates it and this
+    function continues waiting.
 
     Args:
-        proc: Popen object, the process to wait for.
+        cmd: string, the command.
         timeout: float, timeout in seconds.
         callback_on_timeout: callable, callback function for the case
                              when the command times out.
@@ -49,36 +256,24 @@ def _ExecuteOneShellCommandWithTimeout(cmd,
     Returns:
         tuple(string, string, int) which are stdout, stderr and return code.
     """
-    # On Windows, subprocess.Popen(shell=True) starts two processes, cmd.exe
-    # and the command. The Popen object represents the cmd.exe process, so
-    # calling Popen.kill() does not terminate the command.
-    # This function uses process group to ensure command termination.
-    proc = utils.start_standing_subprocess(cmd)
-    result = []
-
-    def WaitForProcess():
-        out, err = proc.communicate()
-        result.append((out, err, proc.returncode))
-
-    wait_thread = threading.Thread(target=WaitForProcess)
-    wait_thread.daemon = True
-    wait_thread.start()
+    start_time = time.time()
+    proc = _StartProcess(cmd, True)
+    entry = _watchdog.Watch(proc, timeout)
     try:
-        wait_thread.join(timeout)
+        out, err = proc.communicate()
     finally:
+        _watchdog.Cancel(entry)
         if proc.poll() is None:
             utils.kill_process_group(proc)
-        if callback_on_timeout is not None:
-            if ((utils.is_on_windows()
-                 and proc.returncode == EXIT_CODE_TIMEOUT_ON_WINDOWS)
-                    or proc.returncode == EXIT_CODE_TIMEOUT_ON_LINUX):
-                callback_on_timeout(*args)
-    wait_thread.join()
-
-    if len(result) != 1:
-        logging.error("Unexpected command result: %s", result)
-        return "", "", proc.returncode
-    return result[0]
+    _NotifyCommandStats(
+        CommandStats(cmd, time.time() - start_time, proc.cpu_time,
+                     proc.returncode))
+    if callback_on_timeout is not None:
+        if ((utils.is_on_windows()
+             and proc.returncode == EXIT_CODE_TIMEOUT_ON_WINDOWS)
+                or proc.returncode == EXIT_CODE_TIMEOUT_ON_LINUX):
+            callback_on_timeout(*args)
+    return out, err, proc.returncode
 
 
 def RunCommand(command):
@@ -116,30 +311,39 @@ def ExecuteOneShellCommand(cmd, timeout=None, callback_on_timeout=None, *args):
         If timeout, exit_code is -15 on Unix; -1073741510 on Windows.
     """
     if timeout is None:
-        p = subprocess.Popen(
-            str(cmd),
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
+        start_time = time.time()
+        p = _StartProcess(str(cmd), False)
         stdout, stderr = p.communicate()
+        _NotifyCommandStats(
+            CommandStats(str(cmd), time.time() - start_time, p.cpu_time,
+                         p.returncode))
         return (stdout, stderr, p.returncode)
     else:
         return _ExecuteOneShellCommandWithTimeout(
             str(cmd), timeout, callback_on_timeout, *args)
 
 
-def ExecuteShellCommand(cmd):
+def ExecuteShellCommand(cmd, max_workers=1):
     """Execute one shell cmd or a list of shell commands.
 
     Args:
         cmd: string or a list of strings, shell command(s)
+        max_workers: int, max number of commands executed concurrently.
+                     The commands must be independent of each other if it
+                     is larger than 1.
 
     Returns:
-        dict{int->string}, containing stdout, stderr, exit_code of the shell command(s)
+        dict{int->string}, containing stdout, stderr, exit_code of the shell
+        command(s) in the order of cmd.
     """
     if not isinstance(cmd, list):
         cmd = [cmd]
 
-    results = [ExecuteOneShellCommand(command) for command in cmd]
+    if max_workers > 1 and len(cmd) > 1:
+        with concurrent.futures.ThreadPoolExecutor(
+                min(max_workers, len(cmd))) as executor:
+            results = list(executor.map(ExecuteOneShellCommand, cmd))
+    else:
+        results = [ExecuteOneShellCommand(command) for command in cmd]
     stdout, stderr, exit_code = zip(*results)
     return {STDOUT: stdout, STDERR: stderr, EXIT_CODE: exit_code}
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import time
+import unittest
+
+from vts.utils.python.common import cmd_utils
+
+
+class CmdUtilsTest(unittest.TestCase):
+    """Unit tests for cmd_utils."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.stats = []
+        cmd_utils.AddCommandStatsListener(self.stats.append)
+
+    def tearDown(self):
+        """TearDown tasks"""
+        cmd_utils.RemoveCommandStatsListener(self.stats.append)
+
+    def testSplitCommand(self):
+        """Tests which commands are run without the shell."""
+        self.assertEqual(cmd_utils._SplitCommand("ls -l /tmp"),
+                         ["ls", "-l", "/tmp"])
+        for cmd in ("echo $HOME", "a | b", "a > b", "echo 'a b'", "A=1 b",
+                    "ls *", ""):
+            self.assertIsNone(cmd_utils._SplitCommand(cmd), cmd)
+
+    def testExecuteOneShellCommand(self):
+        """Tests the output and exit code of direct and shell commands."""
+        self.assertEqual(
+            cmd_utils.ExecuteOneShellCommand("echo direct"),
+            (b"direct\n", b"", 0))
+        self.assertEqual(
+            cmd_utils.ExecuteOneShellCommand("echo shell >&2; exit 3"),
+            (b"", b"shell\n", 3))
+        out, err, ret = cmd_utils.ExecuteOneShellCommand(
+            "no_such_command_for_test", timeout=10)
+        self.assertEqual(ret, 127)
+
+    def testTimeout(self):
+        """Tests that the watchdog terminates a command at its timeout."""
+        callback = []
+        start = time.time()
+        out, err, ret = cmd_utils.ExecuteOneShellCommand(
+            "echo a; sleep 10", 0.3, callback.append, "timeout")
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(ret, cmd_utils.EXIT_CODE_TIMEOUT_ON_LINUX)
+        self.assertEqual(out, b"a\n")
+        self.assertEqual(callback, ["timeout"])
+
+        self.assertEqual(
+            cmd_utils.ExecuteOneShellCommand("echo b", timeout=10),
+            (b"b\n", b"", 0))
+
+    def testNoWaiterThread(self):
+        """Tests that a command with timeout does not start a thread."""
+        cmd_utils.ExecuteOneShellCommand("true", timeout=10)
+        thread_count = threading.active_count()
+        cmd_utils.ExecuteOneShellCommand("sleep 0.2", timeout=10)
+        self.assertEqual(threading.active_count(), thread_count)
+
+    def testParallelExecution(self):
+        """Tests that independent commands run concurrently in order."""
+        commands = ["sleep 0.%d; echo %d" % (5 - i, i) for i in range(4)]
+        start = time.time()
+        results = cmd_utils.ExecuteShellCommand(commands, max_workers=4)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(results[cmd_utils.STDOUT],
+                         tuple(b"%d\n" % i for i in range(4)))
+        self.assertEqual(results[cmd_utils.EXIT_CODE], (0, 0, 0, 0))
+
+    def testCommandStats(self):
+        """Tests the wall time and CPU time of commands."""
+        cmd_utils.ExecuteOneShellCommand("sleep 0.2")
+        cmd_utils.ExecuteOneShellCommand(
+            "i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done", timeout=10)
+        self.assertEqual([stats.command for stats in self.stats], [
+            "sleep 0.2", "i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done"
+        ])
+        sleep_stats, loop_stats = self.stats
+        self.assertGreaterEqual(sleep_stats.wall_time, 0.2)
+        self.assertLess(sleep_stats.cpu_time, 0.1)
+        self.assertGreater(loop_stats.cpu_time, 0)
+        self.assertEqual(loop_stats.exit_code, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
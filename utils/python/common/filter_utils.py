@@ -31,6 +31,8 @@ _INCLUDE_FILTER = '_include_filter'
 _EXCLUDE_FILTER = '_exclude_filter'
 DEFAULT_EXCLUDE_OVER_INCLUDE = False
 _MODULE_NAME_PATTERN = '{module}.{test}'
+# Max number of memoized decisions of a Filter.
+_MAX_CACHED_DECISIONS = 100000
 
 
 def ExpandBitness(input_list):
@@ -186,6 +188,109 @@ def InRegexList(item, regex_list):
     return False
 
 
+def CompileRegexList(regex_list):
+    '''Compiles a regex list into as few patterns as possible.
+
+    The regexes without groups are combined into one alternation, each of
+    which must match the whole string. The regexes with groups are compiled
+    separately so that their group numbers and backreferences do not change.
+
+    Args:
+        regex_list: regex list
+
+    Returns:
+        list of compiled pattern objects whose match method checks whether a
+        string matches a regex in regex_list from start to end.
+    '''
+    combined = []
+    separate = []
+    for regex in regex_list:
+        try:
+            groups = re.compile(regex).groups
+        except regex_error:
+            logging.error('Invalid regex %s, ignored.', regex)
+            continue
+        if groups:
+            separate.append(re.compile('(?:%s)\\Z' % regex))
+        else:
+            combined.append('(?:%s)\\Z' % regex)
+    patterns = []
+    if combined:
+        try:
+            patterns.append(re.compile('|'.join(combined)))
+        except (regex_error, OverflowError, RuntimeError) as e:
+            logging.warning('Cannot combine regexes: %s', e)
+            separate.extend(re.compile(regex) for regex in combined)
+    return patterns + separate
+
+
+class _CompiledPatterns(object):
+    '''Matches names against the exact and regex items of a filter list.
+
+    Attributes:
+        _exact: set of string, the exact items.
+        _module_exact: set of string, the names whose module name prefixed
+                       form is an exact item.
+        _module_prefix: string, the prefix of the module name prefixed form.
+                        None if module name prefix matching is disabled.
+        _patterns: list of compiled pattern objects of the regex items.
+    '''
+
+    def __init__(self, exact, regex_list, module_name=None):
+        self._exact = set(exact)
+        self._module_prefix = None
+        self._module_exact = set()
+        if module_name:
+            self._module_prefix = _MODULE_NAME_PATTERN.format(
+                module=module_name, test='')
+            prefix_length = len(self._module_prefix)
+            self._module_exact = set(
+                item[prefix_length:] for item in self._exact
+                if item.startswith(self._module_prefix))
+        self._patterns = CompileRegexList(regex_list)
+
+    def Match(self, item):
+        '''Checks whether a name or its module name prefixed form matches.
+
+        Args:
+            item: string, the name to check.
+
+        Returns:
+            bool, True if there is a match; False otherwise.
+        '''
+        if item in self._exact or item in self._module_exact:
+            return True
+        if self._MatchRegex(item):
+            return True
+        return (self._module_prefix is not None and self._patterns and
+                self._MatchRegex(self._module_prefix + item))
+
+    def _MatchRegex(self, item):
+        '''Checks whether a string matches a regex item.'''
+        return any(pattern.match(item) for pattern in self._patterns)
+
+
+def _CompiledListProperty(name):
+    '''Creates a property of Filter which resets the compiled patterns.
+
+    Args:
+        name: string, the name of the property.
+
+    Returns:
+        A property object.
+    '''
+    attr_name = '_' + name
+
+    def _Get(self):
+        return getattr(self, attr_name, [])
+
+    def _Set(self, value):
+        setattr(self, attr_name, value)
+        self._ResetCompiledFilter()
+
+    return property(_Get, _Set)
+
+
 def IsRegexFilter(item):
     '''Checks whether the given item is a regex filter.
 
@@ -236,11 +341,18 @@ class Filter(object):
                         Default is False. When set to True, bitness will
                         be added to test name for filtering process, but
                         the original filter list will not be changed.
+        _include_patterns: _CompiledPatterns of the include filter. None
+                           until a name is checked.
+        _exclude_patterns: _CompiledPatterns of the exclude filter. None
+                           until a name is checked.
+        _decisions: dict of string to bool, the memoized results of Filter.
+        _decision_key: tuple of the options which the decisions and the
+                       compiled patterns depend on.
     '''
-    include_filter_exact = []
-    include_filter_regex = []
-    exclude_filter_exact = []
-    exclude_filter_regex = []
+    include_filter_exact = _CompiledListProperty('include_filter_exact')
+    include_filter_regex = _CompiledListProperty('include_filter_regex')
+    exclude_filter_exact = _CompiledListProperty('exclude_filter_exact')
+    exclude_filter_regex = _CompiledListProperty('exclude_filter_regex')
 
     def __init__(self,
                  include_filter=[],
@@ -251,6 +363,7 @@ class Filter(object):
                  enable_module_name_prefix_matching=False,
                  module_name=None,
                  expand_bitness=False):
+        self._ResetCompiledFilter()
         self.enable_regex = enable_regex
         self.expand_bitness = expand_bitness
 
@@ -312,6 +425,27 @@ class Filter(object):
             If exclude_over_include is set to True, exclude filter will first
             be checked.
 
+        The filters are compiled at the first call, and the result of each
+        string is memoized until the filters or the options change.
+
+        Args:
+            item: string, the string for filter check
+
+        Returns:
+            bool. True if it passed the filter; False otherwise
+        '''
+        self._CheckDecisionKey()
+        decision = self._decisions.get(item)
+        if decision is None:
+            decision = self._Filter(item)
+            if len(self._decisions) >= _MAX_CACHED_DECISIONS:
+                self._decisions.clear()
+            self._decisions[item] = decision
+        return decision
+
+    def _Filter(self, item):
+        '''Filters a given string without memoization.
+
         Args:
             item: string, the string for filter check
 
@@ -344,8 +478,12 @@ class Filter(object):
         Returns:
             bool, True if in include filter.
         '''
-        return self._ModuleNamePrefixMatchingCheck(item,
-                                                   self._IsInIncludeFilter)
+        self._CheckDecisionKey()
+        if self._include_patterns is None:
+            self._include_patterns = _CompiledPatterns(
+                self.include_filter_exact, self.include_filter_regex,
+                self._GetPrefixModuleName())
+        return self._include_patterns.Match(item)
 
     def IsInExcludeFilter(self, item):
         '''Check if item is in exclude filter.
@@ -359,62 +497,41 @@ class Filter(object):
         Returns:
             bool, True if in exclude filter.
         '''
-        return self._ModuleNamePrefixMatchingCheck(item,
-                                                   self._IsInExcludeFilter)
-
-    def _ModuleNamePrefixMatchingCheck(self, item, check_function):
-        '''Check item from filter after appending module name as prefix.
-
-        This function will first check whether enable_module_name_prefix_matching
-        is True and module_name is not empty. Then, the check_function will
-        be applied to the item. If the result is False and
-        enable_module_name_prefix_matching is True, module name will be added
-        as the prefix to the item, in format of '<module_name>.<item>', and
-        call the check_function again with the new resulting name.
-
-        This is mainly used for retry command where test module name are
-        automatically added to test case name.
-
-        Args:
-            item: string, test name for checking.
-            check_function: function to check item in filters.
-
-        Return:
-            bool, True if item pass the filter from the given check_function.
-        '''
-        res = check_function(item)
-
-        if (not res and self.enable_module_name_prefix_matching and
-                self.module_name):
-            res = check_function(
-                _MODULE_NAME_PATTERN.format(
-                    module=self.module_name, test=item))
-
-        return res
-
-    def _IsInIncludeFilter(self, item):
-        '''Internal function to check if item is in include filter.
-
-        Args:
-            item: string, item to check filter
-
-        Returns:
-            bool, True if in include filter.
-        '''
-        return item in self.include_filter_exact or InRegexList(
-            item, self.include_filter_regex)
+        self._CheckDecisionKey()
+        if self._exclude_patterns is None:
+            self._exclude_patterns = _CompiledPatterns(
+                self.exclude_filter_exact, self.exclude_filter_regex,
+                self._GetPrefixModuleName())
+        return self._exclude_patterns.Match(item)
 
-    def _IsInExcludeFilter(self, item):
-        '''Internal function to check if item is in exclude filter.
+    def _GetPrefixModuleName(self):
+        '''Gets the module name for module name prefix matching.
 
-        Args:
-            item: string, item to check filter
+        The module name prefixed form '<module_name>.<item>' is mainly used
+        for retry command where test module name are automatically added to
+        test case name.
 
         Returns:
-            bool, True if in exclude filter.
+            string, the module name. None if the matching is disabled.
         '''
-        return item in self.exclude_filter_exact or InRegexList(
-            item, self.exclude_filter_regex)
+        if self.enable_module_name_prefix_matching and self.module_name:
+            return self.module_name
+        return None
+
+    def _CheckDecisionKey(self):
+        '''Resets the compiled filter if an option has changed.'''
+        key = (self.exclude_over_include,
+               self.enable_module_name_prefix_matching, self.module_name)
+        if key != self._decision_key:
+            self._ResetCompiledFilter()
+            self._decision_key = key
+
+    def _ResetCompiledFilter(self):
+        '''Discards the compiled patterns and the memoized decisions.'''
+        self._include_patterns = None
+        self._exclude_patterns = None
+        self._decisions = {}
+        self._decision_key = None
 
     @property
     def include_filter(self):
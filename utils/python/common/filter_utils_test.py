@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import time
+import unittest
+
+from vts.utils.python.common import filter_utils
+
+_MODULE = "VtsModule"
+
+
+def _ReferenceMatch(item, exact, regex_list, module_name):
+    """Checks a name in the way of the uncompiled filter."""
+
+    def _Check(name):
+        return name in exact or filter_utils.InRegexList(name, regex_list)
+
+    return _Check(item) or bool(module_name and
+                                _Check("%s.%s" % (module_name, item)))
+
+
+class FilterTest(unittest.TestCase):
+    """Tests the compiled matching of Filter."""
+
+    def testExactAndRegex(self):
+        """Tests exact, regex, and negative items."""
+        test_filter = filter_utils.Filter(
+            include_filter=["a.b", "r(c\\..*)", "-r(c\\.x.*)"])
+        self.assertTrue(test_filter.Filter("a.b"))
+        self.assertTrue(test_filter.Filter("c.d"))
+        self.assertFalse(test_filter.Filter("a.bc"))
+        self.assertFalse(test_filter.Filter("xc.d"))
+        self.assertTrue(test_filter.IsInExcludeFilter("c.xy"))
+
+    def testModuleNamePrefix(self):
+        """Tests the module name prefixed form of exact and regex items."""
+        test_filter = filter_utils.Filter(
+            include_filter=[_MODULE + ".test1", "r(%s\\.re.*)" % _MODULE],
+            enable_module_name_prefix_matching=True,
+            module_name=_MODULE)
+        self.assertTrue(test_filter.Filter("test1"))
+        self.assertTrue(test_filter.Filter("regex"))
+        self.assertFalse(test_filter.Filter("test2"))
+        test_filter.module_name = "Other"
+        self.assertFalse(test_filter.Filter("test1"))
+
+    def testGroupsAndBackreferences(self):
+        """Tests that regexes with groups are matched separately."""
+        test_filter = filter_utils.Filter(
+            include_filter=["r((a+)b\\1)", "r(x|xy)", "r(p.*)"])
+        self.assertTrue(test_filter.Filter("aabaa"))
+        self.assertFalse(test_filter.Filter("aaba"))
+        self.assertTrue(test_filter.Filter("xy"))
+        self.assertTrue(test_filter.Filter("pq"))
+
+    def testRefreshResetsDecisions(self):
+        """Tests that memoized decisions follow changes of the filter."""
+        test_filter = filter_utils.Filter(exclude_filter=["test1"])
+        self.assertFalse(test_filter.Filter("test1"))
+        test_filter.exclude_filter = []
+        self.assertTrue(test_filter.Filter("test1"))
+        test_filter.add_to_include_filter("test2")
+        self.assertFalse(test_filter.Filter("test1"))
+        test_filter.include_filter_exact = ["test1"]
+        self.assertTrue(test_filter.Filter("test1"))
+
+    def testBitness(self):
+        """Tests the expanded bitness of exact items."""
+        test_filter = filter_utils.Filter(
+            include_filter=["test1"], expand_bitness=True)
+        self.assertTrue(test_filter.Filter("test1_32bit"))
+        self.assertFalse(test_filter.Filter("test2_64bit"))
+
+    def testEquivalenceBenchmark(self):
+        """Compares the compiled filter with the uncompiled matching."""
+        names = ["Suite%d.Test%d_%dbit" % (i % 50, i, 32 if i % 2 else 64)
+                 for i in range(20000)]
+        include = ["Suite%d.Test%d" % (i % 50, i) for i in range(0, 20000, 7)]
+        include += ["%s.Suite%d.Test%d" % (_MODULE, i % 50, i)
+                    for i in range(3, 20000, 11)]
+        include += ["r(Suite%d\\.Test1.*)" % i for i in range(0, 50, 5)]
+        include += ["r(%s\\.Suite%d\\..*_32bit)" % (_MODULE, i)
+                    for i in range(1, 50, 5)]
+        test_filter = filter_utils.Filter(
+            include_filter=include,
+            enable_module_name_prefix_matching=True,
+            module_name=_MODULE,
+            expand_bitness=True)
+
+        start = time.time()
+        compiled = [test_filter.Filter(name) for name in names]
+        elapsed = time.time() - start
+        memoized_start = time.time()
+        self.assertEqual([test_filter.Filter(name) for name in names],
+                         compiled)
+        memoized = time.time() - memoized_start
+
+        sample = names[::20]
+        reference_start = time.time()
+        expected = [
+            _ReferenceMatch(name, test_filter.include_filter_exact,
+                            test_filter.include_filter_regex, _MODULE)
+            for name in sample
+        ]
+        reference = (time.time() - reference_start) * 20
+        self.assertEqual(compiled[::20], expected)
+        logging.info(
+            "%d names, %d filter items: compiled %.3fs, memoized %.3fs, "
+            "uncompiled (extrapolated) %.3fs", len(names),
+            len(test_filter.include_filter_exact) +
+            len(test_filter.include_filter_regex), elapsed, memoized,
+            reference)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
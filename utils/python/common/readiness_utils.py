@@ -0,0 +1,109 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import errno
+import logging
+import select
+import socket
+import time
+
+# The first interval between two probes in seconds.
+DEFAULT_INITIAL_INTERVAL = 0.05
+# The max interval between two probes in seconds.
+DEFAULT_MAX_INTERVAL = 1.0
+# The ratio of an interval to the previous one.
+DEFAULT_BACKOFF_FACTOR = 2.0
+
+
+def WaitUntil(probe,
+              timeout,
+              initial_interval=DEFAULT_INITIAL_INTERVAL,
+              max_interval=DEFAULT_MAX_INTERVAL,
+              backoff_factor=DEFAULT_BACKOFF_FACTOR,
+              ignored_exceptions=()):
+    """Probes a condition with exponential backoff until a deadline.
+
+    The probe is called immediately, then after intervals which grow from
+    initial_interval by backoff_factor up to max_interval. The last interval
+    is shortened so that the probe is called once at the deadline.
+
+    Args:
+        probe: function which takes no argument and returns a value which is
+               true when the condition is met.
+        timeout: float, seconds to wait.
+        initial_interval: float, the first interval in seconds.
+        max_interval: float, the max interval in seconds.
+        backoff_factor: float, the ratio of an interval to the previous one.
+        ignored_exceptions: tuple of exception classes, which are treated as
+                            the condition not met.
+
+    Returns:
+        The true value returned by the probe, or None if the deadline passes.
+    """
+    deadline = time.time() + timeout
+    interval = initial_interval
+    while True:
+        try:
+            result = probe()
+            if result:
+                return result
+        except ignored_exceptions as e:
+            logging.debug("Probe failed: %s", e)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff_factor, max_interval)
+
+
+def IsPortOpen(host, port, timeout=1.0):
+    """Checks whether a TCP port accepts connections.
+
+    The connection is made with a non-blocking socket so that a host which
+    does not respond costs at most timeout seconds.
+
+    Args:
+        host: string, the host name.
+        port: int, the port number.
+        timeout: float, seconds to wait for the connection.
+
+    Returns:
+        True if the connection is established, False otherwise.
+    """
+    try:
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+    except socket.error as e:
+        logging.debug("Cannot resolve %s: %s", host, e)
+        return False
+    family, socktype, proto, _, sockaddr = address
+    sock = socket.socket(family, socktype, proto)
+    try:
+        sock.setblocking(False)
+        ret = sock.connect_ex(sockaddr)
+        if ret == 0:
+            return True
+        if ret not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            return False
+        # The socket becomes writable when the connection completes or fails.
+        _, writable, _ = select.select([], [sock], [], timeout)
+        if not writable:
+            return False
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+    except (socket.error, select.error) as e:
+        logging.debug("Cannot connect to %s:%s: %s", host, port, e)
+        return False
+    finally:
+        sock.close()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import socket
+import time
+import unittest
+
+from vts.utils.python.common import readiness_utils
+
+
+class ReadinessUtilsTest(unittest.TestCase):
+    """Unit tests for readiness_utils."""
+
+    def testWaitUntilReady(self):
+        """Tests that the probe result is returned once it is true."""
+        results = [None, 0, "ready"]
+        start = time.time()
+        self.assertEqual(
+            readiness_utils.WaitUntil(lambda: results.pop(0), timeout=5,
+                                      initial_interval=0.01),
+            "ready")
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(results, [])
+
+    def testWaitUntilDeadline(self):
+        """Tests that None is returned at the deadline."""
+        calls = []
+        start = time.time()
+        self.assertIsNone(
+            readiness_utils.WaitUntil(lambda: calls.append(1), timeout=0.3,
+                                      initial_interval=0.01))
+        elapsed = time.time() - start
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 1)
+        # 0.01, 0.02, 0.04, 0.08, 0.16 -> the last probe is at the deadline.
+        self.assertLessEqual(len(calls), 7)
+
+    def testWaitUntilIgnoredExceptions(self):
+        """Tests that ignored exceptions are treated as not ready."""
+        results = [IOError("not ready"), True]
+
+        def _Probe():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.assertTrue(
+            readiness_utils.WaitUntil(_Probe, timeout=5,
+                                      initial_interval=0.01,
+                                      ignored_exceptions=(IOError, )))
+        with self.assertRaises(ValueError):
+            readiness_utils.WaitUntil(self._RaiseValueError, timeout=5,
+                                      ignored_exceptions=(IOError, ))
+
+    def _RaiseValueError(self):
+        raise ValueError()
+
+    def testIsPortOpen(self):
+        """Tests the connection to a listening and a closed port."""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server.bind(("localhost", 0))
+            server.listen(1)
+            port = server.getsockname()[1]
+            self.assertTrue(readiness_utils.IsPortOpen("localhost", port))
+        finally:
+            server.close()
+        self.assertFalse(readiness_utils.IsPortOpen("localhost", port))
+
+
+if __name__ == "__main__":
+    unittest.main()
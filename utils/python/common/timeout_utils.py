@@ -18,6 +18,7 @@ import errno
 import logging
 import os
 import signal
+import threading
 
 from functools import wraps
 from vts.runners.host import errors
@@ -27,6 +28,18 @@ class TimeoutError(errors.VtsError):
     """Timeout exception class to throw when a function times out."""
 
 
+def CanUseAlarm():
+    """Checks whether the current thread can time out with SIGALRM.
+
+    Python only allows the main thread to set signal handlers.
+
+    Returns:
+        True if SIGALRM is available to the current thread, False otherwise.
+    """
+    return (hasattr(signal, "SIGALRM") and
+            isinstance(threading.current_thread(), threading._MainThread))
+
+
 def timeout(seconds, message=os.strerror(errno.ETIME), no_exception=False):
     """Timeout decorator for functions.
 
@@ -36,6 +49,9 @@ def timeout(seconds, message=os.strerror(errno.ETIME), no_exception=False):
         no_exception: bool, whether to raise exception when decorated function times out.
                       If set to False, the function will stop execution and return None.
 
+    The decorated function does not time out when it is called in a thread
+    other than the main thread.
+
     Returns:
         Decorated function returns if no timeout, or None if timeout but no_exception is True.
 
@@ -48,7 +64,8 @@ def timeout(seconds, message=os.strerror(errno.ETIME), no_exception=False):
 
     def decorator(func):
         def wrapper(*args, **kwargs):
-            if seconds > 0:
+            use_alarm = CanUseAlarm()
+            if seconds > 0 and use_alarm:
                 signal.signal(signal.SIGALRM, _handler_timeout)
                 signal.alarm(seconds)
 
@@ -61,7 +78,8 @@ def timeout(seconds, message=os.strerror(errno.ETIME), no_exception=False):
                 else:
                     raise e
             finally:
-                signal.alarm(0)
+                if use_alarm:
+                    signal.alarm(0)
 
             return result
 
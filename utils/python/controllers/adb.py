@@ -16,13 +16,17 @@
 from builtins import str
 
 import logging
+import os
 import random
 import socket
 import subprocess
+import threading
 import time
+import uuid
 
 from vts.runners.host import const
 from vts.utils.python.common import cmd_utils
+from vts.utils.python.controllers import adb_client
 
 
 # Default adb timeout 5 minutes
@@ -31,6 +35,8 @@ DEFAULT_ADB_TIMEOUT = 300
 DEFAULT_ADB_LONG_TIMEOUT = 600
 # Adb short timeout (30 seconds)
 DEFAULT_ADB_SHORT_TIMEOUT = 30
+# Size of one read from the pipes of a shell session.
+_SHELL_SESSION_READ_SIZE = 65536
 
 class AdbError(Exception):
     """Raised when there is an error in adb operations."""
@@ -107,6 +113,206 @@ def list_occupied_adb_ports():
     return used_ports
 
 
+class AdbShellSession(object):
+    """A long-lived shell process which runs commands one at a time.
+
+    Each command is written to the stdin of the shell, followed by commands
+    that print a sentinel line to stdout and stderr. The sentinel on stdout
+    carries the exit code. Reader threads collect both pipes until the
+    sentinels arrive, so a command costs one round trip instead of a new
+    adb process.
+    If a command times out or the shell exits, the process is killed and a
+    new one is spawned for the next command.
+
+    Attributes:
+        _cmd: list of strings, the command which starts the shell.
+        _lock: threading.Lock, serializes the commands.
+        _cond: threading.Condition, protects the buffers and is notified when
+               data arrives.
+        _proc: subprocess.Popen, the shell process. None if not running.
+        _stdout: bytearray, stdout data not consumed by a command.
+        _stderr: bytearray, stderr data not consumed by a command.
+        _eof_count: int, number of closed pipes of _proc.
+        _sentinel: bytes, the unique sentinel prefix of the current process.
+        _count: int, number of commands sent to the current process.
+    """
+
+    def __init__(self, cmd):
+        self._cmd = cmd
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._proc = None
+        self._stdout = bytearray()
+        self._stderr = bytearray()
+        self._eof_count = 0
+        self._sentinel = b""
+        self._count = 0
+
+    def execute(self, cmd, timeout=DEFAULT_ADB_TIMEOUT):
+        """Executes one command in the shell.
+
+        Args:
+            cmd: string, the shell command. It is run in a command group with
+                 stdin from /dev/null.
+            timeout: float, timeout in seconds.
+
+        Returns:
+            tuple(bytes, bytes, int), containing stdout, stderr, and exit code
+            of the command. If the command times out, the exit code is
+            cmd_utils.EXIT_CODE_TIMEOUT_ON_LINUX. If the shell exits, the exit
+            code is that of the shell process.
+        """
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._spawn()
+            self._count += 1
+            marker = self._sentinel + ("%d" % self._count).encode("utf-8")
+            out_marker = b"\n" + marker + b" "
+            err_marker = b"\n" + marker + b"\n"
+            if not isinstance(cmd, bytes):
+                cmd = cmd.encode("utf-8")
+            script = (b"{ " + cmd + b"\n} </dev/null; "
+                      b"printf '\\n%s %d\\n' " + marker + b" $?; "
+                      b"printf '\\n%s\\n' " + marker + b" >&2\n")
+            deadline = time.time() + timeout
+            try:
+                self._proc.stdin.write(script)
+                self._proc.stdin.flush()
+            except (IOError, OSError) as e:
+                logging.error("Failed to write to adb shell session: %s", e)
+
+            with self._cond:
+                while True:
+                    result = self._parse(out_marker, err_marker)
+                    if result is not None:
+                        return result
+                    if self._eof_count == 2:
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                out = bytes(self._stdout)
+                err = bytes(self._stderr)
+            if self._eof_count == 2:
+                self._proc.wait()
+                ret = self._proc.returncode
+                logging.error("adb shell session exited (%s): %s", ret, cmd)
+            else:
+                ret = cmd_utils.EXIT_CODE_TIMEOUT_ON_LINUX
+                logging.error("adb shell session timed out: %s", cmd)
+            self._kill()
+            return out, err, ret
+
+    def close(self):
+        """Terminates the shell process."""
+        with self._lock:
+            self._kill()
+
+    def _spawn(self):
+        """Starts a new shell process and its reader threads."""
+        self._kill()
+        self._proc = subprocess.Popen(
+            self._cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self._sentinel = ("__VTS_ADB_SHELL_%s_" % uuid.uuid4().hex).encode(
+            "utf-8")
+        self._count = 0
+        with self._cond:
+            del self._stdout[:]
+            del self._stderr[:]
+            self._eof_count = 0
+        for pipe, buf in ((self._proc.stdout, self._stdout),
+                          (self._proc.stderr, self._stderr)):
+            reader = threading.Thread(
+                target=self._readPipe, args=(self._proc, pipe, buf))
+            reader.daemon = True
+            reader.start()
+
+    def _kill(self):
+        """Kills the shell process if it is running."""
+        proc = self._proc
+        self._proc = None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError as e:
+                logging.debug("Failed to kill adb shell session: %s", e)
+        proc.wait()
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            try:
+                pipe.close()
+            except (IOError, OSError):
+                pass
+
+    def _readPipe(self, proc, pipe, buf):
+        """Appends the data of a pipe to a buffer until the pipe is closed.
+
+        Args:
+            proc: subprocess.Popen, the process that owns the pipe.
+            pipe: file, stdout or stderr of proc.
+            buf: bytearray, the buffer to append to.
+        """
+        while True:
+            try:
+                data = os.read(pipe.fileno(), _SHELL_SESSION_READ_SIZE)
+            except (IOError, OSError, ValueError):
+                data = b""
+            with self._cond:
+                if proc is not self._proc:
+                    return
+                if not data:
+                    self._eof_count += 1
+                    self._cond.notify_all()
+                    return
+                buf.extend(data)
+                self._cond.notify_all()
+
+    def _parse(self, out_marker, err_marker):
+        """Consumes the result of a command if both sentinels have arrived.
+
+        If the device merges stderr into stdout, the stderr sentinel follows
+        the stdout sentinel on stdout.
+
+        Args:
+            out_marker: bytes, the stdout sentinel followed by a space.
+            err_marker: bytes, the stderr sentinel line.
+
+        Returns:
+            tuple(bytes, bytes, int), stdout, stderr, and exit code.
+            None if the sentinels have not arrived.
+        """
+        out_index = self._stdout.find(out_marker)
+        if out_index < 0:
+            return None
+        code_end = self._stdout.find(b"\n", out_index + len(out_marker))
+        if code_end < 0:
+            return None
+        # The stderr sentinel starts with a newline after the exit code line.
+        merged_end = code_end + 1 + len(err_marker)
+        if self._stdout[code_end + 1:merged_end] == err_marker:
+            err_index = -1
+        else:
+            err_index = self._stderr.find(err_marker)
+            if err_index < 0:
+                return None
+
+        out = bytes(self._stdout[:out_index])
+        ret = int(self._stdout[out_index + len(out_marker):code_end])
+        if err_index < 0:
+            err = b""
+            del self._stdout[:merged_end]
+        else:
+            err = bytes(self._stderr[:err_index])
+            del self._stdout[:code_end + 1]
+            del self._stderr[:err_index + len(err_marker)]
+        return out, err, ret
+
+
 class AdbProxy():
     """Proxy class for ADB.
 
@@ -115,15 +321,76 @@ class AdbProxy():
     >> adb = AdbProxy(<serial>)
     >> adb.start_server()
     >> adb.devices() # will return the console output of "adb devices".
+
+    If persistent_shell is True, shell commands are run in one long-lived
+    "adb shell" process (see AdbShellSession) instead of a new adb process
+    per command. The command is then interpreted by the device shell only,
+    without the host shell expansion of the one-shot mode. AndroidDevice
+    enables it by the persistent_adb_shell key of the device config.
     """
 
-    def __init__(self, serial="", log=None):
+    def __init__(self, serial="", log=None, persistent_shell=False):
         self.serial = serial
         if serial:
             self.adb_str = "adb -s {}".format(serial)
         else:
             self.adb_str = "adb"
         self.log = log
+        self.persistent_shell = persistent_shell
+        self._shell_session = None
+        self._client = None
+
+    @property
+    def client(self):
+        """An AdbClient which talks to the adb server without the adb binary.
+        """
+        if self._client is None:
+            self._client = adb_client.AdbClient(self.serial)
+        return self._client
+
+    def close_shell_session(self):
+        """Terminates the persistent shell process if there is one."""
+        if self._shell_session:
+            self._shell_session.close()
+
+    def _exec_shell_session_cmd(self,
+                                cmd,
+                                no_except=False,
+                                timeout=DEFAULT_ADB_TIMEOUT):
+        """Executes a shell command in the persistent shell session.
+
+        Args:
+            cmd: string, the shell command to execute.
+            no_except: bool, controls whether exception can be thrown.
+            timeout: float, timeout in seconds. If the command times out, the
+                     exit code is not 0.
+
+        Returns:
+            Same as _exec_cmd.
+
+        Raises:
+            AdbError if the command exit code is not 0 and exceptions are
+            allowed.
+        """
+        if self._shell_session is None:
+            self._shell_session = AdbShellSession(
+                self.adb_str.split() + ["shell"])
+        out, err, ret = self._shell_session.execute(cmd, timeout)
+        logging.debug("shell session cmd: %s, stdout: %s, stderr: %s, ret: %s",
+                      cmd, out, err, ret)
+        if no_except:
+            return {
+                const.STDOUT: out,
+                const.STDERR: err,
+                const.EXIT_CODE: ret,
+            }
+        if ret == 0:
+            return out
+        raise AdbError(
+            cmd="%s shell %s" % (self.adb_str, cmd),
+            stdout=out,
+            stderr=err,
+            ret_code=ret)
 
     def _exec_cmd(self, cmd, no_except=False, timeout=DEFAULT_ADB_TIMEOUT):
         """Executes adb commands in a new shell.
@@ -185,6 +452,8 @@ class AdbProxy():
             clean_name = name.replace('_', '-')
             arg_str = ' '.join(str(elem) for elem in args)
             if clean_name == 'shell':
+                if self.persistent_shell and arg_str:
+                    return self._exec_shell_session_cmd(arg_str, **kwargs)
                 arg_str = self._quote_wrap_shell_command(arg_str)
             elif "timeout" not in kwargs.keys():
                 # for non-shell command like adb pull/push/bugreport, set longer default timeout
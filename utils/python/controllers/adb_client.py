@@ -0,0 +1,399 @@
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""A client of the adb server's smart socket protocol.
+
+Unlike AdbProxy, which runs the adb binary for every command, AdbClient
+talks to the adb server directly. Every operation opens its own socket to the
+server, so several streams to a device can run concurrently in one process.
+
+The protocol is described in system/core/adb/OVERVIEW.TXT, SERVICES.TXT,
+and SYNC.TXT of the Android source tree.
+"""
+
+import logging
+import os
+import socket
+import stat
+import struct
+import time
+
+# Default address of the adb server.
+DEFAULT_ADB_SERVER_HOST = "localhost"
+DEFAULT_ADB_SERVER_PORT = 5037
+# Default socket timeout in seconds.
+DEFAULT_SOCKET_TIMEOUT = 300
+
+# Packet ids of the shell v2 protocol.
+_SHELL_ID_STDIN = 0
+_SHELL_ID_STDOUT = 1
+_SHELL_ID_STDERR = 2
+_SHELL_ID_EXIT = 3
+_SHELL_ID_CLOSE_STDIN = 4
+# Max size of a sync DATA packet.
+_SYNC_DATA_MAX = 64 * 1024
+# Default mode of pushed files.
+_DEFAULT_PUSH_MODE = 0o644
+# Size of one read from the socket of a stream.
+_READ_SIZE = 64 * 1024
+
+
+class AdbProtocolError(Exception):
+    """Raised when the adb server or the device rejects a request."""
+
+
+def _RecvExactly(sock, size):
+    """Receives a number of bytes from a socket.
+
+    Args:
+        sock: socket.socket, the socket to receive from.
+        size: int, number of bytes to receive.
+
+    Returns:
+        bytes, the received data.
+
+    Raises:
+        AdbProtocolError if the socket is closed before size bytes arrive.
+    """
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, _READ_SIZE))
+        if not chunk:
+            raise AdbProtocolError("Connection closed by adb server.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class AdbClient(object):
+    """A client of the adb server for one device.
+
+    Attributes:
+        serial: string, serial number of the device. Empty string selects
+                the only connected device.
+        host: string, host name of the adb server.
+        port: int, port of the adb server.
+        timeout: float, socket timeout in seconds.
+    """
+
+    def __init__(self,
+                 serial="",
+                 host=DEFAULT_ADB_SERVER_HOST,
+                 port=None,
+                 timeout=DEFAULT_SOCKET_TIMEOUT):
+        self.serial = serial
+        self.host = host
+        if port is None:
+            port = int(
+                os.environ.get("ANDROID_ADB_SERVER_PORT",
+                               DEFAULT_ADB_SERVER_PORT))
+        self.port = port
+        self.timeout = timeout
+
+    def _connect(self):
+        """Opens a socket to the adb server.
+
+        Returns:
+            socket.socket, the connected socket.
+        """
+        return socket.create_connection((self.host, self.port), self.timeout)
+
+    @staticmethod
+    def _send_request(sock, request):
+        """Sends a smart socket request and checks the status.
+
+        Args:
+            sock: socket.socket, connected to the adb server.
+            request: string, the request such as "host:version".
+
+        Raises:
+            AdbProtocolError if the server replies FAIL.
+        """
+        payload = request.encode("utf-8")
+        sock.sendall(("%04x" % len(payload)).encode("ascii") + payload)
+        status = _RecvExactly(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            length = int(_RecvExactly(sock, 4), 16)
+            message = _RecvExactly(sock, length).decode("utf-8", "replace")
+            raise AdbProtocolError("%s: %s" % (request, message))
+        raise AdbProtocolError("%s: unexpected status %r" % (request, status))
+
+    def _open_service(self, service):
+        """Opens a socket connected to a service on the device.
+
+        Args:
+            service: string, the device service such as "shell,v2:ls".
+
+        Returns:
+            socket.socket, the socket connected to the service.
+
+        Raises:
+            AdbProtocolError if the transport or the service is rejected.
+        """
+        sock = self._connect()
+        try:
+            if self.serial:
+                self._send_request(sock, "host:transport:%s" % self.serial)
+            else:
+                self._send_request(sock, "host:transport-any")
+            self._send_request(sock, service)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def host_command(self, request):
+        """Sends a host request which replies with a length-prefixed string.
+
+        Args:
+            request: string, e.g., "host:version" or "host:devices".
+
+        Returns:
+            bytes, the reply.
+        """
+        sock = self._connect()
+        try:
+            self._send_request(sock, request)
+            length = int(_RecvExactly(sock, 4), 16)
+            return _RecvExactly(sock, length)
+        finally:
+            sock.close()
+
+    def shell(self, cmd, stdin=None):
+        """Runs a command with the shell v2 protocol.
+
+        Args:
+            cmd: string, the shell command.
+            stdin: bytes, the data written to stdin of the command. None to
+                   close stdin immediately.
+
+        Returns:
+            tuple(bytes, bytes, int), containing stdout, stderr, and exit
+            code of the command.
+
+        Raises:
+            AdbProtocolError if the device does not support shell v2 or the
+            stream ends without an exit code.
+        """
+        stdout = []
+        stderr = []
+        for out, err, exit_code in self.shell_stream(cmd, stdin):
+            stdout.append(out)
+            stderr.append(err)
+        return b"".join(stdout), b"".join(stderr), exit_code
+
+    def shell_stream(self, cmd, stdin=None):
+        """Runs a command with the shell v2 protocol and streams its output.
+
+        Args:
+            cmd: string, the shell command.
+            stdin: bytes, the data written to stdin of the command. None to
+                   close stdin immediately.
+
+        Yields:
+            tuple(bytes, bytes, int), a chunk of stdout, a chunk of stderr,
+            and the exit code. Only one of them is set in a tuple; the others
+            are empty or None. The exit code is in the last tuple.
+
+        Raises:
+            AdbProtocolError if the device does not support shell v2 or the
+            stream ends without an exit code.
+        """
+        sock = self._open_service("shell,v2,raw:%s" % cmd)
+        try:
+            if stdin:
+                for offset in range(0, len(stdin), _SYNC_DATA_MAX):
+                    chunk = stdin[offset:offset + _SYNC_DATA_MAX]
+                    sock.sendall(
+                        struct.pack("<BI", _SHELL_ID_STDIN, len(chunk)) +
+                        chunk)
+            sock.sendall(struct.pack("<BI", _SHELL_ID_CLOSE_STDIN, 0))
+            while True:
+                header = sock.recv(5)
+                if not header:
+                    raise AdbProtocolError(
+                        "Shell stream ended without exit code: %s" % cmd)
+                if len(header) < 5:
+                    header += _RecvExactly(sock, 5 - len(header))
+                packet_id, length = struct.unpack("<BI", header)
+                data = _RecvExactly(sock, length)
+                if packet_id == _SHELL_ID_STDOUT:
+                    yield data, b"", None
+                elif packet_id == _SHELL_ID_STDERR:
+                    yield b"", data, None
+                elif packet_id == _SHELL_ID_EXIT:
+                    yield b"", b"", struct.unpack("<B", data[:1])[0]
+                    return
+                else:
+                    logging.debug("Ignoring shell packet %d", packet_id)
+        finally:
+            sock.close()
+
+    def exec_out_stream(self, cmd, chunk_size=_READ_SIZE):
+        """Runs a command with the exec service and streams its stdout.
+
+        The exec service does not use a PTY and does not mangle the output,
+        so binary output is transferred as it is. Stderr is not captured.
+
+        Args:
+            cmd: string, the command.
+            chunk_size: int, max number of bytes per chunk.
+
+        Yields:
+            bytes, chunks of the output.
+        """
+        sock = self._open_service("exec:%s" % cmd)
+        try:
+            while True:
+                chunk = sock.recv(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            sock.close()
+
+    def exec_out(self, cmd):
+        """Runs a command with the exec service.
+
+        Args:
+            cmd: string, the command.
+
+        Returns:
+            bytes, stdout of the command.
+        """
+        return b"".join(self.exec_out_stream(cmd))
+
+    def push(self, local, remote, mode=None, mtime=None):
+        """Pushes a file to the device with the sync protocol.
+
+        Args:
+            local: string, the path to the local file, or a file object
+                   opened for binary reading.
+            remote: string, the path on the device.
+            mode: int, permission bits of the remote file. Default is the
+                  mode of the local file, or 0644 for a file object.
+            mtime: int, modification time of the remote file. Default is the
+                   current time.
+
+        Returns:
+            int, number of bytes pushed.
+
+        Raises:
+            AdbProtocolError if the device rejects the file.
+        """
+        if isinstance(local, (str, type(u""))):
+            with open(local, "rb") as local_file:
+                if mode is None:
+                    mode = stat.S_IMODE(os.fstat(local_file.fileno()).st_mode)
+                return self.push(local_file, remote, mode, mtime)
+
+        if mode is None:
+            mode = _DEFAULT_PUSH_MODE
+        if mtime is None:
+            mtime = int(time.time())
+        sock = self._open_service("sync:")
+        try:
+            path_and_mode = ("%s,%d" % (remote, stat.S_IFREG | mode)).encode(
+                "utf-8")
+            sock.sendall(
+                b"SEND" + struct.pack("<I", len(path_and_mode)) +
+                path_and_mode)
+            size = 0
+            while True:
+                chunk = local.read(_SYNC_DATA_MAX)
+                if not chunk:
+                    break
+                sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                size += len(chunk)
+            sock.sendall(b"DONE" + struct.pack("<I", mtime))
+            status, length = struct.unpack("<4sI", _RecvExactly(sock, 8))
+            if status == b"FAIL":
+                raise AdbProtocolError(
+                    "push %s: %s" % (remote, _RecvExactly(sock, length).decode(
+                        "utf-8", "replace")))
+            if status != b"OKAY":
+                raise AdbProtocolError(
+                    "push %s: unexpected status %r" % (remote, status))
+            self._quit_sync(sock)
+            return size
+        finally:
+            sock.close()
+
+    def pull_stream(self, remote):
+        """Pulls a file from the device with the sync protocol.
+
+        Args:
+            remote: string, the path on the device.
+
+        Yields:
+            bytes, chunks of the file content.
+
+        Raises:
+            AdbProtocolError if the device fails to read the file.
+        """
+        sock = self._open_service("sync:")
+        try:
+            path = remote.encode("utf-8")
+            sock.sendall(b"RECV" + struct.pack("<I", len(path)) + path)
+            while True:
+                status, length = struct.unpack("<4sI", _RecvExactly(sock, 8))
+                if status == b"DATA":
+                    yield _RecvExactly(sock, length)
+                elif status == b"DONE":
+                    break
+                elif status == b"FAIL":
+                    raise AdbProtocolError("pull %s: %s" % (
+                        remote,
+                        _RecvExactly(sock, length).decode("utf-8", "replace")))
+                else:
+                    raise AdbProtocolError(
+                        "pull %s: unexpected status %r" % (remote, status))
+            self._quit_sync(sock)
+        finally:
+            sock.close()
+
+    def pull(self, remote, local):
+        """Pulls a file from the device to a local file.
+
+        Args:
+            remote: string, the path on the device.
+            local: string, the path to the local file, or a file object
+                   opened for binary writing.
+
+        Returns:
+            int, number of bytes pulled.
+        """
+        if isinstance(local, (str, type(u""))):
+            with open(local, "wb") as local_file:
+                return self.pull(remote, local_file)
+
+        size = 0
+        for chunk in self.pull_stream(remote):
+            local.write(chunk)
+            size += len(chunk)
+        return size
+
+    @staticmethod
+    def _quit_sync(sock):
+        """Ends a sync session.
+
+        Args:
+            sock: socket.socket, in sync mode.
+        """
+        try:
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+        except socket.error as e:
+            logging.debug("Failed to quit sync session: %s", e)
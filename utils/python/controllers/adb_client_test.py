@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import os
+import shutil
+import socketserver
+import struct
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from vts.utils.python.controllers import adb_client
+
+_SERIAL = "fake-serial"
+
+
+class FakeAdbServerHandler(socketserver.BaseRequestHandler):
+    """Serves one adb connection with a local shell and file system."""
+
+    def recvExactly(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def recvRequest(self):
+        return self.recvExactly(int(self.recvExactly(4), 16)).decode("utf-8")
+
+    def fail(self, message):
+        message = message.encode("utf-8")
+        self.request.sendall(b"FAIL" + b"%04x" % len(message) + message)
+
+    def handle(self):
+        try:
+            request = self.recvRequest()
+            if request == "host:version":
+                self.request.sendall(b"OKAY0004001f")
+                return
+            if request != "host:transport:" + _SERIAL:
+                self.fail("device '%s' not found" % request)
+                return
+            self.request.sendall(b"OKAY")
+            service = self.recvRequest()
+            if service.startswith("shell,v2,raw:"):
+                self.request.sendall(b"OKAY")
+                self.handleShell(service.split(":", 1)[1])
+            elif service.startswith("exec:"):
+                self.request.sendall(b"OKAY")
+                self.request.sendall(
+                    subprocess.check_output(service[5:], shell=True))
+            elif service == "sync:":
+                self.request.sendall(b"OKAY")
+                self.handleSync()
+            else:
+                self.fail("unknown service")
+        except EOFError:
+            pass
+
+    def handleShell(self, cmd):
+        stdin = b""
+        while True:
+            packet_id, length = struct.unpack("<BI", self.recvExactly(5))
+            if packet_id == 4:
+                break
+            stdin += self.recvExactly(length)
+        proc = subprocess.Popen(
+            cmd,
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        out, err = proc.communicate(stdin)
+        # Sends the output in small packets to test reassembly.
+        for packet_id, data in ((1, out), (2, err)):
+            for offset in range(0, len(data), 7):
+                chunk = data[offset:offset + 7]
+                self.request.sendall(
+                    struct.pack("<BI", packet_id, len(chunk)) + chunk)
+        self.request.sendall(struct.pack("<BIB", 3, 1, proc.returncode))
+
+    def handleSync(self):
+        while True:
+            command, length = struct.unpack("<4sI", self.recvExactly(8))
+            if command == b"QUIT":
+                return
+            payload = self.recvExactly(length).decode("utf-8")
+            if command == b"SEND":
+                path, mode = payload.rsplit(",", 1)
+                with open(path, "wb") as remote_file:
+                    while True:
+                        data_id, length = struct.unpack(
+                            "<4sI", self.recvExactly(8))
+                        if data_id == b"DONE":
+                            break
+                        remote_file.write(self.recvExactly(length))
+                os.chmod(path, int(mode) & 0o777)
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            elif command == b"RECV":
+                if not os.path.exists(payload):
+                    message = b"No such file or directory"
+                    self.request.sendall(
+                        b"FAIL" + struct.pack("<I", len(message)) + message)
+                    continue
+                with open(payload, "rb") as remote_file:
+                    while True:
+                        data = remote_file.read(1000)
+                        if not data:
+                            break
+                        self.request.sendall(
+                            b"DATA" + struct.pack("<I", len(data)) + data)
+                self.request.sendall(b"DONE" + struct.pack("<I", 0))
+
+
+class FakeAdbServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+
+class AdbClientTest(unittest.TestCase):
+    """Tests AdbClient against a fake adb server."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.server = FakeAdbServer(("localhost", 0), FakeAdbServerHandler)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.client = adb_client.AdbClient(
+            _SERIAL, port=self.server.server_address[1], timeout=10)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """TearDown tasks"""
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def testHostCommand(self):
+        """Tests a host request."""
+        self.assertEqual(self.client.host_command("host:version"), b"001f")
+
+    def testShell(self):
+        """Tests separate stdout, stderr, and exit code."""
+        self.assertEqual(
+            self.client.shell("echo output message; echo err >&2; exit 3"),
+            (b"output message\n", b"err\n", 3))
+        self.assertEqual(self.client.shell("cat", stdin=b"input"),
+                         (b"input", b"", 0))
+
+    def testShellStream(self):
+        """Tests that the output packets are streamed in order."""
+        packets = list(self.client.shell_stream("printf 0123456789; exit 2"))
+        self.assertEqual(packets, [(b"0123456", b"", None),
+                                   (b"789", b"", None), (b"", b"", 2)])
+
+    def testUnknownDevice(self):
+        """Tests that a rejected transport raises AdbProtocolError."""
+        client = adb_client.AdbClient("other", port=self.client.port)
+        with self.assertRaises(adb_client.AdbProtocolError):
+            client.shell("true")
+
+    def testExecOut(self):
+        """Tests the exec service."""
+        self.assertEqual(self.client.exec_out("printf 'a\\0b'"), b"a\0b")
+
+    def testPushPull(self):
+        """Tests push and pull of a multi-packet file."""
+        data = os.urandom(200 * 1024)
+        remote = os.path.join(self.temp_dir, "remote")
+        self.assertEqual(self.client.push(io.BytesIO(data), remote), len(data))
+        with open(remote, "rb") as remote_file:
+            self.assertEqual(remote_file.read(), data)
+
+        local = os.path.join(self.temp_dir, "local")
+        self.assertEqual(self.client.pull(remote, local), len(data))
+        with open(local, "rb") as local_file:
+            self.assertEqual(local_file.read(), data)
+
+    def testPullMissingFile(self):
+        """Tests that a failed pull raises AdbProtocolError."""
+        with self.assertRaises(adb_client.AdbProtocolError):
+            list(self.client.pull_stream(os.path.join(self.temp_dir, "none")))
+
+    def testConcurrentStreams(self):
+        """Tests that streams of one client can run concurrently."""
+        results = []
+
+        def Run(index):
+            results.append(self.client.shell("sleep 0.2; echo %d" % index))
+
+        threads = [threading.Thread(target=Run, args=(i, )) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            sorted(results), [(b"%d\n" % i, b"", 0) for i in range(5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import time
+import unittest
+
+from vts.runners.host import const
+from vts.utils.python.common import cmd_utils
+from vts.utils.python.controllers import adb
+
+_BENCHMARK_COMMAND_COUNT = 50
+
+
+class AdbShellSessionTest(unittest.TestCase):
+    """Tests AdbShellSession with a local shell in place of adb shell."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.session = adb.AdbShellSession(["sh"])
+
+    def tearDown(self):
+        """TearDown tasks"""
+        self.session.close()
+
+    def testExecute(self):
+        """Tests stdout, stderr, and exit code of commands."""
+        self.assertEqual(
+            self.session.execute("echo out; echo err >&2; false"),
+            (b"out\n", b"err\n", 1))
+        self.assertEqual(self.session.execute("printf abc"), (b"abc", b"", 0))
+        self.assertEqual(self.session.execute("exit_code() { return $1; }; "
+                                              "exit_code 3"), (b"", b"", 3))
+
+    def testLargeOutput(self):
+        """Tests that output larger than the pipe buffer is collected."""
+        out, err, ret = self.session.execute(
+            "i=0; while [ $i -lt 20000 ]; do echo line$i; i=$((i+1)); done")
+        self.assertEqual(ret, 0)
+        self.assertEqual(len(out.splitlines()), 20000)
+
+    def testStdinIsNotConsumed(self):
+        """Tests that a command reading stdin does not eat later commands."""
+        self.assertEqual(self.session.execute("cat"), (b"", b"", 0))
+        self.assertEqual(self.session.execute("echo next"), (b"next\n", b"", 0))
+
+    def testTimeoutRespawn(self):
+        """Tests that the shell is respawned after a timeout."""
+        out, err, ret = self.session.execute("echo a; sleep 10", timeout=0.5)
+        self.assertEqual(ret, cmd_utils.EXIT_CODE_TIMEOUT_ON_LINUX)
+        self.assertEqual(out, b"a\n")
+        self.assertEqual(self.session.execute("echo b"), (b"b\n", b"", 0))
+
+    def testExitRespawn(self):
+        """Tests that the shell is respawned after it exits."""
+        out, err, ret = self.session.execute("exit 5")
+        self.assertEqual(ret, 5)
+        self.assertEqual(self.session.execute("echo c"), (b"c\n", b"", 0))
+
+    def testMergedStderr(self):
+        """Tests a shell which merges stderr into stdout."""
+        session = adb.AdbShellSession(["sh", "-c", "exec sh 2>&1"])
+        self.addCleanup(session.close)
+        self.assertEqual(session.execute("echo hi", timeout=2),
+                         (b"hi\n", b"", 0))
+        self.assertEqual(session.execute("echo err >&2; false", timeout=2),
+                         (b"err\n", b"", 1))
+
+    def testAdbProxyShell(self):
+        """Tests that AdbProxy runs shell commands in its session."""
+        proxy = adb.AdbProxy(persistent_shell=True)
+        proxy._shell_session = self.session
+        self.assertEqual(proxy.shell("echo a"), b"a\n")
+        result = proxy.shell("exit 3", no_except=True)
+        self.assertEqual(result[const.EXIT_CODE], 3)
+        with self.assertRaises(adb.AdbError):
+            proxy.shell("false")
+
+    def testSessionBenchmark(self):
+        """Measures the per-command cost of one-shot and session commands."""
+        start = time.time()
+        for _ in range(_BENCHMARK_COMMAND_COUNT):
+            cmd_utils.ExecuteOneShellCommand("sh -c true", timeout=10)
+        one_shot_time = time.time() - start
+
+        start = time.time()
+        for _ in range(_BENCHMARK_COMMAND_COUNT):
+            self.session.execute("true")
+        session_time = time.time() - start
+
+        logging.info("per-command time: one-shot %.2f ms, session %.2f ms",
+                     one_shot_time * 1e3 / _BENCHMARK_COMMAND_COUNT,
+                     session_time * 1e3 / _BENCHMARK_COMMAND_COUNT)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
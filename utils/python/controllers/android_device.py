@@ -18,13 +18,17 @@
 #                    removed.
 from builtins import str
 from builtins import open
+from future.utils import raise_
 
+import collections
+import concurrent.futures
 import gzip
 import logging
 import os
 import re
 import socket
 import subprocess
+import sys
 import tempfile
 import threading
 import time
@@ -38,8 +42,10 @@ from vts.runners.host import logger as vts_logger
 from vts.runners.host import signals
 from vts.runners.host import utils
 from vts.runners.host.tcp_client import vts_tcp_client
+from vts.utils.python.common import readiness_utils
 from vts.utils.python.controllers import adb
 from vts.utils.python.controllers import fastboot
+from vts.utils.python.controllers import logcat_collector
 from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
 from vts.utils.python.mirror import mirror_tracker
 
@@ -65,6 +71,17 @@ LLKD = 'llkd-1'
 THREAD_SLEEP_TIME = 1
 # Max number of attempts that the client can make to connect to the agent
 MAX_AGENT_CONNECT_RETRIES = 10
+# Target-side file where the VTS agent writes its TCP port
+VTS_AGENT_PORT_FILE_PATH = "/data/local/tmp/vts_tcp_server_port"
+# Max time in seconds to wait for the VTS agent to accept commands.
+VTS_AGENT_READY_TIMEOUT_SEC = 30
+# Timeout in seconds of one connection and ping to the VTS agent.
+_VTS_AGENT_PROBE_TIMEOUT_SEC = 5
+# A device-side loop which returns when boot completes. It contains no "$" or
+# quotes so that it is passed through adb shell as it is.
+_WAIT_FOR_BOOT_COMPLETION_CMD = (
+    "until getprop sys.boot_completed | grep -qx 1 && "
+    "getprop dev.bootcomplete | grep -qx 1; do sleep 0.2; done")
 # System property for product sku.
 PROPERTY_PRODUCT_SKU = "ro.boot.product.hardware.sku"
 
@@ -80,6 +97,18 @@ SYSPROP_SYS_BOOT_COMPLETED = "sys.boot_completed"
 SYSPROP_VTS_NATIVE_SERVER = "vts.native_server.on"
 # Maximum time in seconds to wait for process/system status change.
 WAIT_TIMEOUT_SEC = 120
+# Prefix of the read-only system properties, which are served from
+# AndroidDevice.prop_snapshot.
+_READ_ONLY_PROP_PREFIX = "ro."
+# Matches a "[name]: [value]" entry of getprop output. A value may span lines.
+_GETPROP_ENTRY_PATTERN = re.compile(r"^\[([^\]]+)\]: \[(.*?)\]$",
+                                    re.MULTILINE | re.DOTALL)
+
+# Max number of devices whose services are started or stopped concurrently.
+_MAX_SERVICE_WORKERS = 8
+# Serializes the selection and forwarding of host ports among devices which
+# start services concurrently.
+_HOST_PORT_LOCK = threading.Lock()
 
 class AndroidDeviceError(signals.ControllerError):
     pass
@@ -119,37 +148,84 @@ def create(configs, start_services=True):
     return ads
 
 
-def destroy(ads):
+def destroy(ads, parallel=True):
     """Cleans up AndroidDevice objects.
 
+    A failure to clean up one device does not affect the others.
+
     Args:
         ads: A list of AndroidDevice objects.
+        parallel: bool, whether to clean up the devices concurrently.
     """
-    for ad in ads:
+
+    def _cleanUp(ad):
         try:
             ad.cleanUp()
         except:
             ad.log.exception("Failed to clean up properly.")
 
+    _runOnAds(_cleanUp, ads, parallel)
+
+
+def _runOnAds(func, ads, parallel):
+    """Runs a function on every AndroidDevice object.
+
+    Args:
+        func: function which takes an AndroidDevice object.
+        ads: A list of AndroidDevice objects.
+        parallel: bool, whether to run the function on the devices
+                  concurrently.
+
+    Returns:
+        A list of the sys.exc_info() tuples of the exceptions raised by the
+        function, or None for the devices without exceptions, in the order
+        of ads.
+    """
+
+    def _Run(ad):
+        try:
+            func(ad)
+        except Exception:
+            return sys.exc_info()
+        return None
+
+    if not parallel or len(ads) < 2:
+        return [_Run(ad) for ad in ads]
+
+    max_workers = min(len(ads), _MAX_SERVICE_WORKERS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(_Run, ad) for ad in ads]
+        return [future.result() for future in futures]
+
 
-def _startServicesOnAds(ads):
+def _startServicesOnAds(ads, parallel=True):
     """Starts long running services on multiple AndroidDevice objects.
 
-    If any one AndroidDevice object fails to start services, cleans up all
-    existing AndroidDevice objects and their services.
+    The services of the devices are started concurrently. If any one
+    AndroidDevice object fails to start services, waits for the other
+    devices, cleans up all AndroidDevice objects and their services, and
+    raises the first error.
 
     Args:
         ads: A list of AndroidDevice objects whose services to start.
+        parallel: bool, whether to start the services concurrently.
     """
-    running_ads = []
+    start_time = time.time()
+    exc_infos = _runOnAds(lambda ad: ad.startServices(), ads, parallel)
     for ad in ads:
-        running_ads.append(ad)
-        try:
-            ad.startServices()
-        except:
-            ad.log.exception("Failed to start some services, abort!")
-            destroy(running_ads)
-            raise
+        if ad.service_timing:
+            ad.log.info("Service start time: %s", ", ".join(
+                "%s %.2fs" % item for item in ad.service_timing.items()))
+    logging.info("Started services on %d device(s) in %.2fs", len(ads),
+                 time.time() - start_time)
+
+    failed = [(ad, exc) for ad, exc in zip(ads, exc_infos) if exc is not None]
+    if not failed:
+        return
+    for ad, exc in failed:
+        ad.log.error("Failed to start some services, abort! %s", exc[1])
+    destroy(ads, parallel)
+    raise_(*failed[0][1])
 
 
 def _parse_device_list(device_list_str, key):
@@ -221,7 +297,9 @@ def get_instances(serials):
 def get_instances_with_configs(configs):
     """Create AndroidDevice instances from a list of json configs.
 
-    Each config should have the required key-value pair "serial".
+    Each config should have the required key-value pair "serial". The
+    optional "persistent_adb_shell" enables the persistent shell session of
+    the device's AdbProxy.
 
     Args:
         configs: A list of dicts each representing the configuration of one
@@ -246,7 +324,10 @@ def get_instances_with_configs(configs):
                           keys.ConfigKeys.IKEY_PRODUCT_TYPE, c)
             product_type = ANDROID_PRODUCT_TYPE_UNKNOWN
 
-        ad = AndroidDevice(serial, product_type)
+        persistent_adb_shell = c.pop(
+            keys.ConfigKeys.IKEY_PERSISTENT_ADB_SHELL, False)
+        ad = AndroidDevice(serial, product_type,
+                           persistent_adb_shell=persistent_adb_shell)
         ad.loadConfig(c)
         results.append(ad)
     return results
@@ -348,6 +429,87 @@ def takeBugReports(ads, test_name, begin_time):
     utils.concurrent_exec(take_br, args)
 
 
+class SystemPropertySnapshot(object):
+    """A snapshot of all system properties of a device.
+
+    The snapshot is read by one "getprop" shell command when a property is
+    first requested, and kept until refresh() or invalidate() is called.
+
+    Attributes:
+        hits: int, number of lookups served from an existing snapshot.
+        misses: int, number of lookups which read a new snapshot.
+        _adb: AdbProxy, used to read the properties.
+        _props: dict of string to string, the property values. None if the
+                snapshot is not read or is invalidated.
+        _lock: threading.Lock, protects _props and the counters.
+    """
+
+    def __init__(self, adb_proxy):
+        self.hits = 0
+        self.misses = 0
+        self._adb = adb_proxy
+        self._props = None
+        self._lock = threading.Lock()
+
+    def get(self, name, timeout=adb.DEFAULT_ADB_SHORT_TIMEOUT):
+        """Gets a property value from the snapshot.
+
+        Args:
+            name: string, the name of the property.
+            timeout: int, seconds to wait for getprop if the snapshot needs
+                     to be read.
+
+        Returns:
+            string, value of the property. Empty string if the property does
+            not exist.
+
+        Raises:
+            AdbError, if getprop fails.
+        """
+        with self._lock:
+            if self._props is None:
+                self.misses += 1
+                self._props = self._read(timeout)
+            else:
+                self.hits += 1
+            return self._props.get(name, "")
+
+    def refresh(self, timeout=adb.DEFAULT_ADB_SHORT_TIMEOUT):
+        """Reads a new snapshot from the device.
+
+        Args:
+            timeout: int, seconds to wait for getprop.
+
+        Returns:
+            dict of string to string, a copy of the new snapshot.
+
+        Raises:
+            AdbError, if getprop fails.
+        """
+        props = self._read(timeout)
+        with self._lock:
+            self._props = props
+            return dict(props)
+
+    def invalidate(self):
+        """Discards the snapshot, so that the next lookup reads a new one."""
+        with self._lock:
+            self._props = None
+
+    def _read(self, timeout):
+        """Reads all properties by one getprop command.
+
+        Args:
+            timeout: int, seconds to wait for getprop.
+
+        Returns:
+            dict of string to string, the property values.
+        """
+        out = self._adb.shell("getprop", timeout=timeout).decode("utf-8")
+        return dict((name, value.strip())
+                    for name, value in _GETPROP_ENTRY_PATTERN.findall(out))
+
+
 class AndroidDevice(object):
     """Class representing an android device.
 
@@ -367,8 +529,10 @@ class AndroidDevice(object):
         log_path: A string that is the path where all logs collected on this
                   android device should be stored.
         adb_logcat_process: A process that collects the adb logcat.
-        adb_logcat_file_path: A string that's the full path to the adb logcat
-                              file collected, if any.
+        adb_logcat_collector: LogcatCollector, which reads the adb logcat
+                              process and indexes the log of test cases.
+        adb_logcat_file_path: A string that's the path prefix of the adb
+                              logcat files collected, if any.
         vts_agent_process: A process that runs the HAL agent.
         adb: An AdbProxy object used for interacting with the device via adb.
         fastboot: A FastbootProxy object used for interacting with the device
@@ -385,6 +549,11 @@ class AndroidDevice(object):
              native libs.
         shell: ShellMirror, in charge of all communications with shell.
         shell_default_nohup: bool, whether to use nohup by default in shell commands.
+        prop_snapshot: SystemPropertySnapshot, serves the read-only system
+                       properties. It is invalidated by reboot, setProp, and
+                       Heal.
+        service_timing: OrderedDict, the name of each phase of the last
+                        startServices call to its duration in seconds.
         _product_type: A string, the device product type (e.g., bullhead) if
                        known, ANDROID_PRODUCT_TYPE_UNKNOWN otherwise.
     """
@@ -393,7 +562,8 @@ class AndroidDevice(object):
                  serial="",
                  product_type=ANDROID_PRODUCT_TYPE_UNKNOWN,
                  device_callback_port=5010,
-                 shell_default_nohup=False):
+                 shell_default_nohup=False,
+                 persistent_adb_shell=False):
         self.serial = serial
         self._product_type = product_type
         self.device_command_port = None
@@ -403,9 +573,11 @@ class AndroidDevice(object):
         base_log_path = getattr(logging, "log_path", "/tmp/logs/")
         self.log_path = os.path.join(base_log_path, "AndroidDevice%s" % serial)
         self.adb_logcat_process = None
+        self.adb_logcat_collector = None
         self.adb_logcat_file_path = None
         self.vts_agent_process = None
-        self.adb = adb.AdbProxy(serial)
+        self.adb = adb.AdbProxy(serial, persistent_shell=persistent_adb_shell)
+        self.prop_snapshot = SystemPropertySnapshot(self.adb)
         self.fastboot = fastboot.FastbootProxy(serial)
         if not self.isBootloaderMode:
             self.rootAdb()
@@ -419,6 +591,7 @@ class AndroidDevice(object):
         self.shell = None
         self.shell_default_nohup = shell_default_nohup
         self.fatal_error = False
+        self.service_timing = collections.OrderedDict()
 
     def __del__(self):
         self.cleanUp()
@@ -433,6 +606,7 @@ class AndroidDevice(object):
             self.adb.forward("--remove tcp:%s" % self.host_command_port,
                              timeout=adb.DEFAULT_ADB_SHORT_TIMEOUT)
             self.host_command_port = None
+        self.adb.close_shell_session()
 
     @property
     def shell_default_nohup(self):
@@ -452,6 +626,7 @@ class AndroidDevice(object):
     def hasVbmetaSlot(self):
         """True if the device has the slot for vbmeta."""
         if not self.isBootloaderMode:
+            self.prop_snapshot.invalidate()
             self.adb.reboot_bootloader()
 
         out = self.fastboot.getvar(_FASTBOOT_VAR_HAS_VBMETA).strip()
@@ -787,8 +962,8 @@ class AndroidDevice(object):
                 logging.exception(e)
 
     def startAdbLogcat(self):
-        """Starts a standing adb logcat collection in separate subprocesses and
-        save the logcat in a file.
+        """Starts a standing adb logcat collection in a subprocess and saves
+        the logcat in rotated, compressed files.
         """
         if self.isAdbLogcatOn:
             raise AndroidDeviceError(("Android device %s already has an adb "
@@ -797,17 +972,19 @@ class AndroidDevice(object):
         event = tfi.Begin("start adb logcat from android_device",
                           tfi.categories.FRAMEWORK_SETUP)
 
-        f_name = "adblog_%s_%s.txt" % (self.model, self.serial)
+        f_name = "adblog_%s_%s" % (self.model, self.serial)
         utils.create_dir(self.log_path)
         logcat_file_path = os.path.join(self.log_path, f_name)
         try:
             extra_params = self.adb_logcat_param
         except AttributeError:
             extra_params = "-b all"
-        cmd = "adb -s %s logcat -v threadtime %s >> %s" % (self.serial,
-                                                           extra_params,
-                                                           logcat_file_path)
-        self.adb_logcat_process = utils.start_standing_subprocess(cmd)
+        cmd = ["adb", "-s", self.serial, "logcat", "-v", "threadtime"]
+        cmd.extend(extra_params.split())
+        self.adb_logcat_collector = logcat_collector.LogcatCollector(
+            cmd, logcat_file_path)
+        self.adb_logcat_collector.start()
+        self.adb_logcat_process = self.adb_logcat_collector.process
         self.adb_logcat_file_path = logcat_file_path
         event.End()
 
@@ -821,11 +998,7 @@ class AndroidDevice(object):
 
         event = tfi.Begin("stop adb logcat from android_device",
                           tfi.categories.FRAMEWORK_TEARDOWN)
-        try:
-            utils.stop_standing_subprocess(self.adb_logcat_process)
-        except utils.VTSUtilsError as e:
-            event.Remove("Cannot stop adb logcat. %s" % e)
-            logging.error("Cannot stop adb logcat. %s", e)
+        self.adb_logcat_collector.stop()
         self.adb_logcat_process = None
         event.End()
 
@@ -849,6 +1022,9 @@ class AndroidDevice(object):
     def waitForBootCompletion(self, timeout=900):
         """Waits for Android framework to broadcast ACTION_BOOT_COMPLETED.
 
+        The boot properties are watched by a loop on the device, so that the
+        host does not poll them with one adb command per second.
+
         Args:
             timeout: int, seconds to wait for boot completion. Default is
                      15 minutes.
@@ -856,7 +1032,7 @@ class AndroidDevice(object):
         Returns:
             bool, True if boot completed. False if any error or timeout
         """
-        start = time.time()
+        deadline = time.time() + timeout
         try:
             self.adb.wait_for_device(timeout=timeout)
         except adb.AdbError as e:
@@ -864,13 +1040,22 @@ class AndroidDevice(object):
             logging.exception(e)
             return False
 
-        while not self.isBootCompleted():
-            if time.time() - start >= timeout:
-                logging.error("Timeout while waiting for boot completion.")
+        def _WaitOnDevice():
+            remaining = deadline - time.time()
+            if remaining <= 0:
                 return False
-            time.sleep(1)
-
-        return True
+            # adb shell may be disconnected while adbd restarts during boot,
+            # which raises AdbError and is retried.
+            self.adb.shell(_WAIT_FOR_BOOT_COMPLETION_CMD, timeout=remaining)
+            return self.isBootCompleted()
+
+        if readiness_utils.WaitUntil(
+                _WaitOnDevice,
+                timeout=max(deadline - time.time(), 0),
+                ignored_exceptions=(adb.AdbError, )):
+            return True
+        logging.error("Timeout while waiting for boot completion.")
+        return False
 
     # Deprecated. Use isBootCompleted instead
     def hasBooted(self):
@@ -1095,11 +1280,16 @@ class AndroidDevice(object):
                           "is not yet supported. No property is set.")
             return
 
+        self.prop_snapshot.invalidate()
         self.adb.shell("setprop %s \"%s\"" % (name, value))
 
     def getProp(self, name, timeout=adb.DEFAULT_ADB_SHORT_TIMEOUT):
         """Calls getprop shell command.
 
+        Read-only properties (ro.*) are served from prop_snapshot, which reads
+        all properties by one getprop command. Other properties may change at
+        any time, so they are always read from the device.
+
         Args:
             name: string, the name of a system property to get
 
@@ -1116,9 +1306,20 @@ class AndroidDevice(object):
             logging.error("name of system property should not be None.")
             return None
 
+        if name.startswith(_READ_ONLY_PROP_PREFIX):
+            return self.prop_snapshot.get(name, timeout=timeout)
+
         out = self.adb.shell("getprop %s" % name, timeout=timeout)
         return out.decode("utf-8").strip()
 
+    def refreshProps(self):
+        """Reads a new snapshot of the system properties.
+
+        Returns:
+            dict of string to string, all system properties of the device.
+        """
+        return self.prop_snapshot.refresh()
+
     def reboot(self, restart_services=True):
         """Reboots the device and wait for device to complete booting.
 
@@ -1129,6 +1330,7 @@ class AndroidDevice(object):
             AndroidDeviceError is raised if waiting for completion timed
             out.
         """
+        self.prop_snapshot.invalidate()
         if self.isBootloaderMode:
             self.fastboot.reboot()
             return
@@ -1146,6 +1348,7 @@ class AndroidDevice(object):
                 self.stopVtsAgent()
 
         self.adb.reboot()
+        self.prop_snapshot.invalidate()
         self.waitForBootCompletion()
         self.rootAdb()
 
@@ -1160,10 +1363,20 @@ class AndroidDevice(object):
 
         1. Start adb logcat capture.
         2. Start VtsAgent and create HalMirror unless disabled in config.
+
+        The duration of each phase is recorded in service_timing.
         """
         event = tfi.Begin("start vts services",
                           tfi.categories.FRAMEWORK_SETUP)
 
+        self.service_timing = collections.OrderedDict()
+        phase_start = [time.time()]
+
+        def _EndPhase(name):
+            now = time.time()
+            self.service_timing[name] = now - phase_start[0]
+            phase_start[0] = now
+
         self.enable_vts_agent = getattr(self, "enable_vts_agent", True)
         try:
             self.startAdbLogcat()
@@ -1173,15 +1386,23 @@ class AndroidDevice(object):
             self.log.error(msg)
             self.log.exception(e)
             raise
+        _EndPhase("adb logcat")
         if self.enable_vts_agent:
             self.startVtsAgent()
-            self.device_command_port = int(
-                self.adb.shell("cat /data/local/tmp/vts_tcp_server_port"))
+            _EndPhase("vts agent")
             logging.debug("device_command_port: %s", self.device_command_port)
-            if not self.host_command_port:
-                self.host_command_port = adb.get_available_host_port()
-            self.adb.tcp_forward(self.host_command_port,
-                                 self.device_command_port)
+            with _HOST_PORT_LOCK:
+                if not self.host_command_port:
+                    self.host_command_port = adb.get_available_host_port()
+                self.adb.tcp_forward(self.host_command_port,
+                                     self.device_command_port)
+            _EndPhase("port forwarding")
+            if not readiness_utils.WaitUntil(self._pingVtsAgent,
+                                             VTS_AGENT_READY_TIMEOUT_SEC):
+                msg = "VTS agent does not respond to ping."
+                event.Remove(msg)
+                raise AndroidDeviceError(msg)
+            _EndPhase("vts agent ping")
             self.hal = mirror_tracker.MirrorTracker(
                 self.host_command_port, self.host_callback_port, True)
             self.lib = mirror_tracker.MirrorTracker(self.host_command_port)
@@ -1189,6 +1410,7 @@ class AndroidDevice(object):
                 host_command_port=self.host_command_port, adb=self.adb)
             self.shell.shell_default_nohup = self.shell_default_nohup
             self.resource = mirror_tracker.MirrorTracker(self.host_command_port)
+            _EndPhase("mirrors")
         event.End()
 
     def Heal(self):
@@ -1204,6 +1426,7 @@ class AndroidDevice(object):
         if self.shell:
             res &= self.shell.Heal()
 
+        self.prop_snapshot.invalidate()
         try:
             self.getProp("ro.build.version.sdk")
         except adb.AdbError:
@@ -1274,7 +1497,8 @@ class AndroidDevice(object):
         event_cleanup = tfi.Begin("start vts agent -- cleanup", tfi.categories.FRAMEWORK_SETUP)
         cleanup_commands = [
             "rm -f /data/local/tmp/vts_driver_*",
-            "rm -f /data/local/tmp/vts_agent_callback*"
+            "rm -f /data/local/tmp/vts_agent_callback*",
+            "rm -f %s" % VTS_AGENT_PORT_FILE_PATH
         ]
 
         kill_command = "pgrep 'vts_*' | xargs kill"
@@ -1316,10 +1540,12 @@ class AndroidDevice(object):
                        log=vts_agent_log_path,
                        severity=log_severity)
             try:
-                self.vts_agent_process = utils.start_standing_subprocess(
-                    cmd, check_health_delay=1)
+                self.vts_agent_process = utils.start_standing_subprocess(cmd)
+                self.device_command_port = self._waitForVtsAgentPort()
                 break
             except utils.VTSUtilsError as e:
+                if self.vts_agent_process:
+                    self.stopVtsAgent()
                 logging.exception(e)
                 with open(vts_agent_log_path, 'r') as log_file:
                     logging.error("VTS agent output:\n")
@@ -1335,6 +1561,63 @@ class AndroidDevice(object):
                     logging.error('retrying using a 32-bit binary.')
         event.End()
 
+    def _waitForVtsAgentPort(self):
+        """Waits for the VTS agent to write its TCP port.
+
+        Returns:
+            int, the TCP port of the agent on the device.
+
+        Raises:
+            VTSUtilsError if the agent process terminates or the port is not
+            written within VTS_AGENT_READY_TIMEOUT_SEC.
+        """
+        proc = self.vts_agent_process
+
+        def _ReadPort():
+            ret = proc.poll()
+            if ret is not None:
+                raise utils.VTSUtilsError(
+                    "VTS agent has terminated. ret: %d" % ret)
+            out = self.adb.shell(
+                "cat %s" % VTS_AGENT_PORT_FILE_PATH,
+                no_except=True,
+                timeout=adb.DEFAULT_ADB_SHORT_TIMEOUT)
+            port = str(out[const.STDOUT]).strip()
+            if out[const.EXIT_CODE] == 0 and port.isdigit():
+                return int(port)
+            return None
+
+        port = readiness_utils.WaitUntil(_ReadPort,
+                                         VTS_AGENT_READY_TIMEOUT_SEC)
+        if port is None:
+            raise utils.VTSUtilsError(
+                "VTS agent did not write %s in %d seconds." %
+                (VTS_AGENT_PORT_FILE_PATH, VTS_AGENT_READY_TIMEOUT_SEC))
+        return port
+
+    def _pingVtsAgent(self):
+        """Pings the VTS agent through the forwarded host command port.
+
+        Returns:
+            True if the agent responds, False otherwise.
+        """
+        if not readiness_utils.IsPortOpen("localhost", self.host_command_port,
+                                          _VTS_AGENT_PROBE_TIMEOUT_SEC):
+            return False
+        client = vts_tcp_client.VtsTcpClient(
+            timeout=_VTS_AGENT_PROBE_TIMEOUT_SEC)
+        try:
+            client.Connect(
+                command_port=self.host_command_port,
+                retry=1,
+                timeout=_VTS_AGENT_PROBE_TIMEOUT_SEC)
+            return client.Ping()
+        except (socket.error, errors.VtsError) as e:
+            logging.debug("Failed to ping VTS agent: %s", e)
+            return False
+        finally:
+            client.Disconnect()
+
     def stopVtsAgent(self):
         """Stop the HAL agent running on the AndroidDevice.
         """
@@ -15,9 +15,132 @@
 # limitations under the License.
 #
 
+import collections
+import logging
+import sys
+import time
+import traceback
 import unittest
 import vts.utils.python.controllers.android_device as android_device
 
+_GETPROP_OUTPUT = b"""[dev.bootcomplete]: [1]
+[ro.build.version.sdk]: [28]
+[ro.product.name]: [ product ]
+[ro.multiline]: [line1
+line2]
+[ro.empty]: []
+"""
+
+
+class FakeAdb(object):
+    """A fake AdbProxy which records the shell commands."""
+
+    def __init__(self):
+        self.commands = []
+
+    def shell(self, command, timeout=None):
+        self.commands.append(command)
+        return _GETPROP_OUTPUT
+
+
+class SystemPropertySnapshotTest(unittest.TestCase):
+    """Tests SystemPropertySnapshot."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.adb = FakeAdb()
+        self.snapshot = android_device.SystemPropertySnapshot(self.adb)
+
+    def testGet(self):
+        """Tests that one getprop command serves all lookups."""
+        self.assertEqual(self.snapshot.get("ro.build.version.sdk"), "28")
+        self.assertEqual(self.snapshot.get("ro.product.name"), "product")
+        self.assertEqual(self.snapshot.get("ro.multiline"), "line1\nline2")
+        self.assertEqual(self.snapshot.get("ro.empty"), "")
+        self.assertEqual(self.snapshot.get("ro.unknown"), "")
+        self.assertEqual(self.adb.commands, ["getprop"])
+        self.assertEqual((self.snapshot.hits, self.snapshot.misses), (4, 1))
+
+    def testInvalidate(self):
+        """Tests that lookups after invalidate() read a new snapshot."""
+        self.snapshot.get("ro.build.version.sdk")
+        self.snapshot.invalidate()
+        self.snapshot.get("ro.build.version.sdk")
+        self.assertEqual(self.adb.commands, ["getprop", "getprop"])
+        self.assertEqual(self.snapshot.misses, 2)
+
+    def testRefresh(self):
+        """Tests that refresh() reads and returns a new snapshot."""
+        props = self.snapshot.refresh()
+        self.assertEqual(props["dev.bootcomplete"], "1")
+        self.assertEqual(self.snapshot.get("dev.bootcomplete"), "1")
+        self.assertEqual(self.adb.commands, ["getprop"])
+        self.assertEqual((self.snapshot.hits, self.snapshot.misses), (1, 0))
+
+
+class FakeAndroidDevice(object):
+    """A fake AndroidDevice whose services take a fixed time to start."""
+
+    def __init__(self, serial, start_delay, fail=False):
+        self.serial = serial
+        self.log = logging.getLogger()
+        self.service_timing = collections.OrderedDict()
+        self._start_delay = start_delay
+        self._fail = fail
+        self.started = False
+        self.cleaned_up = False
+
+    def startServices(self):
+        time.sleep(self._start_delay)
+        if self._fail:
+            raise android_device.AndroidDeviceError(self.serial)
+        self.service_timing["vts agent"] = self._start_delay
+        self.started = True
+
+    def cleanUp(self):
+        self.cleaned_up = True
+
+
+class ServicesOnAdsTest(unittest.TestCase):
+    """Tests starting and stopping services on multiple devices."""
+
+    def testParallelStart(self):
+        """Tests that the services of the devices start concurrently."""
+        ads = [FakeAndroidDevice(str(i), 0.2) for i in range(4)]
+        start_time = time.time()
+        android_device._startServicesOnAds(ads)
+        self.assertLess(time.time() - start_time, 0.6)
+        self.assertTrue(all(ad.started for ad in ads))
+        self.assertFalse(any(ad.cleaned_up for ad in ads))
+
+    def testFailureIsolation(self):
+        """Tests that one failure lets the others finish and cleans up all."""
+        ads = [
+            FakeAndroidDevice("0", 0.1),
+            FakeAndroidDevice("1", 0, fail=True),
+            FakeAndroidDevice("2", 0.1),
+        ]
+        try:
+            android_device._startServicesOnAds(ads)
+            self.fail("AndroidDeviceError is not raised.")
+        except android_device.AndroidDeviceError:
+            # The traceback ends in the worker thread.
+            frames = traceback.extract_tb(sys.exc_info()[2])
+            self.assertEqual(frames[-1][2], "startServices")
+        self.assertEqual([ad.started for ad in ads], [True, False, True])
+        self.assertTrue(all(ad.cleaned_up for ad in ads))
+
+    def testDestroy(self):
+        """Tests that a failed clean-up does not affect the others."""
+        ads = [FakeAndroidDevice(str(i), 0) for i in range(3)]
+
+        def _fail():
+            raise android_device.AndroidDeviceError("fail")
+
+        ads[0].cleanUp = _fail
+        android_device.destroy(ads)
+        self.assertEqual([ad.cleaned_up for ad in ads], [False, True, True])
+
 
 class AndroidDeviceTest(unittest.TestCase):
     '''Test methods inside android_device module.'''
@@ -0,0 +1,308 @@
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Collects the output of adb logcat into rotated, compressed segments.
+
+A segment is a gzip file which consists of several gzip members. A member
+ends at every mark, so a position in the log is a segment index and the
+offset of a member in that segment. The log between two positions can be
+decompressed without reading the preceding members.
+"""
+
+import logging
+import os
+import subprocess
+import threading
+import zlib
+
+# Default max size of the uncompressed log in one segment.
+DEFAULT_MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+# Default compression level of the segments.
+DEFAULT_COMPRESSION_LEVEL = 6
+# File name extension of the segments.
+SEGMENT_EXTENSION = ".txt.gz"
+# Size of one read from a segment file.
+_READ_SIZE = 64 * 1024
+# zlib window bits for the gzip format.
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class LogcatCollector(object):
+    """Reads logcat from a subprocess and writes compressed segments.
+
+    Attributes:
+        cmd: list of strings, the logcat command.
+        path_prefix: string, the path of the segments without index and
+                     extension.
+        max_segment_size: int, max number of uncompressed bytes per segment.
+        compression_level: int, zlib compression level.
+        process: subprocess.Popen, the logcat process. None if not started.
+        segment_paths: list of strings, the paths of the written segments.
+                       The segments of earlier collectors with the same
+                       path_prefix are kept, and the file names continue
+                       their numbering.
+        _test_positions: dict, test name to a list of begin and end
+                         positions. The end position is None until the test
+                         ends.
+        _file: file object, the segment being written.
+        _compressor: zlib compressor of the current gzip member.
+        _segment_size: int, number of uncompressed bytes in the segment.
+        _file_index: int, the number in the file name of the next segment.
+        _thread: threading.Thread, the reader thread.
+        _lock: threading.Lock, protects the segment being written.
+    """
+
+    def __init__(self,
+                 cmd,
+                 path_prefix,
+                 max_segment_size=DEFAULT_MAX_SEGMENT_SIZE,
+                 compression_level=DEFAULT_COMPRESSION_LEVEL):
+        self.cmd = cmd
+        self.path_prefix = path_prefix
+        self.max_segment_size = max_segment_size
+        self.compression_level = compression_level
+        self.process = None
+        self.segment_paths = []
+        self._test_positions = {}
+        self._file = None
+        self._compressor = None
+        self._segment_size = 0
+        self._file_index = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def isRunning(self):
+        """Whether the reader thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the logcat process and the reader thread."""
+        with self._lock:
+            self._openSegment()
+        self.process = subprocess.Popen(
+            self.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the logcat process and closes the segment."""
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.terminate()
+            except OSError as e:
+                logging.error("Cannot stop logcat: %s", e)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.process:
+            self.process.wait()
+            self.process = None
+        with self._lock:
+            self._closeSegment()
+
+    def _read(self):
+        """Writes the lines of the logcat process until it exits."""
+        for line in iter(self.process.stdout.readline, b""):
+            self.write(line)
+
+    def write(self, data):
+        """Writes data to the current segment.
+
+        A new segment is started when the current one exceeds
+        max_segment_size.
+
+        Args:
+            data: bytes, the data to write.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            if (self._segment_size and
+                    self._segment_size + len(data) > self.max_segment_size):
+                self._closeSegment()
+                self._openSegment()
+            self._file.write(self._compressor.compress(data))
+            self._segment_size += len(data)
+
+    def mark(self):
+        """Ends the current gzip member and gets the position.
+
+        Returns:
+            tuple of (int, int), the index of the segment and the offset of
+            the next member. None if no segment is open.
+        """
+        with self._lock:
+            if self._file is None:
+                return None
+            self._endMember()
+            self._file.flush()
+            return len(self.segment_paths) - 1, self._file.tell()
+
+    def beginTest(self, test_name):
+        """Records the beginning position of a test case.
+
+        Args:
+            test_name: string, the name of the test case.
+        """
+        position = self.mark()
+        if position is not None:
+            self._test_positions[test_name] = [position, None]
+
+    def endTest(self, test_name):
+        """Records the end position of a test case.
+
+        Args:
+            test_name: string, the name of the test case.
+        """
+        positions = self._test_positions.get(test_name)
+        if positions is not None:
+            positions[1] = self.mark()
+
+    def readTest(self, test_name):
+        """Reads the log of a test case.
+
+        If the test case has not ended, reads until the current position, or
+        the end of the log if the collector is stopped.
+
+        Args:
+            test_name: string, the name of the test case.
+
+        Returns:
+            An iterator of bytes, chunks of the uncompressed log.
+
+        Raises:
+            KeyError if the beginning of the test case is not recorded.
+        """
+        begin, end = self._test_positions[test_name]
+        if end is None:
+            end = self.mark() or (len(self.segment_paths) - 1, None)
+        return self.readSlice(begin, end)
+
+    def dumpTest(self, test_name, file_path):
+        """Writes the log of a test case to a file.
+
+        Args:
+            test_name: string, the name of the test case.
+            file_path: string, the path to the output file.
+
+        Returns:
+            int, number of bytes written. None if the test case is not
+            recorded.
+        """
+        if test_name not in self._test_positions:
+            return None
+        size = 0
+        with open(file_path, "wb") as out_file:
+            for chunk in self.readTest(test_name):
+                out_file.write(chunk)
+                size += len(chunk)
+        return size
+
+    def readSlice(self, begin, end):
+        """Reads the log between two positions returned by mark.
+
+        Only the members between the positions are decompressed.
+
+        Args:
+            begin: tuple of (int, int), the beginning position.
+            end: tuple of (int, int), the end position.
+
+        Yields:
+            bytes, chunks of the uncompressed log.
+        """
+        for index in range(begin[0], end[0] + 1):
+            start = begin[1] if index == begin[0] else 0
+            stop = end[1] if index == end[0] else None
+            try:
+                segment = open(self.segment_paths[index], "rb")
+            except IOError as e:
+                logging.error("Cannot read logcat segment: %s", e)
+                continue
+            with segment:
+                segment.seek(start)
+                for chunk in _DecompressMembers(segment, start, stop):
+                    yield chunk
+
+    def _openSegment(self):
+        """Opens a new segment. The caller must hold the lock."""
+        while True:
+            path = "%s_%03d%s" % (self.path_prefix, self._file_index,
+                                  SEGMENT_EXTENSION)
+            self._file_index += 1
+            if not os.path.exists(path):
+                break
+        self._file = open(path, "wb")
+        self._compressor = self._newCompressor()
+        self._segment_size = 0
+        self.segment_paths.append(path)
+
+    def _closeSegment(self):
+        """Closes the current segment. The caller must hold the lock."""
+        if self._file is None:
+            return
+        self._file.write(self._compressor.flush())
+        self._file.close()
+        self._file = None
+        self._compressor = None
+
+    def _endMember(self):
+        """Ends the current gzip member. The caller must hold the lock."""
+        self._file.write(self._compressor.flush())
+        self._compressor = self._newCompressor()
+
+    def _newCompressor(self):
+        """Creates a compressor of a gzip member.
+
+        Returns:
+            A zlib compressor object.
+        """
+        return zlib.compressobj(self.compression_level, zlib.DEFLATED,
+                                _GZIP_WBITS)
+
+
+def _DecompressMembers(segment, start, stop):
+    """Decompresses consecutive gzip members of a file.
+
+    Args:
+        segment: file object, positioned at the first member.
+        start: int, the offset of the first member.
+        stop: int, the offset where decompression stops. None to read to the
+              end of the file.
+
+    Yields:
+        bytes, chunks of the uncompressed data.
+    """
+    remaining = None if stop is None else stop - start
+    decompressor = zlib.decompressobj(_GZIP_WBITS)
+    while remaining is None or remaining > 0:
+        size = _READ_SIZE if remaining is None else min(_READ_SIZE, remaining)
+        data = segment.read(size)
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        while data:
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            data = decompressor.unused_data
+            if data:
+                # The member ends. The rest of the data is the next member.
+                decompressor = zlib.decompressobj(_GZIP_WBITS)
+    # A member which is still being written may be incomplete.
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
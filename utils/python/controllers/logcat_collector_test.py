@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from vts.utils.python.controllers import logcat_collector
+
+
+def _ReadSegments(collector):
+    """Reads all segments with the gzip module."""
+    data = b""
+    for path in collector.segment_paths:
+        with gzip.open(path, "rb") as segment:
+            data += segment.read()
+    return data
+
+
+class LogcatCollectorTest(unittest.TestCase):
+    """Tests LogcatCollector with local commands in place of adb logcat."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.temp_dir, "adblog")
+
+    def tearDown(self):
+        """TearDown tasks"""
+        shutil.rmtree(self.temp_dir)
+
+    def testCollect(self):
+        """Tests that the output of the process is compressed."""
+        collector = logcat_collector.LogcatCollector(
+            ["sh", "-c", "i=0; while [ $i -lt 1000 ]; do "
+             "echo line $i; i=$((i+1)); done"], self.prefix)
+        collector.start()
+        collector._thread.join()
+        collector.stop()
+        self.assertFalse(collector.isRunning)
+        expected = b"".join(b"line %d\n" % i for i in range(1000))
+        self.assertEqual(_ReadSegments(collector), expected)
+        self.assertEqual(collector.segment_paths, [self.prefix + "_000.txt.gz"])
+        self.assertLess(
+            os.path.getsize(collector.segment_paths[0]), len(expected))
+
+    def testRestart(self):
+        """Tests that a new collector keeps the segments of an earlier one."""
+        paths = []
+        for line in (b"first\n", b"second\n"):
+            collector = logcat_collector.LogcatCollector(["sleep", "10"],
+                                                         self.prefix)
+            collector.start()
+            collector.write(line)
+            collector.stop()
+            paths.extend(collector.segment_paths)
+            self.assertEqual(_ReadSegments(collector), line)
+        self.assertEqual(paths, [self.prefix + "_000.txt.gz",
+                                 self.prefix + "_001.txt.gz"])
+
+    def testRotation(self):
+        """Tests that segments are rotated at line boundaries."""
+        collector = logcat_collector.LogcatCollector(
+            ["sleep", "10"], self.prefix, max_segment_size=100)
+        collector.start()
+        lines = [b"%09d\n" % i for i in range(50)]
+        for line in lines:
+            collector.write(line)
+        collector.stop()
+        self.assertEqual(len(collector.segment_paths), 5)
+        self.assertEqual(_ReadSegments(collector), b"".join(lines))
+        with gzip.open(collector.segment_paths[1], "rb") as segment:
+            self.assertEqual(segment.read(), b"".join(lines[10:20]))
+
+    def testTestSlices(self):
+        """Tests the log of test cases across segments."""
+        collector = logcat_collector.LogcatCollector(
+            ["sleep", "10"], self.prefix, max_segment_size=100)
+        collector.start()
+        collector.write(b"setup\n")
+        collector.beginTest("test1")
+        test1 = [b"test1 %03d\n" % i for i in range(30)]
+        for line in test1:
+            collector.write(line)
+        collector.endTest("test1")
+        collector.beginTest("test2")
+        collector.write(b"test2\n")
+        self.assertEqual(b"".join(collector.readTest("test2")), b"test2\n")
+        collector.write(b"more\n")
+        collector.endTest("test2")
+        collector.write(b"teardown\n")
+
+        self.assertEqual(b"".join(collector.readTest("test1")),
+                         b"".join(test1))
+        self.assertEqual(b"".join(collector.readTest("test2")),
+                         b"test2\nmore\n")
+        collector.stop()
+
+        file_path = os.path.join(self.temp_dir, "test1.txt")
+        self.assertEqual(
+            collector.dumpTest("test1", file_path), len(b"".join(test1)))
+        self.assertIsNone(collector.dumpTest("test3", file_path))
+        self.assertEqual(
+            _ReadSegments(collector),
+            b"setup\n" + b"".join(test1) + b"test2\nmore\nteardown\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
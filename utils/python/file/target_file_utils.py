@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import logging
+import uuid
+
 from vts.runners.host import asserts
 from vts.runners.host import const
 
@@ -21,6 +23,8 @@ _PERMISSION_GROUPS = 3  # 3 permission groups: owner, group, all users
 _READ_PERMISSION = 4
 _WRITE_PERMISSION = 2
 _EXECUTE_PERMISSION = 1
+# Max number of paths queried by one device-side script.
+_BULK_BATCH_SIZE = 200
 
 
 def _Test(shell, *args):
@@ -147,6 +151,216 @@ def GetPermission(path, shell):
     return accessBits
 
 
+class FileInfo(object):
+    """The result of a bulk query of a path on device.
+
+    Attributes:
+        path: string, the path on device.
+        exists: bool, whether the path exists.
+        is_directory: bool, whether the path is a directory.
+        permission: string, octal permission bits of the path (e.g. 644).
+                    None if the path cannot be stat'ed.
+        file_type: string, the file type reported by stat (e.g.
+                   "regular file" or "directory"). None if the path cannot
+                   be stat'ed.
+        content: string, content of the file if it is read and readable.
+                 None otherwise.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.exists = False
+        self.is_directory = False
+        self.permission = None
+        self.file_type = None
+        self.content = None
+
+    def __repr__(self):
+        return ("FileInfo(path=%r, exists=%r, is_directory=%r, "
+                "permission=%r, file_type=%r)" %
+                (self.path, self.exists, self.is_directory, self.permission,
+                 self.file_type))
+
+
+def _QuotePath(path):
+    """Quotes a path for the device shell.
+
+    Args:
+        path: string, a path on device.
+
+    Returns:
+        string, the path in single quotes.
+    """
+    return "'%s'" % path.replace("'", "'\\''")
+
+
+def _CreateBulkScript(paths, marker, read_content):
+    """Creates a device-side script which queries a list of paths.
+
+    For each path, the script prints a header line, the results of test -e
+    and test -d, and the output of stat. If read_content is True, it also
+    prints the content of every existing non-directory path between a
+    header line and a trailer line. The script avoids "$" so that it is not
+    expanded by the host shell when it is passed through adb.
+
+    Args:
+        paths: list of strings, the paths on device.
+        marker: string, the unique prefix of the header and trailer lines.
+        read_content: bool, whether to print the file contents.
+
+    Returns:
+        string, the script.
+    """
+    commands = []
+    for index, path in enumerate(paths):
+        quoted = _QuotePath(path)
+        commands.append("echo '%s S %d'" % (marker, index))
+        commands.append("{ [ -e %s ] && echo 1 || echo 0; }" % quoted)
+        commands.append("{ [ -d %s ] && echo 1 || echo 0; }" % quoted)
+        commands.append("{ stat -c '%%a %%F' %s 2>/dev/null || echo -; }" %
+                        quoted)
+        if read_content:
+            commands.append(
+                "if [ -e %(path)s ] && [ ! -d %(path)s ]; then "
+                "echo '%(marker)s C %(index)d'; "
+                "if cat %(path)s 2>/dev/null; "
+                "then echo; echo '%(marker)s E %(index)d 0'; "
+                "else echo; echo '%(marker)s E %(index)d 1'; fi; fi" % {
+                    "path": quoted,
+                    "marker": marker,
+                    "index": index
+                })
+    return "; ".join(commands)
+
+
+def _ParseBulkOutput(paths, output, marker, read_content):
+    """Parses the output of a script created by _CreateBulkScript.
+
+    Args:
+        paths: list of strings, the paths on device.
+        output: string, stdout of the script.
+        marker: string, the unique prefix of the header and trailer lines.
+        read_content: bool, whether the script prints the file contents.
+
+    Returns:
+        list of FileInfo, one for each path.
+
+    Raises:
+        IOError if the output of a path is missing or malformed.
+    """
+    results = []
+    pos = 0
+    for index, path in enumerate(paths):
+        header = "%s S %d\n" % (marker, index)
+        start = output.find(header, pos)
+        if start < 0:
+            raise IOError("%s: Missing result in output" % path)
+        pos = start + len(header)
+        lines = []
+        for _ in range(3):
+            end = output.find("\n", pos)
+            if end < 0:
+                raise IOError("%s: Truncated result in output" % path)
+            lines.append(output[pos:end])
+            pos = end + 1
+
+        info = FileInfo(path)
+        info.exists = lines[0] == "1"
+        info.is_directory = lines[1] == "1"
+        if lines[2] != "-":
+            permission, _, file_type = lines[2].partition(" ")
+            info.permission = permission
+            info.file_type = file_type
+
+        content_header = "%s C %d\n" % (marker, index)
+        if read_content and output.startswith(content_header, pos):
+            content_start = pos + len(content_header)
+            trailer = "\n%s E %d " % (marker, index)
+            content_end = output.find(trailer, content_start)
+            if content_end < 0:
+                raise IOError("%s: Truncated content in output" % path)
+            pos = content_end + len(trailer)
+            if output.startswith("0", pos):
+                # Removes the new line printed after the content.
+                info.content = output[content_start:content_end]
+        results.append(info)
+    return results
+
+
+def _QueryMany(shell, paths, read_content, batch_size):
+    """Queries a list of paths with one shell command per batch.
+
+    Args:
+        shell: an instance of the VTS shell.
+        paths: list of strings, the paths on device.
+        read_content: bool, whether to read the file contents.
+        batch_size: int, max number of paths queried by one command.
+
+    Returns:
+        list of FileInfo, one for each path in the same order.
+
+    Raises:
+        IOError if the output of the command cannot be parsed.
+    """
+    results = []
+    for offset in range(0, len(paths), batch_size):
+        batch = paths[offset:offset + batch_size]
+        marker = "__VTS_FILE_%s__" % uuid.uuid4().hex
+        cmd = _CreateBulkScript(batch, marker, read_content)
+        cmd_results = shell.Execute(cmd)
+        output = str(cmd_results[const.STDOUT][0])
+        try:
+            results.extend(
+                _ParseBulkOutput(batch, output, marker, read_content))
+        except IOError as e:
+            logging.error("Bulk query of %d paths failed. stderr: %s",
+                          len(batch), cmd_results[const.STDERR][0])
+            raise e
+    return results
+
+
+def StatMany(shell, paths, batch_size=_BULK_BATCH_SIZE):
+    """Gets the existence, type, and permission bits of paths.
+
+    Unlike Exists, IsDirectory, and GetPermission, which execute one shell
+    command per path per query, this function queries all paths in one
+    device-side script per batch_size paths.
+
+    Args:
+        shell: an instance of the VTS shell.
+        paths: list of strings, the paths on device.
+        batch_size: int, max number of paths queried by one command.
+
+    Returns:
+        list of FileInfo, one for each path in the same order.
+
+    Raises:
+        IOError if the output of the command cannot be parsed.
+    """
+    return _QueryMany(shell, list(paths), False, batch_size)
+
+
+def ReadMany(shell, paths, batch_size=_BULK_BATCH_SIZE):
+    """Gets the existence, type, permission bits, and contents of paths.
+
+    This function is the bulk version of ReadFileContent. The content of a
+    path is None if the path does not exist, is a directory, or cannot be
+    read.
+
+    Args:
+        shell: an instance of the VTS shell.
+        paths: list of strings, the paths on device.
+        batch_size: int, max number of paths queried by one command.
+
+    Returns:
+        list of FileInfo, one for each path in the same order.
+
+    Raises:
+        IOError if the output of the command cannot be parsed.
+    """
+    return _QueryMany(shell, list(paths), True, batch_size)
+
+
 def _HasPermission(permission_bits, groupIndex, permission):
     """Determines if the permission bits grant a permission to a group.
 
@@ -304,9 +518,48 @@ def assertPermissionsAndExistence(shell, path, check_permission):
                           format and returns True if the permissions are
                           correct, False otherwise.
     """
-    asserts.assertTrue(Exists(path, shell), "%s: File does not exist." % path)
     try:
-        permission = GetPermission(path, shell)
+        info = StatMany(shell, [path])[0]
+    except IOError as e:
+        asserts.fail("Failed to assert permissions: %s" % str(e))
+    _AssertFileInfo(info, check_permission)
+
+
+def assertPermissionsAndExistenceMany(shell, paths, check_permission):
+    """Asserts that the specified paths exist and have the correct permission.
+
+    All paths are queried by one shell command per batch.
+
+    Args:
+        paths: list of strings, paths to validate existence and permissions
+        check_permission: function which takes unix permissions in octal
+                          format and returns True if the permissions are
+                          correct, False otherwise.
+    """
+    try:
+        infos = StatMany(shell, paths)
+    except IOError as e:
+        asserts.fail("Failed to assert permissions: %s" % str(e))
+    for info in infos:
+        _AssertFileInfo(info, check_permission)
+
+
+def _AssertFileInfo(info, check_permission):
+    """Asserts that a queried path exists and has the correct permission.
+
+    Args:
+        info: FileInfo, the result of StatMany.
+        check_permission: function which takes unix permissions in octal
+                          format and returns True if the permissions are
+                          correct, False otherwise.
+    """
+    path = info.path
+    asserts.assertTrue(info.exists, "%s: File does not exist." % path)
+    try:
+        permission = info.permission
+        if permission is None or len(permission) != 3:
+            raise IOError("%s: Wrong number of access bits (%s)" %
+                          (path, permission))
         asserts.assertTrue(
             check_permission(permission),
             "%s: File has invalid permissions (%s)" % (path, permission))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from vts.runners.host import const
+from vts.runners.host import signals
+from vts.utils.python.file import target_file_utils
+
+
+class FakeShell(object):
+    """A fake VTS shell which runs commands in a local shell."""
+
+    def __init__(self):
+        self.commands = []
+
+    def Execute(self, cmd):
+        self.commands.append(cmd)
+        proc = subprocess.Popen(
+            cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        return {
+            const.STDOUT: [out.decode("utf-8")],
+            const.STDERR: [err.decode("utf-8")],
+            const.EXIT_CODE: [proc.returncode],
+        }
+
+
+class TargetFileUtilsTest(unittest.TestCase):
+    """Tests the bulk queries of target_file_utils."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.shell = FakeShell()
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, "it's a file")
+        with open(self.file_path, "w") as f:
+            f.write("line 1\nline 2")
+        os.chmod(self.file_path, 0o640)
+        self.empty_path = os.path.join(self.temp_dir, "empty")
+        open(self.empty_path, "w").close()
+        os.chmod(self.empty_path, 0o600)
+        self.missing_path = os.path.join(self.temp_dir, "missing")
+
+    def tearDown(self):
+        """TearDown tasks"""
+        shutil.rmtree(self.temp_dir)
+
+    def testStatMany(self):
+        """Tests existence, type, and permission bits in one command."""
+        infos = target_file_utils.StatMany(
+            self.shell, [self.file_path, self.temp_dir, self.missing_path])
+        self.assertEqual(len(self.shell.commands), 1)
+        self.assertEqual([info.path for info in infos],
+                         [self.file_path, self.temp_dir, self.missing_path])
+
+        self.assertTrue(infos[0].exists)
+        self.assertFalse(infos[0].is_directory)
+        self.assertEqual(infos[0].permission, "640")
+        self.assertEqual(infos[0].file_type, "regular file")
+        self.assertIsNone(infos[0].content)
+
+        self.assertTrue(infos[1].exists)
+        self.assertTrue(infos[1].is_directory)
+        self.assertEqual(infos[1].file_type, "directory")
+
+        self.assertFalse(infos[2].exists)
+        self.assertIsNone(infos[2].permission)
+
+    def testReadMany(self):
+        """Tests file contents in one command."""
+        infos = target_file_utils.ReadMany(
+            self.shell,
+            [self.file_path, self.empty_path, self.temp_dir, self.missing_path])
+        self.assertEqual(len(self.shell.commands), 1)
+        self.assertEqual([info.content for info in infos],
+                         ["line 1\nline 2", "", None, None])
+
+    def testBatches(self):
+        """Tests that paths are split into batches."""
+        paths = [self.file_path, self.missing_path] * 3
+        infos = target_file_utils.ReadMany(self.shell, paths, batch_size=4)
+        self.assertEqual(len(self.shell.commands), 2)
+        self.assertEqual([info.exists for info in infos],
+                         [True, False] * 3)
+
+    def testAssertPermissionsAndExistenceMany(self):
+        """Tests the bulk assertion of permission bits."""
+        target_file_utils.assertPermissionsAndExistenceMany(
+            self.shell, [self.file_path, self.empty_path],
+            target_file_utils.IsReadWrite)
+        with self.assertRaises(signals.TestFailure):
+            target_file_utils.assertPermissionsAndExistenceMany(
+                self.shell, [self.file_path, self.missing_path],
+                target_file_utils.IsReadWrite)
+        with self.assertRaises(signals.TestFailure):
+            target_file_utils.assertPermissionsAndExistence(
+                self.shell, self.file_path, target_file_utils.IsReadOnly)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -122,6 +122,30 @@ def Count(name, category=DEFAULT_CATEGORY):
         counts[name, category].append(time.time())
 
 
+def RecordCommandStats(stats):
+    """Records a host command as an event which has ended.
+
+    This is a listener for cmd_utils.AddCommandStatsListener, which is called
+    when the command ends. The wall time of the event begins wall_time
+    seconds before it ends. The CPU time of the command process is kept in
+    the command_cpu_time attribute of the event; the CPU timestamps are those
+    of the framework process.
+
+    Params:
+        stats: cmd_utils.CommandStats object of the command.
+
+    Returns:
+        Event object representing the command.
+    """
+    event = tfie.TestFrameworkInstrumentationEvent(
+        str(stats.command), categories.HOST_COMMAND_EXECUTION)
+    event.Begin(enable_logging=False)
+    event.End()
+    event.timestamp_begin_wall = event.timestamp_end_wall - stats.wall_time
+    event.command_cpu_time = stats.cpu_time
+    return event
+
+
 def GenerateTextReport():
     """Compile instrumentation results into a simple text output format for visualization.
 
@@ -137,6 +161,8 @@ def GenerateTextReport():
             time_cpu: float, CPU time of the event (can be begin or end)
             time_wall: float, wall time of the event (can be begin or end)
             type: string, begin or end
+            command_cpu_time: float, CPU time of the host command process,
+                              or None
         """
         name = ''
         category = ''
@@ -144,6 +170,7 @@ def GenerateTextReport():
         time_wall = -1
         type = ''
         duration = -1
+        command_cpu_time = None
 
     results = []
 
@@ -164,6 +191,7 @@ def GenerateTextReport():
         ei.time_cpu = event.timestamp_end_cpu
         ei.time_wall = event.timestamp_end_wall
         ei.duration = event.timestamp_end_wall - event.timestamp_begin_wall
+        ei.command_cpu_time = event.command_cpu_time
         results.append(ei)
 
     results.sort(key=operator.attrgetter('time_cpu'))
@@ -184,6 +212,8 @@ def GenerateTextReport():
             result_text.append('    '*level + s)
             result_text.append('\n')
             result_text.append('    '*level + "%.4f" % e.duration)
+            if e.command_cpu_time is not None:
+                result_text.append(" (command CPU %.4f)" % e.command_cpu_time)
         result_text.append('\n')
 
     return ''.join(result_text)
@@ -32,6 +32,8 @@ class TestFrameworkInstrumentationCategories(object):
     TEST_CASE_EXECUTION = 'Test case execution'
     RESULT_PROCESSING = 'Result processing'
     WAITING_FOR_DEVICE_RESPOND = 'Waiting for device respond'
+    SHELL_COMMAND_ROUTING = 'Shell command routing'
+    HOST_COMMAND_EXECUTION = 'Host command execution'
 
     def Add(self, key, value):
         """Add a category key and value to the class attribute.
@@ -73,6 +73,9 @@ class TestFrameworkInstrumentationEvent(object):
                            between start and end cpu time may be measured using
                            wall time.
         timestamp_end_wall: float, wall time of event end
+        command_cpu_time: float, user and system time of the host command
+                          process of the event. None if the event is not a
+                          command or the time is not available.
         _enable_logging: bool or None. Whether to put the event in logging.
                          Should be set to False when timing small pieces of code that could take
                          very short time to run.
@@ -94,6 +97,7 @@ class TestFrameworkInstrumentationEvent(object):
     timestamp_begin_wall = -1
     timestamp_end_cpu = -1
     timestamp_end_wall = -1
+    command_cpu_time = None
 
     def __init__(self, name, category):
         self.name, self.category = NormalizeNameCategory(name, category)
@@ -17,6 +17,7 @@
 
 import unittest
 
+from vts.utils.python.common import cmd_utils
 from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
 from vts.utils.python.instrumentation import test_framework_instrumentation_event as tfie
 from vts.utils.python.instrumentation import test_framework_instrumentation_test_submodule as tfits
@@ -209,6 +210,21 @@ class TestFrameworkInstrumentationTest(unittest.TestCase):
         tfi.Count(self.name)
         self.assertEqual(len(tfi.counts), 2)
 
+    def testRecordCommandStats(self):
+        """Tests that a command is recorded as an ended event."""
+        event = tfi.RecordCommandStats(
+            cmd_utils.CommandStats("sleep 2", 2.0, 0.25, 0))
+        self.assertEqual(tfie.event_data, [event])
+        self.assertFalse(tfie.event_stack)
+        self.assertEqual(event.category, tfi.categories.HOST_COMMAND_EXECUTION)
+        self.assertEqual(event.name, "sleep 2")
+        self.assertAlmostEqual(
+            event.timestamp_end_wall - event.timestamp_begin_wall, 2.0)
+        self.assertEqual(event.command_cpu_time, 0.25)
+        self.assertGreaterEqual(event.timestamp_end_cpu,
+                                event.timestamp_begin_cpu)
+        self.assertIn("command CPU 0.2500", tfi.GenerateTextReport())
+
     def testGenerateTextReport(self):
         """Tests the GenerateTextReport method."""
         event = tfi.Begin('name1', 'cat1', disable_subevent_logging=True)
@@ -0,0 +1,425 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Compiles py2pb and pb2py converters from a VariableSpecificationMessage.
+
+py2pb.Convert and pb2py.Convert walk the spec of every value they convert.
+The functions in this module walk a spec once and return closures which are
+specialized for each struct, union, and vector type in it. Whenever a value
+does not match the compiled spec (e.g., a missing struct field), the compiled
+converter falls back to py2pb.Convert or pb2py.Convert, so the results and
+the error handling are the same as those of the generic converters.
+"""
+
+import logging
+import threading
+
+from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
+from vts.utils.python.mirror import pb2py
+from vts.utils.python.mirror import py2pb
+
+_py2pb_cache = {}
+_pb2py_cache = {}
+_cache_lock = threading.Lock()
+
+# Field types supported by pb2py.PbStruct2PyDict.
+_PB2PY_STRUCT_FIELD_TYPES = (CompSpecMsg.TYPE_ENUM, CompSpecMsg.TYPE_SCALAR,
+                             CompSpecMsg.TYPE_STRING, CompSpecMsg.TYPE_VECTOR,
+                             CompSpecMsg.TYPE_STRUCT)
+
+
+class _MismatchError(Exception):
+    """Raised when a value does not match the compiled spec."""
+    pass
+
+
+def _Mismatch(*args):
+    """A compiled converter for specs the compiler does not support."""
+    raise _MismatchError()
+
+
+def _CompilePy2PbEnum(pb_spec):
+    """Compiles py2pb.PyValue2PbEnum for pb_spec."""
+    name = pb_spec.name
+    # Use default scalar_type int32_t if the enum definition is not found.
+    scalar_type = pb_spec.enum_value.scalar_type or "int32_t"
+
+    def Fill(message, py_value):
+        if name:
+            message.name = name
+        message.type = CompSpecMsg.TYPE_ENUM
+        setattr(message.scalar_value, scalar_type, py_value)
+
+    return Fill
+
+
+def _CompilePy2PbScalar(pb_spec):
+    """Compiles py2pb.PyValue2PbScalar for pb_spec."""
+    name = pb_spec.name
+    scalar_type = pb_spec.scalar_type
+
+    def Fill(message, py_value):
+        if name:
+            message.name = name
+        message.type = CompSpecMsg.TYPE_SCALAR
+        message.scalar_type = scalar_type
+        setattr(message.scalar_value, scalar_type, py_value)
+
+    return Fill
+
+
+def _CompilePy2PbString(pb_spec):
+    """Compiles py2pb.PyString2PbString for pb_spec."""
+    name = pb_spec.name
+
+    def Fill(message, py_value):
+        if name:
+            message.name = name
+        message.type = CompSpecMsg.TYPE_STRING
+        message.string_value.message = py_value
+        message.string_value.length = len(py_value)
+
+    return Fill
+
+
+def _CompilePy2PbVector(pb_spec):
+    """Compiles py2pb.PyList2PbVector for pb_spec."""
+    name = pb_spec.name
+    if pb_spec.vector_value:
+        element_name = pb_spec.vector_value[0].name
+        fill_element = _CompilePy2PbFill(pb_spec.vector_value[0])
+    else:
+        fill_element = _Mismatch
+
+    def Fill(message, py_value):
+        if name:
+            message.name = name
+        message.type = CompSpecMsg.TYPE_VECTOR
+        if len(py_value) == 0:
+            return
+        add = message.vector_value.add
+        for curr_value in py_value:
+            element_msg = add()
+            # Same as copying py2pb.Convert(vector_spec, curr_value).
+            if isinstance(curr_value, CompSpecMsg.VariableSpecificationMessage):
+                element_msg.CopyFrom(curr_value)
+            else:
+                element_msg.name = element_name
+                fill_element(element_msg, curr_value)
+        message.vector_size = len(py_value)
+
+    return Fill
+
+
+def _CompilePy2PbFields(pb_spec, attrs, find_sub_type):
+    """Compiles the converters of the fields of a struct or union.
+
+    Args:
+        pb_spec: VariableSpecificationMessage, the struct or union spec.
+        attrs: list of VariableSpecificationMessage, the field specs.
+        find_sub_type: function to look up nested struct and union types.
+
+    Returns:
+        a list of (field name, converter) tuples.
+    """
+    fields = []
+    for attr in attrs:
+        if attr.type in (CompSpecMsg.TYPE_STRUCT, CompSpecMsg.TYPE_UNION):
+            sub_attr = find_sub_type(pb_spec, attr.predefined_type)
+            if sub_attr is None:
+                fill = _Mismatch
+            elif attr.type == CompSpecMsg.TYPE_STRUCT:
+                fill = _CompilePy2PbStruct(sub_attr)
+            else:
+                fill = _CompilePy2PbUnion(sub_attr)
+        elif attr.type == CompSpecMsg.TYPE_VECTOR:
+            fill = _CompilePy2PbVector(attr)
+        else:
+            fill = _CompilePy2PbFill(attr)
+        fields.append((attr.name, fill))
+    return fields
+
+
+def _CompilePy2PbStruct(pb_spec):
+    """Compiles py2pb.PyDict2PbStruct for pb_spec."""
+    name = pb_spec.name
+    fields = _CompilePy2PbFields(pb_spec, pb_spec.struct_value,
+                                 py2pb.FindSubStructType)
+    if len(set(field[0] for field in fields)) != len(fields):
+        return _Mismatch
+    field_count = len(fields)
+
+    def Fill(message, py_value):
+        if name:
+            message.name = name
+        message.type = CompSpecMsg.TYPE_STRUCT
+        add = message.struct_value.add
+        for field_name, fill in fields:
+            if field_name not in py_value:
+                raise _MismatchError()
+            fill(add(), py_value[field_name])
+        if len(py_value) != field_count:
+            raise _MismatchError()
+
+    return Fill
+
+
+def _CompilePy2PbUnion(pb_spec):
+    """Compiles py2pb.PyDict2PbUnion for pb_spec."""
+    name = pb_spec.name
+    fields = _CompilePy2PbFields(pb_spec, pb_spec.union_value,
+                                 py2pb.FindSubUnionType)
+    field_names = set(field[0] for field in fields)
+    if len(field_names) != len(fields):
+        return _Mismatch
+
+    def Fill(message, py_value):
+        if len(py_value) > 1:
+            raise _MismatchError()
+        if name:
+            message.name = name
+        message.type = CompSpecMsg.TYPE_UNION
+        add = message.union_value.add
+        for field_name, fill in fields:
+            if field_name in py_value:
+                fill(add(), py_value[field_name])
+            else:
+                add()
+        for key in py_value:
+            if key not in field_names:
+                raise _MismatchError()
+
+    return Fill
+
+
+def _CompilePy2PbFill(pb_spec):
+    """Compiles a function which fills a message from a Python value.
+
+    Args:
+        pb_spec: VariableSpecificationMessage, the spec of the value.
+
+    Returns:
+        a function which takes a VariableSpecificationMessage and a Python
+        value.
+    """
+    if pb_spec.type == CompSpecMsg.TYPE_STRUCT:
+        # py2pb.Convert looks up nested types in the spec of the value itself.
+        return _CompilePy2PbStruct(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_UNION:
+        return _CompilePy2PbUnion(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_ENUM:
+        return _CompilePy2PbEnum(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_SCALAR:
+        return _CompilePy2PbScalar(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_STRING:
+        return _CompilePy2PbString(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_VECTOR:
+        return _CompilePy2PbVector(pb_spec)
+    return _Mismatch
+
+
+def _CompilePy2Pb(pb_spec):
+    """Compiles py2pb.Convert for pb_spec without caching."""
+    name = pb_spec.name
+    fill = _CompilePy2PbFill(pb_spec)
+
+    def Convert(py_value, message=None):
+        if message is None:
+            message = CompSpecMsg.VariableSpecificationMessage()
+        else:
+            message.Clear()
+        if isinstance(py_value, CompSpecMsg.VariableSpecificationMessage):
+            message.CopyFrom(py_value)
+            return message
+        try:
+            message.name = name
+            fill(message, py_value)
+            return message
+        except _MismatchError:
+            converted_msg = py2pb.Convert(pb_spec, py_value)
+            if converted_msg is None:
+                return None
+            message.CopyFrom(converted_msg)
+            return message
+
+    return Convert
+
+
+def _CompilePb2PyScalar(pb_spec):
+    """Compiles pb2py.PbScalar2PyValue (also Enum and Mask)."""
+    var_type = pb_spec.type
+
+    def Convert(var):
+        if var.type != var_type:
+            raise _MismatchError()
+        return getattr(var.scalar_value, var.scalar_type)
+
+    return Convert
+
+
+def _CompilePb2PyString(pb_spec):
+    """Compiles pb2py.PbString2PyString."""
+
+    def Convert(var):
+        if var.type != CompSpecMsg.TYPE_STRING:
+            raise _MismatchError()
+        return var.string_value.message
+
+    return Convert
+
+
+def _CompilePb2PyVector(pb_spec):
+    """Compiles pb2py.PbVector2PyList for pb_spec."""
+    if not pb_spec.vector_value:
+        return _Mismatch
+    element_spec = pb_spec.vector_value[0]
+    if element_spec.type == CompSpecMsg.TYPE_SCALAR:
+        convert_element = _CompilePb2PyScalar(element_spec)
+    elif element_spec.type == CompSpecMsg.TYPE_STRUCT:
+        convert_element = _CompilePb2PyStruct(element_spec)
+    else:
+        return _Mismatch
+
+    def Convert(var):
+        if var.type != CompSpecMsg.TYPE_VECTOR:
+            raise _MismatchError()
+        return [convert_element(curr_value) for curr_value in var.vector_value]
+
+    return Convert
+
+
+def _CompilePb2PyStruct(pb_spec):
+    """Compiles pb2py.PbStruct2PyDict for pb_spec."""
+    fields = {}
+    for attr in pb_spec.struct_value:
+        if attr.type not in _PB2PY_STRUCT_FIELD_TYPES:
+            convert = _Mismatch
+        elif attr.type == CompSpecMsg.TYPE_STRUCT:
+            sub_attr = py2pb.FindSubStructType(pb_spec, attr.predefined_type)
+            if sub_attr is None and attr.struct_value:
+                sub_attr = attr
+            if sub_attr is None:
+                # No nested definition; same as the generic conversion.
+                convert = pb2py.PbStruct2PyDict
+            else:
+                convert = _CompilePb2PyStruct(sub_attr)
+        elif attr.type == CompSpecMsg.TYPE_VECTOR:
+            convert = _CompilePb2PyVector(attr)
+        else:
+            convert = _CompilePb2Py(attr)
+        fields[attr.name] = (attr.type, convert)
+
+    def Convert(var):
+        if var.type != CompSpecMsg.TYPE_STRUCT:
+            raise _MismatchError()
+        result = {}
+        for attr in var.struct_value:
+            field = fields.get(attr.name)
+            if field is None or field[0] != attr.type:
+                raise _MismatchError()
+            result[attr.name] = field[1](attr)
+        return result
+
+    return Convert
+
+
+def _CompilePb2Py(pb_spec):
+    """Compiles pb2py.Convert for pb_spec without the fallback."""
+    if pb_spec.type in (CompSpecMsg.TYPE_SCALAR, CompSpecMsg.TYPE_ENUM,
+                        CompSpecMsg.TYPE_MASK):
+        return _CompilePb2PyScalar(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_STRING:
+        return _CompilePb2PyString(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_VECTOR:
+        return _CompilePb2PyVector(pb_spec)
+    elif pb_spec.type == CompSpecMsg.TYPE_STRUCT:
+        return _CompilePb2PyStruct(pb_spec)
+    return _Mismatch
+
+
+def _GetCached(cache, pb_spec, compile_func):
+    """Gets a compiled converter from the cache or compiles one.
+
+    Args:
+        cache: dict, serialized spec to compiled converter.
+        pb_spec: VariableSpecificationMessage, the spec to compile.
+        compile_func: function which compiles a converter from a spec.
+
+    Returns:
+        the compiled converter.
+    """
+    key = pb_spec.SerializeToString()
+    with _cache_lock:
+        converter = cache.get(key)
+    if converter is None:
+        # Keep a private copy so that later changes to pb_spec by the caller
+        # do not affect the compiled converter and its fallback.
+        spec_copy = CompSpecMsg.VariableSpecificationMessage()
+        spec_copy.CopyFrom(pb_spec)
+        converter = compile_func(spec_copy)
+        with _cache_lock:
+            converter = cache.setdefault(key, converter)
+    return converter
+
+
+def CompilePy2Pb(pb_spec):
+    """Compiles a py2pb converter for the given spec.
+
+    Args:
+        pb_spec: VariableSpecificationMessage which captures the
+                 specification of a target attribute.
+
+    Returns:
+        a function which takes a Python value and returns the same
+        VariableSpecificationMessage as py2pb.Convert(pb_spec, py_value).
+        If the optional second argument, a VariableSpecificationMessage, is
+        given, the result is written to and returned in that message.
+    """
+    return _GetCached(_py2pb_cache, pb_spec, _CompilePy2Pb)
+
+
+def CompilePb2Py(pb_spec):
+    """Compiles a pb2py converter for values of the given spec.
+
+    Args:
+        pb_spec: VariableSpecificationMessage which captures the
+                 specification of the values to convert.
+
+    Returns:
+        a function which takes a VariableSpecificationMessage and returns the
+        same Python value as pb2py.Convert(var).
+    """
+
+    def Compile(spec):
+        convert = _CompilePb2Py(spec)
+
+        def Convert(var):
+            try:
+                return convert(var)
+            except _MismatchError:
+                logging.debug("pb2py: %s does not match the compiled spec.",
+                              var.name)
+                return pb2py.Convert(var)
+
+        return Convert
+
+    return _GetCached(_pb2py_cache, pb_spec, Compile)
+
+
+def ClearCache():
+    """Clears all compiled converters."""
+    with _cache_lock:
+        _py2pb_cache.clear()
+        _pb2py_cache.clear()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import time
+import unittest
+
+from google.protobuf import text_format
+
+from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
+from vts.utils.python.mirror import converter_compiler
+from vts.utils.python.mirror import pb2py
+from vts.utils.python.mirror import py2pb
+
+_BENCHMARK_CALL_COUNT = 500
+
+_STRUCT_SPEC = """
+name: "info"
+type: TYPE_STRUCT
+struct_value: {
+  name: "id"
+  type: TYPE_SCALAR
+  scalar_type: "uint32_t"
+}
+struct_value: {
+  name: "label"
+  type: TYPE_STRING
+}
+struct_value: {
+  name: "mode"
+  type: TYPE_ENUM
+  enum_value: {
+    scalar_type: "uint8_t"
+  }
+}
+struct_value: {
+  name: "point"
+  type: TYPE_STRUCT
+  predefined_type: "Point"
+}
+struct_value: {
+  name: "values"
+  type: TYPE_VECTOR
+  vector_value: {
+    type: TYPE_SCALAR
+    scalar_type: "int32_t"
+  }
+}
+struct_value: {
+  name: "choice"
+  type: TYPE_UNION
+  predefined_type: "Choice"
+}
+sub_struct: {
+  name: "Point"
+  type: TYPE_STRUCT
+  struct_value: {
+    name: "x"
+    type: TYPE_SCALAR
+    scalar_type: "int32_t"
+  }
+  struct_value: {
+    name: "y"
+    type: TYPE_SCALAR
+    scalar_type: "int32_t"
+  }
+}
+sub_struct: {
+  name: "Choice"
+  type: TYPE_UNION
+  union_value: {
+    name: "a"
+    type: TYPE_SCALAR
+    scalar_type: "int32_t"
+  }
+  union_value: {
+    name: "b"
+    type: TYPE_SCALAR
+    scalar_type: "float_t"
+  }
+}
+"""
+
+_VECTOR_SPEC = """
+name: "points"
+type: TYPE_VECTOR
+vector_value: {
+  type: TYPE_STRUCT
+  struct_value: {
+    name: "x"
+    type: TYPE_SCALAR
+    scalar_type: "int32_t"
+  }
+  struct_value: {
+    name: "y"
+    type: TYPE_SCALAR
+    scalar_type: "int32_t"
+  }
+}
+"""
+
+
+def _ParseSpec(text):
+    """Parses a VariableSpecificationMessage from its text format."""
+    spec = CompSpecMsg.VariableSpecificationMessage()
+    text_format.Merge(text, spec)
+    return spec
+
+
+def _CreateStructValue(index):
+    """Creates a Python value of _STRUCT_SPEC."""
+    return {
+        "id": index,
+        "label": "label%d" % index,
+        "mode": 2,
+        "point": {"x": index, "y": -index},
+        "values": list(range(index % 8)),
+        "choice": {"b": 0.5},
+    }
+
+
+class ConverterCompilerTest(unittest.TestCase):
+    """Tests that compiled converters match py2pb and pb2py."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        converter_compiler.ClearCache()
+        self.struct_spec = _ParseSpec(_STRUCT_SPEC)
+        self.vector_spec = _ParseSpec(_VECTOR_SPEC)
+
+    def assertPy2PbEqual(self, pb_spec, py_value):
+        """Asserts compiled and generic py2pb conversions are the same."""
+        converter = converter_compiler.CompilePy2Pb(pb_spec)
+        self.assertEqual(converter(py_value), py2pb.Convert(pb_spec, py_value))
+
+    def testPy2PbScalar(self):
+        """Tests scalar, enum, and string conversions."""
+        spec = CompSpecMsg.VariableSpecificationMessage()
+        spec.type = CompSpecMsg.TYPE_SCALAR
+        spec.scalar_type = "int64_t"
+        self.assertPy2PbEqual(spec, 42)
+        spec.type = CompSpecMsg.TYPE_ENUM
+        self.assertPy2PbEqual(spec, 3)
+        spec.type = CompSpecMsg.TYPE_STRING
+        self.assertPy2PbEqual(spec, "text")
+
+    def testPy2PbStruct(self):
+        """Tests nested struct, union, and vector conversions."""
+        self.assertPy2PbEqual(self.struct_spec, _CreateStructValue(5))
+        self.assertPy2PbEqual(self.vector_spec, [{"x": 1, "y": 2}] * 3)
+        self.assertPy2PbEqual(self.vector_spec, [])
+
+    def testPy2PbFallback(self):
+        """Tests that values not matching the spec use py2pb.Convert."""
+        value = _CreateStructValue(1)
+        del value["label"]
+        self.assertPy2PbEqual(self.struct_spec, value)
+        value = _CreateStructValue(1)
+        value["unknown"] = 0
+        self.assertPy2PbEqual(self.struct_spec, value)
+        value = _CreateStructValue(1)
+        value["choice"] = {"a": 1, "b": 0.5}
+        self.assertPy2PbEqual(self.struct_spec, value)
+
+    def testPy2PbInPlace(self):
+        """Tests that the result can be written to a given message."""
+        converter = converter_compiler.CompilePy2Pb(self.vector_spec)
+        message = CompSpecMsg.VariableSpecificationMessage()
+        message.name = "stale"
+        message.vector_size = 10
+        result = converter([{"x": 1, "y": 2}], message)
+        self.assertIs(result, message)
+        self.assertEqual(
+            message, py2pb.Convert(self.vector_spec, [{"x": 1, "y": 2}]))
+
+    def testPb2Py(self):
+        """Tests that compiled pb2py converters match pb2py.Convert."""
+        # pb2py does not support union fields.
+        del self.struct_spec.struct_value[-1]
+        struct_value = _CreateStructValue(3)
+        del struct_value["choice"]
+        struct_var = py2pb.Convert(self.struct_spec, struct_value)
+        # The target side sets the scalar_type of enum values and the field
+        # name of nested structs.
+        struct_var.struct_value[2].scalar_type = "uint8_t"
+        struct_var.struct_value[3].name = "point"
+        vector_value = [{"x": 1, "y": 2}]
+        vector_var = py2pb.Convert(self.vector_spec, vector_value)
+        for spec, var, value in ((self.struct_spec, struct_var, struct_value),
+                                 (self.vector_spec, vector_var, vector_value)):
+            converter = converter_compiler.CompilePb2Py(spec)
+            self.assertEqual(converter(var), pb2py.Convert(var))
+            self.assertEqual(converter(var), value)
+
+    def testCache(self):
+        """Tests that converters are cached per spec."""
+        converter = converter_compiler.CompilePy2Pb(self.struct_spec)
+        spec_copy = _ParseSpec(_STRUCT_SPEC)
+        self.assertIs(
+            converter_compiler.CompilePy2Pb(spec_copy), converter)
+        spec_copy.name = "other"
+        self.assertIsNot(
+            converter_compiler.CompilePy2Pb(spec_copy), converter)
+
+    def testConvertBenchmark(self):
+        """Measures the per-value cost of generic and compiled py2pb."""
+        values = [_CreateStructValue(i) for i in range(_BENCHMARK_CALL_COUNT)]
+        start = time.time()
+        for value in values:
+            py2pb.Convert(self.struct_spec, value)
+        generic_time = time.time() - start
+
+        converter = converter_compiler.CompilePy2Pb(self.struct_spec)
+        start = time.time()
+        for value in values:
+            converter(value)
+        compiled_time = time.time() - start
+
+        logging.info("py2pb per value: generic %.1f us, compiled %.1f us",
+                     generic_time * 1e6 / _BENCHMARK_CALL_COUNT,
+                     compiled_time * 1e6 / _BENCHMARK_CALL_COUNT)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
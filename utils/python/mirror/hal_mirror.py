@@ -112,6 +112,7 @@ class HalMirror(native_entity_mirror.NativeEntityMirror):
         text_format.Merge(found_api_spec, if_spec_msg)
 
         self._if_spec_msg = if_spec_msg
+        self._BuildApiIndex()
 
     def GetCallbackFunctionID(self, function_pointer):
         """Gets registsred callback function id for the given function_pointer.
@@ -172,6 +173,7 @@ class HalMirror(native_entity_mirror.NativeEntityMirror):
             func_pt_msg = var_msg.function_pointer.add()
             func_pt_msg.function_name = api.name
             func_pt_msg.id = self.GetCallbackFunctionID(function_pointer)
+            self._callback_server.SetCallbackArgSpecs(func_pt_msg.id, api.arg)
 
         return var_msg
 
@@ -101,3 +101,4 @@ class LibMirror(native_entity_mirror.NativeEntityMirror):
         text_format.Merge(found_api_spec, if_spec_msg)
 
         self._if_spec_msg = if_spec_msg
+        self._BuildApiIndex()
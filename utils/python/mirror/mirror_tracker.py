@@ -15,21 +15,49 @@
 #
 
 import logging
+import time
+import uuid
 
 from vts.proto import AndroidSystemControlMessage_pb2 as ASysCtrlMsg
 from vts.runners.host import const
 from vts.runners.host import errors
 from vts.runners.host.tcp_client import vts_tcp_client
 from vts.runners.host.tcp_server import callback_server
+from vts.utils.python.controllers import adb_client
+from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
 from vts.utils.python.mirror import hal_mirror
 from vts.utils.python.mirror import lib_mirror
 from vts.utils.python.mirror import shell_mirror
+from vts.utils.python.mirror import shell_routing
 from vts.utils.python.mirror import resource_mirror
 
 _DEFAULT_TARGET_BASE_PATHS = ["/system/lib64/hw"]
 _DEFAULT_HWBINDER_SERVICE = "default"
 _DEFAULT_SHELL_NAME = "_default"
 _MAX_ADB_SHELL_LENGTH = 950
+# Max length of a script that runs a batch of commands in one adb shell.
+_MAX_ADB_BATCH_LENGTH = 4000
+# The sentinel of a batch, formatted with a 32-digit hex uuid.
+_ADB_BATCH_MARKER_FORMAT = "__VTS_BATCH_%s__"
+
+
+def _WrapAdbBatchCommand(cmd, marker):
+    """Wraps a command of a batch with the sentinels of its results.
+
+    Args:
+        cmd: string, the command.
+        marker: string, the sentinel of the batch.
+
+    Returns:
+        string, the line of the batch script which runs the command.
+    """
+    return ("(%s\n) </dev/null; printf '\\n%%s %%d\\n' %s $?; "
+            "printf '\\n%%s\\n' %s >&2\n" % (cmd, marker, marker))
+
+
+# Number of bytes which _WrapAdbBatchCommand adds to a command.
+_ADB_BATCH_COMMAND_OVERHEAD = len(
+    _WrapAdbBatchCommand("", _ADB_BATCH_MARKER_FORMAT % ("0" * 32)))
 
 
 class MirrorTracker(object):
@@ -45,6 +73,8 @@ class MirrorTracker(object):
         _callback_server: VtsTcpServer, the server that receives and handles
                           callback messages from target side.
         shell_default_nohup: bool, whether to use nohup by default in shell commands.
+        shell_routing: ShellRoutingPolicy, chooses between adb shell and the
+                       shell driver by the measured latencies.
     """
 
     def __init__(self,
@@ -58,6 +88,7 @@ class MirrorTracker(object):
         self._registered_mirrors = {}
         self._callback_server = None
         self.shell_default_nohup = False
+        self.shell_routing = shell_routing.ShellRoutingPolicy()
         if start_callback_server:
             self._StartCallbackServer()
 
@@ -443,19 +474,25 @@ class MirrorTracker(object):
         """Execute shell command(s).
 
         This method automatically decide whether to use adb shell or vts shell
-        driver on the device based on performance benchmark results.
+        driver on the device based on performance measurements.
 
         The difference in the decision logic will only have impact on the performance, but
         will be transparent to the user of this method.
 
         The current logic is:
-            1. If shell_default_nohup is disabled and command
-               list size is smaller or equal than 3, use adb shell. Otherwise, use
-              shell driver (with nohup).
+            1. If nohup is enabled, any command is longer than
+               _MAX_ADB_SHELL_LENGTH, or there is no adb, use shell driver
+               (with nohup if enabled).
+            2. Otherwise, a call of at most 3 commands uses adb shell. For
+               larger calls, shell_routing chooses the transport whose moving
+               average latency for the number of commands is lower. The
+               latency of every call is recorded in shell_routing.
 
-            2. If adb shell is used, no_except will always be true.
+            3. If adb shell is used, no_except will always be true, and
+               multiple commands are run in batches of one adb shell each.
 
-            This is subject to further optimization.
+        Every decision is recorded as an instrumentation event of category
+        SHELL_COMMAND_ROUTING, named by the transport and command count.
 
         Args:
             commands: string or list or tuple, commands to execute on device.
@@ -476,13 +513,35 @@ class MirrorTracker(object):
         if nohup is None:
             nohup = self.shell_default_nohup
 
-        # TODO(yuexima): further optimize the threshold and nohup adb command
-        non_nohup_adb_threshold = 3
-        if (not nohup and len(commands) <= non_nohup_adb_threshold
-            and not filter(lambda cmd: len(cmd) > _MAX_ADB_SHELL_LENGTH, commands)):
-            return self._ExecuteShellCmdViaAdbShell(commands)
+        if (nohup or self._adb is None or
+                any(len(cmd) > _MAX_ADB_SHELL_LENGTH for cmd in commands)):
+            transport = shell_routing.TRANSPORT_VTS_DRIVER
         else:
-            return self._ExecuteShellCmdViaVtsDriver(commands, no_except)
+            transport = self.shell_routing.Choose(len(commands))
+
+        event = tfi.Begin(
+            "%s x%d" % (transport, len(commands)),
+            tfi.categories.SHELL_COMMAND_ROUTING,
+            enable_logging=False)
+        start_time = time.time()
+        try:
+            if transport == shell_routing.TRANSPORT_ADB:
+                result = self._ExecuteShellCmdViaAdbShell(commands)
+                measured = True
+            else:
+                # The first call includes the launch of the shell driver.
+                measured = _DEFAULT_SHELL_NAME in self._registered_mirrors
+                result = self._ExecuteShellCmdViaVtsDriver(commands,
+                                                           no_except)
+        except:
+            event.Remove("Failed to execute shell commands via %s." %
+                         transport)
+            raise
+        if measured:
+            self.shell_routing.Record(transport, len(commands),
+                                      time.time() - start_time)
+        event.End()
+        return result
 
     def _ExecuteShellCmdViaVtsDriver(self, commands, no_except):
         """Execute shell command(s) using default shell terminal.
@@ -517,14 +576,122 @@ class MirrorTracker(object):
                const.STDERR: [],
                const.EXIT_CODE: []}
 
-        for cmd in commands:
-            res = self._adb.shell(cmd, no_except=True)
-            all[const.STDOUT].append(res[const.STDOUT])
-            all[const.STDERR].append(res[const.STDERR])
-            all[const.EXIT_CODE].append(res[const.EXIT_CODE])
+        index = 0
+        while index < len(commands):
+            batch = self._GetAdbBatch(commands, index)
+            if len(batch) > 1:
+                results = self._ExecuteAdbBatch(batch)
+            else:
+                results = []
+            if not results:
+                res = self._adb.shell(commands[index], no_except=True)
+                results = [(res[const.STDOUT], res[const.STDERR],
+                            res[const.EXIT_CODE])]
+            for stdout, stderr, exit_code in results:
+                all[const.STDOUT].append(stdout)
+                all[const.STDERR].append(stderr)
+                all[const.EXIT_CODE].append(exit_code)
+            index += len(results)
 
         return all
 
+    @staticmethod
+    def _GetAdbBatch(commands, index):
+        """Gets the commands that can be run in one adb shell.
+
+        Args:
+            commands: list of strings, the commands.
+            index: int, index of the first command in the batch.
+
+        Returns:
+            list of strings, the consecutive commands from index whose
+            wrapped script is within _MAX_ADB_BATCH_LENGTH. At least one
+            command; a longer command is not batched.
+        """
+        batch = [commands[index]]
+        length = len(commands[index]) + _ADB_BATCH_COMMAND_OVERHEAD
+        for cmd in commands[index + 1:]:
+            length += len(cmd) + _ADB_BATCH_COMMAND_OVERHEAD
+            if length > _MAX_ADB_BATCH_LENGTH:
+                break
+            batch.append(cmd)
+        return batch
+
+    def _ExecuteAdbBatch(self, commands):
+        """Executes commands in one adb shell.
+
+        Each command runs in a subshell with stdin from /dev/null, followed by
+        printf of a sentinel line on stdout and stderr. The sentinel on stdout
+        carries the exit code. The script is sent without a host shell, so
+        that $? is expanded on the device. If the persistent shell session of
+        adb is enabled, the script runs in the session.
+
+        Args:
+            commands: list of strings, the commands.
+
+        Returns:
+            list of tuples (stdout, stderr, exit code), one for each command
+            that ran. If a command exits the shell, it gets the exit code of
+            the shell and the list ends with it. Empty if adb fails.
+        """
+        marker = _ADB_BATCH_MARKER_FORMAT % uuid.uuid4().hex
+        script = "".join(
+            _WrapAdbBatchCommand(cmd, marker) for cmd in commands)
+        try:
+            if self._adb.persistent_shell:
+                res = self._adb.shell(script, no_except=True)
+                stdout, stderr, exit_code = (res[const.STDOUT],
+                                             res[const.STDERR],
+                                             res[const.EXIT_CODE])
+            else:
+                stdout, stderr, exit_code = self._adb.client.shell(script)
+        except (adb_client.AdbProtocolError, IOError) as e:
+            logging.warning("Failed to run a batch of adb shell commands: %s",
+                            e)
+            return []
+
+        out_marker = ("\n%s " % marker).encode("utf-8")
+        err_marker = ("\n%s\n" % marker).encode("utf-8")
+        results = []
+        out_start = 0
+        err_start = 0
+        for _ in commands:
+            out_end = stdout.find(out_marker, out_start)
+            err_end = stderr.find(err_marker, err_start)
+            if out_end < 0 or err_end < 0:
+                # The shell exited in this command.
+                results.append((stdout[out_start:], stderr[err_start:],
+                                exit_code))
+                break
+            code_start = out_end + len(out_marker)
+            code_end = stdout.find(b"\n", code_start)
+            results.append((stdout[out_start:out_end],
+                            stderr[err_start:err_end],
+                            int(stdout[code_start:code_end])))
+            out_start = code_end + 1
+            err_start = err_end + len(err_marker)
+        return results
+
+    def ExecuteStream(self, command, chunk_size=None):
+        """Executes a shell command and streams its stdout.
+
+        Args:
+            command: string, the shell command.
+            chunk_size: int, max number of bytes per chunk. None for the
+                        default size.
+
+        Returns:
+            An iterator of bytes, the chunks of the output. It raises
+            shell_mirror.ShellStreamError if the command exits with a
+            non-zero code.
+
+        Raises:
+            shell_mirror.ShellStreamError if the device has no adb.
+        """
+        if chunk_size is None:
+            return shell_mirror.StreamCommandOutput(self._adb, command)
+        return shell_mirror.StreamCommandOutput(self._adb, command, chunk_size)
+
     def SetConnTimeout(self, timeout):
         """Set remove shell connection timeout for default shell terminal.
 
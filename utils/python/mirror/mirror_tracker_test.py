@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import subprocess
+import unittest
+
+from vts.runners.host import const
+from vts.utils.python.mirror import mirror_tracker
+from vts.utils.python.instrumentation import test_framework_instrumentation_event as tfie
+from vts.utils.python.mirror import shell_routing
+
+
+def _RunLocalShell(cmd):
+    """Runs a command in a local shell in place of a device shell."""
+    proc = subprocess.Popen(
+        ["sh", "-c", cmd], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    return out, err, proc.returncode
+
+
+class FakeAdbClient(object):
+    """A fake AdbClient which runs commands in a local shell."""
+
+    def __init__(self):
+        self.commands = []
+
+    def shell(self, cmd):
+        self.commands.append(cmd)
+        return _RunLocalShell(cmd)
+
+
+class FakeAdb(object):
+    """A fake AdbProxy which runs commands in a local shell."""
+
+    def __init__(self):
+        self.client = FakeAdbClient()
+        self.commands = []
+        self.persistent_shell = False
+
+    def shell(self, cmd, no_except=False):
+        self.commands.append(cmd)
+        out, err, ret = _RunLocalShell(cmd)
+        return {const.STDOUT: out, const.STDERR: err, const.EXIT_CODE: ret}
+
+
+class FakeShellMirror(object):
+    """A fake ShellMirror which records the commands."""
+
+    def __init__(self):
+        self.commands = []
+
+    def CleanUp(self):
+        pass
+
+    def Execute(self, commands, no_except):
+        self.commands.append(commands)
+        return {
+            const.STDOUT: [""] * len(commands),
+            const.STDERR: [""] * len(commands),
+            const.EXIT_CODE: [0] * len(commands),
+        }
+
+
+class MirrorTrackerShellTest(unittest.TestCase):
+    """Tests the shell command routing of MirrorTracker."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.adb = FakeAdb()
+        self.shell_mirror = FakeShellMirror()
+        self.tracker = mirror_tracker.MirrorTracker(0, adb=self.adb)
+        self.tracker._registered_mirrors[
+            mirror_tracker._DEFAULT_SHELL_NAME] = self.shell_mirror
+
+    def testAdbBatch(self):
+        """Tests that adb-routed commands run in one adb shell."""
+        result = self.tracker.Execute(
+            ["echo a; echo b >&2", "printf c; exit 4", "cat"])
+        self.assertEqual(result[const.STDOUT], [b"a\n", b"c", b""])
+        self.assertEqual(result[const.STDERR], [b"b\n", b"", b""])
+        self.assertEqual(result[const.EXIT_CODE], [0, 4, 0])
+        self.assertEqual(len(self.adb.client.commands), 1)
+        self.assertEqual(self.adb.commands, [])
+
+    def testAdbBatchPersistentShell(self):
+        """Tests that a batch runs in the persistent shell session."""
+        self.adb.persistent_shell = True
+        result = self.tracker.Execute(["echo a", "printf c; exit 4", "cat"])
+        self.assertEqual(result[const.STDOUT], [b"a\n", b"c", b""])
+        self.assertEqual(result[const.EXIT_CODE], [0, 4, 0])
+        self.assertEqual(len(self.adb.commands), 1)
+        self.assertEqual(self.adb.client.commands, [])
+
+    def testAdbBatchShellExit(self):
+        """Tests that the commands after an exiting shell still run."""
+        result = self.tracker.Execute(
+            ["echo a", "echo b; kill -9 $$", "echo c"])
+        self.assertEqual(result[const.STDOUT], [b"a\n", b"b\n", b"c\n"])
+        self.assertEqual(result[const.EXIT_CODE], [0, -9, 0])
+        self.assertEqual(len(self.adb.client.commands), 1)
+        self.assertEqual(self.adb.commands, ["echo c"])
+
+    def testRouting(self):
+        """Tests forced and measured routing."""
+        self.tracker.Execute(["true"], nohup=True)
+        self.assertEqual(self.shell_mirror.commands, [["true"]])
+        self.tracker.Execute(["x" * 1000])
+        self.assertEqual(len(self.shell_mirror.commands), 2)
+
+        stats = self.tracker.shell_routing.GetStats()
+        self.assertEqual(stats[shell_routing.TRANSPORT_VTS_DRIVER,
+                               "1"]["samples"], 2)
+        # A small call always uses adb.
+        self.tracker.Execute(["true"])
+        self.assertEqual(len(self.shell_mirror.commands), 2)
+        self.assertEqual(self.adb.commands, ["true"])
+        # A large call uses the driver, and adb is tried on the second call.
+        self.tracker.Execute(["true"] * 5)
+        self.assertEqual(len(self.shell_mirror.commands), 3)
+        self.tracker.Execute(["true"] * 5)
+        self.assertEqual(len(self.shell_mirror.commands), 3)
+        self.assertEqual(len(self.adb.client.commands), 1)
+
+    def testAdbBatchLength(self):
+        """Tests that the wrapped script of a batch is within the limit."""
+        commands = ["echo %d" % i for i in range(100)]
+        batches = []
+        index = 0
+        while index < len(commands):
+            batch = self.tracker._GetAdbBatch(commands, index)
+            batches.append(batch)
+            index += len(batch)
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sum(batches, []), commands)
+        for batch in batches:
+            script = "".join(
+                mirror_tracker._WrapAdbBatchCommand(
+                    cmd, mirror_tracker._ADB_BATCH_MARKER_FORMAT % ("0" * 32))
+                for cmd in batch)
+            self.assertLessEqual(len(script),
+                                 mirror_tracker._MAX_ADB_BATCH_LENGTH)
+
+    def testExecuteError(self):
+        """Tests that a failed execution does not leave its event open."""
+        def Raise(commands, no_except):
+            raise IOError("shell driver error")
+
+        self.shell_mirror.Execute = Raise
+        event_count = len(tfie.event_stack)
+        with self.assertRaises(IOError):
+            self.tracker.Execute(["true"], nohup=True)
+        self.assertEqual(len(tfie.event_stack), event_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
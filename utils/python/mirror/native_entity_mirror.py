@@ -24,8 +24,8 @@ from google.protobuf import text_format
 from vts.proto import AndroidSystemControlMessage_pb2 as ASysCtrlMsg
 from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
 from vts.utils.python.fuzzer import FuzzerUtils
+from vts.utils.python.mirror import converter_compiler
 from vts.utils.python.mirror import mirror_object
-from vts.utils.python.mirror import py2pb
 from vts.utils.python.mirror import resource_mirror
 
 _DEFAULT_TARGET_BASE_PATHS = ["/system/lib64/hw"]
@@ -34,6 +34,8 @@ _DEFAULT_HWBINDER_SERVICE = "default"
 INTERFACE = "interface"
 API = "api"
 
+_RESERVED_API_NOTIFY_SYSPROPS_CHANGED = "notifySyspropsChanged"
+
 
 class MirrorObjectError(Exception):
     """Raised when there is a general error in manipulating a mirror object."""
@@ -51,6 +53,66 @@ class VtsEnum(object):
                     getattr(scalar_value, attribute.enum_value.scalar_type))
 
 
+class ApiCallTemplate(object):
+    """The prebuilt call message of an API of a mirrored native entity.
+
+    Attributes:
+        func_msg: FunctionSpecificationMessage, the API spec.
+        _call_msg: FunctionCallMessage, the call message without arg values.
+        _no_arg_call_msg: FunctionCallMessage, the call message used when no
+                          arg value is given (all pointer args set to 0).
+        _arg_converters: list of functions, the compiled py2pb converter of
+                         each API argument.
+    """
+
+    def __init__(self, func_msg, component_class, driver_id):
+        self.func_msg = func_msg
+        self._call_msg = CompSpecMsg.FunctionCallMessage()
+        if component_class:
+            self._call_msg.component_class = component_class
+        if driver_id is not None:
+            self._call_msg.hal_driver_id = driver_id
+        self._call_msg.api.CopyFrom(func_msg)
+
+        self._no_arg_call_msg = CompSpecMsg.FunctionCallMessage()
+        self._no_arg_call_msg.CopyFrom(self._call_msg)
+        for arg in self._no_arg_call_msg.api.arg:
+            # TODO: handle other
+            if (arg.type == CompSpecMsg.TYPE_SCALAR
+                    and arg.scalar_type == "pointer"):
+                arg.scalar_value.pointer = 0
+
+        self._arg_converters = [converter_compiler.CompilePy2Pb(arg)
+                                for arg in func_msg.arg]
+
+    def Fill(self, args):
+        """Creates a call message with the given argument values.
+
+        Args:
+            args: a list of Python or VariableSpecificationMessage values.
+                  None values keep the spec of the corresponding argument.
+
+        Returns:
+            FunctionCallMessage
+
+        Raises:
+            MirrorObjectError if an argument can not be converted.
+        """
+        call_msg = CompSpecMsg.FunctionCallMessage()
+        if not args:
+            call_msg.CopyFrom(self._no_arg_call_msg)
+            return call_msg
+
+        call_msg.CopyFrom(self._call_msg)
+        for converter, arg_msg, value_msg in zip(
+                self._arg_converters, call_msg.api.arg, args):
+            if (value_msg is not None
+                    and converter(value_msg, arg_msg) is None):
+                raise MirrorObjectError(
+                    "Failed to convert arg %s" % (value_msg, ))
+        return call_msg
+
+
 class NativeEntityMirror(mirror_object.MirrorObject):
     """The class that acts as the mirror to an Android device's HAL layer.
 
@@ -75,6 +137,48 @@ class NativeEntityMirror(mirror_object.MirrorObject):
         self._driver_id = driver_id
         self._if_spec_msg = if_spec_message
         self._last_raw_code_coverage_data = None
+        self._api_templates = None
+        self._attribute_converters = {}
+
+    def _BuildApiIndex(self):
+        """Builds the API name to call template index of the current spec.
+
+        Called once after the interface specification message and the driver
+        ID are known, so that each remote call only needs to fill in the
+        argument values.
+        """
+        if not isinstance(self._if_spec_msg,
+                          CompSpecMsg.ComponentSpecificationMessage):
+            logging.error("unknown spec type %s", type(self._if_spec_msg))
+            sys.exit(1)
+
+        api_templates = {}
+        # handle reserved methods first.
+        func_msg = CompSpecMsg.FunctionSpecificationMessage()
+        func_msg.name = _RESERVED_API_NOTIFY_SYSPROPS_CHANGED
+        api_templates[func_msg.name] = ApiCallTemplate(
+            func_msg, self._if_spec_msg.component_class, self._driver_id)
+        for api in self._if_spec_msg.interface.api:
+            # Keep the first definition as the linear scan used to do.
+            if api.name not in api_templates:
+                api_templates[api.name] = ApiCallTemplate(
+                    api, self._if_spec_msg.component_class, self._driver_id)
+        self._api_templates = api_templates
+        logging.debug("Indexed %d APIs for driver %s", len(api_templates),
+                      self._driver_id)
+
+    def _GetApiTemplate(self, api_name):
+        """Gets the prebuilt call template of an API.
+
+        Args:
+            api_name: string, the name of the target function API.
+
+        Returns:
+            ApiCallTemplate if found, None otherwise.
+        """
+        if self._api_templates is None:
+            self._BuildApiIndex()
+        return self._api_templates.get(api_name)
 
     def GetApi(self, api_name):
         """Gets the ProtoBuf message for given api.
@@ -85,22 +189,30 @@ class NativeEntityMirror(mirror_object.MirrorObject):
         Returns:
             FunctionSpecificationMessage if found, None otherwise
         """
-        logging.debug("GetAPI %s for %s", api_name, self._if_spec_msg)
-        # handle reserved methods first.
-        if api_name == "notifySyspropsChanged":
-            func_msg = CompSpecMsg.FunctionSpecificationMessage()
-            func_msg.name = api_name
-            return func_msg
-        if isinstance(self._if_spec_msg,
-                      CompSpecMsg.ComponentSpecificationMessage):
-            if len(self._if_spec_msg.interface.api) > 0:
-                for api in self._if_spec_msg.interface.api:
-                    if api.name == api_name:
-                        return copy.copy(api)
-        else:
-            logging.error("unknown spec type %s", type(self._if_spec_msg))
-            sys.exit(1)
-        return None
+        logging.debug("GetAPI %s", api_name)
+        template = self._GetApiTemplate(api_name)
+        if template is None:
+            return None
+        return copy.copy(template.func_msg)
+
+    def _PrepareCallMessage(self, api_name, args):
+        """Builds the FunctionCallMessage of a remote API call.
+
+        Args:
+            api_name: string, the name of the target function API.
+            args: a list of Python or VariableSpecificationMessage values.
+
+        Returns:
+            FunctionCallMessage, ready to be sent to the agent.
+
+        Raises:
+            MirrorObjectError if the API is unknown or an argument can not be
+            converted.
+        """
+        template = self._GetApiTemplate(api_name)
+        if template is None:
+            raise MirrorObjectError("api %s unknown" % api_name)
+        return template.Fill(args)
 
     def GetAttribute(self, attribute_name):
         """Gets the ProtoBuf message for given attribute.
@@ -167,12 +279,17 @@ class NativeEntityMirror(mirror_object.MirrorObject):
         Returns:
             Converted VariableSpecificationMessage if found, None otherwise
         """
-        attribute_spec = self.GetAttribute(attribute_name)
-        if attribute_spec:
-            converted_attr = py2pb.Convert(attribute_spec, py_values)
+        converter = self._attribute_converters.get(attribute_name)
+        if converter is None:
+            attribute_spec = self.GetAttribute(attribute_name)
+            if attribute_spec:
+                converter = converter_compiler.CompilePy2Pb(attribute_spec)
+                self._attribute_converters[attribute_name] = converter
+        if converter:
+            converted_attr = converter(py_values)
             if converted_attr is None:
-              raise MirrorObjectError(
-                  "Failed to convert attribute %s", attribute_spec)
+                raise MirrorObjectError(
+                    "Failed to convert attribute %s" % attribute_name)
             return converted_attr
         logging.error("Can not find attribute: %s", attribute_name)
         return None
@@ -189,36 +306,9 @@ class NativeEntityMirror(mirror_object.MirrorObject):
 
         def RemoteCall(*args, **kwargs):
             """Dynamically calls a remote API and returns the result value."""
-            func_msg = self.GetApi(api_name)
-            if not func_msg:
-                raise MirrorObjectError("api %s unknown", func_msg)
-
             logging.debug("remote call %s%s", api_name, args)
-            if args:
-                for arg_msg, value_msg in zip(func_msg.arg, args):
-                    logging.debug("arg msg %s", arg_msg)
-                    logging.debug("value %s", value_msg)
-                    if value_msg is not None:
-                        converted_msg = py2pb.Convert(arg_msg, value_msg)
-                        if converted_msg is None:
-                          raise MirrorObjectError("Failed to convert arg %s", value_msg)
-                        logging.debug("converted_message: %s", converted_msg)
-                        arg_msg.CopyFrom(converted_msg)
-            else:
-                # TODO: use kwargs
-                for arg in func_msg.arg:
-                    # TODO: handle other
-                    if (arg.type == CompSpecMsg.TYPE_SCALAR
-                            and arg.scalar_type == "pointer"):
-                        arg.scalar_value.pointer = 0
-                logging.debug(func_msg)
-
-            call_msg = CompSpecMsg.FunctionCallMessage()
-            if self._if_spec_msg.component_class:
-                call_msg.component_class = self._if_spec_msg.component_class
-            call_msg.hal_driver_id = self._driver_id
-            call_msg.api.CopyFrom(func_msg)
-            logging.debug("final msg %s", call_msg)
+            # TODO: use kwargs
+            call_msg = self._PrepareCallMessage(api_name, args)
             results = self._client.CallApi(
                 text_format.MessageToString(call_msg), self._caller_uid)
             if (isinstance(results, tuple) and len(results) == 2
@@ -362,9 +452,8 @@ class NativeEntityMirror(mirror_object.MirrorObject):
             raise MirrorObjectError("const %s not found" % api_name)
 
         # handle APIs.
-        func_msg = self.GetApi(api_name)
-        if func_msg:
-            logging.debug("api %s", func_msg)
+        if self._GetApiTemplate(api_name) is not None:
+            logging.debug("api %s", api_name)
             return RemoteCall
 
         # handle attributes.
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import copy
+import logging
+import time
+import unittest
+
+from google.protobuf import text_format
+
+from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
+from vts.utils.python.mirror import native_entity_mirror
+from vts.utils.python.mirror import py2pb
+
+_BENCHMARK_CALL_COUNT = 2000
+
+_SPEC = """
+component_class: HAL_HIDL
+interface: {
+  api: {
+    name: "add"
+    arg: {
+      type: TYPE_SCALAR
+      scalar_type: "int32_t"
+    }
+    arg: {
+      type: TYPE_SCALAR
+      scalar_type: "int32_t"
+    }
+  }
+  api: {
+    name: "setData"
+    arg: {
+      type: TYPE_VECTOR
+      vector_value: {
+        type: TYPE_SCALAR
+        scalar_type: "uint8_t"
+      }
+    }
+    arg: {
+      type: TYPE_SCALAR
+      scalar_type: "pointer"
+    }
+  }
+}
+"""
+
+
+class FakeClient(object):
+    """A fake VtsTcpClient which records the call messages it receives."""
+
+    def __init__(self):
+        self.call_msgs = []
+
+    def CallApi(self, arg, caller_uid=None):
+        call_msg = CompSpecMsg.FunctionCallMessage()
+        text_format.Merge(arg, call_msg)
+        self.call_msgs.append(call_msg)
+        return []
+
+
+def _LegacyPrepareCallMessage(mirror, api_name, args):
+    """Builds a call message the way RemoteCall did before API indexing."""
+    func_msg = None
+    for api in mirror._if_spec_msg.interface.api:
+        if api.name == api_name:
+            func_msg = copy.copy(api)
+            break
+    for arg_msg, value_msg in zip(func_msg.arg, args):
+        if value_msg is not None:
+            arg_msg.CopyFrom(py2pb.Convert(arg_msg, value_msg))
+    call_msg = CompSpecMsg.FunctionCallMessage()
+    if mirror._if_spec_msg.component_class:
+        call_msg.component_class = mirror._if_spec_msg.component_class
+    call_msg.hal_driver_id = mirror._driver_id
+    call_msg.api.CopyFrom(func_msg)
+    return call_msg
+
+
+class NativeEntityMirrorTest(unittest.TestCase):
+    """Tests the API indexing of native_entity_mirror module."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        spec = CompSpecMsg.ComponentSpecificationMessage()
+        text_format.Merge(_SPEC, spec)
+        self.client = FakeClient()
+        self.mirror = native_entity_mirror.NativeEntityMirror(
+            self.client, driver_id=3, if_spec_message=spec)
+
+    def testRemoteCallScalarArgs(self):
+        """Tests that scalar args are filled into the call message."""
+        self.mirror.add(1, 2)
+        call_msg = self.client.call_msgs[0]
+        self.assertEqual(call_msg.hal_driver_id, 3)
+        self.assertEqual(call_msg.api.name, "add")
+        self.assertEqual(
+            [arg.scalar_value.int32_t for arg in call_msg.api.arg], [1, 2])
+        self.assertEqual(call_msg,
+                         _LegacyPrepareCallMessage(self.mirror, "add", (1, 2)))
+
+    def testRemoteCallDoesNotModifyTemplate(self):
+        """Tests that calls do not leak arg values into later calls."""
+        self.mirror.add(1, 2)
+        self.mirror.add(3, None)
+        self.assertEqual(self.client.call_msgs[1].api.arg[0].scalar_value.
+                         int32_t, 3)
+        self.assertFalse(self.client.call_msgs[1].api.arg[1].scalar_value.
+                         HasField("int32_t"))
+
+    def testRemoteCallNoArgs(self):
+        """Tests that pointer args are zeroed when no arg is given."""
+        self.mirror.setData()
+        call_msg = self.client.call_msgs[0]
+        self.assertTrue(call_msg.api.arg[1].scalar_value.HasField("pointer"))
+        self.assertFalse(call_msg.api.arg[0].HasField("vector_size"))
+
+    def testRemoteCallGenericArgs(self):
+        """Tests that non-scalar args use the py2pb conversion."""
+        self.mirror.setData([1, 2, 3], 0)
+        self.assertEqual(
+            self.client.call_msgs[0],
+            _LegacyPrepareCallMessage(self.mirror, "setData", ([1, 2, 3], 0)))
+
+    def testGetApi(self):
+        """Tests GetApi for defined, reserved, and unknown APIs."""
+        self.assertEqual(self.mirror.GetApi("add").name, "add")
+        self.assertEqual(
+            self.mirror.GetApi("notifySyspropsChanged").name,
+            "notifySyspropsChanged")
+        self.assertIsNone(self.mirror.GetApi("unknown"))
+        with self.assertRaises(native_entity_mirror.MirrorObjectError):
+            self.mirror.unknown
+
+    def testPy2PbCachedConverterFailure(self):
+        """Tests the error of a cached attribute converter returning None."""
+        self.mirror._attribute_converters["attr"] = lambda py_values: None
+        with self.assertRaisesRegexp(native_entity_mirror.MirrorObjectError,
+                                     "attr"):
+            self.mirror.Py2Pb("attr", 1)
+
+    def testCallMessageBenchmark(self):
+        """Measures the per-call host overhead of building call messages."""
+        args = (1, 2)
+        start = time.time()
+        for _ in range(_BENCHMARK_CALL_COUNT):
+            _LegacyPrepareCallMessage(self.mirror, "add", args)
+        legacy_time = time.time() - start
+
+        start = time.time()
+        for _ in range(_BENCHMARK_CALL_COUNT):
+            self.mirror._PrepareCallMessage("add", args)
+        indexed_time = time.time() - start
+
+        logging.info("per-call overhead: legacy %.1f us, indexed %.1f us",
+                     legacy_time * 1e6 / _BENCHMARK_CALL_COUNT,
+                     indexed_time * 1e6 / _BENCHMARK_CALL_COUNT)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
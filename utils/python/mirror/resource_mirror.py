@@ -13,7 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import array
+import itertools
 import logging
+import struct
+import sys
 
 from vts.proto import AndroidSystemControlMessage_pb2 as ASysCtrlMsg
 from vts.proto import VtsResourceControllerMessage_pb2 as ResControlMsg
@@ -21,9 +25,95 @@ from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
 from vts.utils.python.mirror import mirror_object
 
 
+# struct module format characters of the FMQ scalar types.
+_SCALAR_TYPE_FORMATS = {
+    "uint8_t": "B",
+    "int8_t": "b",
+    "uint16_t": "H",
+    "int16_t": "h",
+    "uint32_t": "I",
+    "int32_t": "i",
+    "uint64_t": "Q",
+    "int64_t": "q",
+    "bool_t": "?",
+    "double_t": "d"
+}
+
+# numpy dtypes of the packed FMQ scalar types (little-endian).
+_SCALAR_TYPE_NUMPY_DTYPES = {
+    "uint8_t": "<u1",
+    "int8_t": "<i1",
+    "uint16_t": "<u2",
+    "int16_t": "<i2",
+    "uint32_t": "<u4",
+    "int32_t": "<i4",
+    "uint64_t": "<u8",
+    "int64_t": "<i8",
+    "bool_t": "?",
+    "double_t": "<f8"
+}
+
+# Max number of bytes transferred in one hidl_memory request.
+_DEFAULT_MEM_CHUNK_SIZE = 1 << 20
+
+# Max number of hidl_memory chunk requests in flight.
+_DEFAULT_MEM_PIPELINE_DEPTH = 4
+
+
+def _IsPackableBuffer(data):
+    """Checks whether data is a buffer that can be written in packed form.
+
+    Args:
+        data: the data a caller provides to a FMQ write operation.
+
+    Returns:
+        bool, true if data is an array.array, a numpy array, a bytearray, or
+        a memoryview.
+    """
+    return (isinstance(data, (array.array, bytearray, memoryview))
+            or (hasattr(data, "dtype") and hasattr(data, "astype")))
+
+
+def _ByteView(data):
+    """Creates a memoryview of the raw bytes of a buffer.
+
+    Args:
+        data: string, bytearray, or memoryview.
+
+    Returns:
+        memoryview, a view of unsigned bytes that shares data's memory.
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if view.itemsize != 1 and hasattr(view, "cast"):
+        view = view.cast("B")
+    return view
+
+
+def _IsArrayCompatible(items, item_format):
+    """Checks whether the raw items of an array match a packed scalar type.
+
+    Args:
+        items: array.array, the array to check.
+        item_format: string, struct module format character of the type.
+
+    Returns:
+        bool, true if the array items have the size of the scalar type and
+        are both floating point or both integers.
+    """
+    return (items.itemsize == struct.calcsize("<" + item_format)
+            and (items.typecode in ("f", "d")) == (item_format == "d"))
+
+
 class ResourceFmqMirror(mirror_object.MirrorObject):
     """This is a class that mirrors FMQ resource allocated on the target side.
 
+    For the supported scalar types, data can also be provided as an
+    array.array, a numpy array, or a bytearray/memoryview of little-endian
+    items, and read into an array.array. Such data is transferred as one
+    packed bytes field instead of one protobuf message per item.
+    A numpy array can be created from a read array.array without copying,
+    e.g., numpy.frombuffer(data, dtype=queue.packedDtype).
+
     Attributes:
         SUPPORTED_SCALAR_TYPES: set, contains all scalar types supported by FMQ.
                                 If the type of FMQ is one of those, this class
@@ -93,10 +183,11 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         """Initiate a non-blocking read request to FMQ driver.
 
         Args:
-            data: list, data to be filled by this function. The list will
-                  be emptied before the function starts to put read data into
-                  it, which is consistent with the function behavior on the
-                  target side.
+            data: list or array.array, data to be filled by this function.
+                  The list will be emptied before the function starts to put
+                  read data into it, which is consistent with the function
+                  behavior on the target side. If data is an array.array,
+                  the read data is transferred in packed form.
             data_size: int, length of data to read.
 
         Returns:
@@ -108,6 +199,7 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         request_msg = self._createTemplateRequestMessage(
             ResControlMsg.FMQ_READ, self._queue_id)
         request_msg.read_data_size = data_size
+        request_msg.pack_read_data = self._isPackedRead(data)
 
         # Send and receive data.
         fmq_response = self._client.SendFmqRequest(request_msg)
@@ -121,10 +213,11 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         """Initiate a blocking read request (short-form) to FMQ driver.
 
         Args:
-            data: list, data to be filled by this function. The list will
-                  be emptied before the function starts to put read data into
-                  it, which is consistent with the function behavior on the
-                  target side.
+            data: list or array.array, data to be filled by this function.
+                  The list will be emptied before the function starts to put
+                  read data into it, which is consistent with the function
+                  behavior on the target side. If data is an array.array,
+                  the read data is transferred in packed form.
             data_size: int, length of data to read.
             time_out_nanos: int, wait time (in nanoseconds) when blocking.
                             The default value is 0 (no blocking).
@@ -138,6 +231,7 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         request_msg = self._createTemplateRequestMessage(
             ResControlMsg.FMQ_READ_BLOCKING, self._queue_id)
         request_msg.read_data_size = data_size
+        request_msg.pack_read_data = self._isPackedRead(data)
         request_msg.time_out_nanos = time_out_nanos
 
         # Send and receive data.
@@ -151,7 +245,9 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         """Initiate a non-blocking write request to FMQ driver.
 
         Args:
-            data: list, data to be written.
+            data: list, data to be written. For scalar types, it can also be
+                  an array.array, a numpy array, or a bytearray/memoryview
+                  of little-endian items, which is written in packed form.
             data_size: int, length of data to write.
                        The function will only write data up until data_size,
                        i.e. extraneous data will be discarded.
@@ -163,7 +259,7 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         # Prepare arguments.
         request_msg = self._createTemplateRequestMessage(
             ResControlMsg.FMQ_WRITE, self._queue_id)
-        prepare_result = self._prepareWriteData(request_msg, data[:data_size])
+        prepare_result = self._prepareWriteData(request_msg, data, data_size)
         if not prepare_result:
             # Prepare write data failure, error logged in _prepareWriteData().
             return False
@@ -179,7 +275,9 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         """Initiate a blocking write request (short-form) to FMQ driver.
 
         Args:
-            data: list, data to be written.
+            data: list, data to be written. For scalar types, it can also be
+                  an array.array, a numpy array, or a bytearray/memoryview
+                  of little-endian items, which is written in packed form.
             data_size: int, length of data to write.
                        The function will only write data up until data_size,
                        i.e. extraneous data will be discarded.
@@ -193,7 +291,7 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         # Prepare arguments.
         request_msg = self._createTemplateRequestMessage(
             ResControlMsg.FMQ_WRITE_BLOCKING, self._queue_id)
-        prepare_result = self._prepareWriteData(request_msg, data[:data_size])
+        prepare_result = self._prepareWriteData(request_msg, data, data_size)
         if not prepare_result:
             # Prepare write data failure, error logged in _prepareWriteData().
             return False
@@ -300,6 +398,16 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         """
         return self._sync
 
+    @property
+    def packedDtype(self):
+        """Get the numpy dtype of packed data of this FMQ mirror.
+
+        Returns:
+            string, numpy dtype (e.g. "<i4") if the data type can be packed,
+            None otherwise.
+        """
+        return _SCALAR_TYPE_NUMPY_DTYPES.get(self._data_type)
+
     def _createTemplateRequestMessage(self, operation, queue_id):
         """Creates a template FmqRequestMessage with common arguments among
            all FMQ operations.
@@ -320,20 +428,23 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
         request_msg.queue_id = queue_id
         return request_msg
 
-    def _prepareWriteData(self, request_msg, data):
+    def _prepareWriteData(self, request_msg, data, data_size):
         """Converts python list to repeated protobuf field.
 
         If the type of data in the queue is a supported scalar, caller can
         directly supply the python native value. Otherwise, caller needs to
         supply a list of VariableSpecificationMessage.
+        Buffers of scalar values are packed into write_data_packed.
 
         Args:
             request_msg: FmqRequestMessage, arguments for a FMQ operation
                          request.
             data: VariableSpecificationMessage list or a list of scalar values.
                   If the type of FMQ is scalar type, caller can directly
-                  specify the Python scalar data. Otherwise, caller has to
-                  provide each item as VariableSpecificationMessage.
+                  specify the Python scalar data, or a buffer of them.
+                  Otherwise, caller has to provide each item as
+                  VariableSpecificationMessage.
+            data_size: int, number of items in data to write.
 
         Returns:
             bool, true if preparation succeeds, false otherwise.
@@ -341,7 +452,14 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
             VariableSpecificationMessage when type of data in the queue
             is not a supported scalar type.
         """
-        for curr_value in data:
+        if _IsPackableBuffer(data):
+            packed_data = self._packWriteData(data, data_size)
+            if packed_data is None:
+                return False
+            request_msg.write_data_packed = packed_data
+            return True
+
+        for curr_value in data[:data_size]:
             new_message = request_msg.write_data.add()
             if isinstance(curr_value,
                           CompSpecMsg.VariableSpecificationMessage):
@@ -366,9 +484,92 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
                   by caller, so this function will append every element to the
                   buffer.
         """
+        if isinstance(data, array.array) and response_msg.HasField(
+                "read_data_packed"):
+            self._unpackReadData(response_msg.read_data_packed, data)
+            return
         for item in response_msg.read_data:
             data.append(self._client.GetPythonDataOfVariableSpecMsg(item))
 
+    def _isPackedRead(self, data):
+        """Checks whether read data should be transferred in packed form.
+
+        Args:
+            data: list or array.array, the buffer provided by caller.
+
+        Returns:
+            bool, true if data is an array.array and the data type in the
+            queue is a supported scalar type.
+        """
+        return (isinstance(data, array.array)
+                and self._data_type in self.SUPPORTED_SCALAR_TYPES)
+
+    def _packWriteData(self, data, data_size):
+        """Packs a buffer of scalar values into little-endian bytes.
+
+        Args:
+            data: array.array, numpy array, bytearray, or memoryview.
+                  A bytearray or memoryview must contain little-endian items.
+            data_size: int, number of items in data to write.
+
+        Returns:
+            bytes, the packed items if data can be packed, None otherwise.
+        """
+        if self._data_type not in self.SUPPORTED_SCALAR_TYPES:
+            logging.error("Can not pack data of type %s.", self._data_type)
+            return None
+        item_format = _SCALAR_TYPE_FORMATS[self._data_type]
+        item_size = struct.calcsize("<" + item_format)
+
+        if isinstance(data, (bytearray, memoryview)):
+            view = memoryview(data)
+            if hasattr(view, "cast") and view.format != "B":
+                view = view.cast("B")
+            packed_data = view[:data_size * item_size].tobytes()
+            if len(packed_data) % item_size:
+                logging.error("Buffer size is not a multiple of item size %d.",
+                              item_size)
+                return None
+            return packed_data
+
+        if not isinstance(data, array.array):
+            # numpy array, convert only if the dtype differs.
+            return data[:data_size].astype(
+                _SCALAR_TYPE_NUMPY_DTYPES[self._data_type],
+                copy=False).tobytes()
+
+        items = data[:data_size]
+        if not _IsArrayCompatible(items, item_format):
+            return struct.pack("<%d%s" % (len(items), item_format), *items)
+        if sys.byteorder != "little":
+            items.byteswap()
+        if hasattr(items, "tobytes"):
+            return items.tobytes()
+        return items.tostring()
+
+    def _unpackReadData(self, packed_data, data):
+        """Unpacks little-endian bytes of scalar values into an array.
+
+        Args:
+            packed_data: bytes, the packed items read from the queue.
+            data: array.array, to be filled by this function.
+        """
+        item_format = _SCALAR_TYPE_FORMATS[self._data_type]
+        if not _IsArrayCompatible(data, item_format):
+            item_size = struct.calcsize("<" + item_format)
+            data.extend(
+                struct.unpack("<%d%s" % (len(packed_data) // item_size,
+                                         item_format), packed_data))
+            return
+        items = array.array(data.typecode)
+        if hasattr(items, "frombytes"):
+            items.frombytes(packed_data)
+        else:
+            items.fromstring(packed_data)
+        if sys.byteorder != "little":
+            items.byteswap()
+        data.extend(items)
+
     def _processUtilMethod(self, request_msg):
         """Sends request message and process response message for util methods
            that return an unsigned integer,
@@ -389,14 +590,28 @@ class ResourceFmqMirror(mirror_object.MirrorObject):
 class ResourceHidlMemoryMirror(mirror_object.MirrorObject):
     """This class mirrors hidl_memory resource allocated on the target side.
 
+    Byte ranges larger than chunkSize are transferred in chunks, and up to
+    pipelineDepth chunk requests are sent before waiting for the responses.
+    Writes accept str, bytearray, or memoryview data, and readInto() fills a
+    caller-provided bytearray or memoryview, so a large region never needs
+    to be held in one protobuf string on the host.
+
     Attributes:
         _client: the TCP client instance.
         _mem_id: int, used to identify the memory region on the target side.
+        _chunk_size: int, max number of bytes transferred in one request.
+        _pipeline_depth: int, max number of chunk requests in flight.
     """
 
-    def __init__(self, client, mem_id=-1):
+    def __init__(self,
+                 client,
+                 mem_id=-1,
+                 chunk_size=_DEFAULT_MEM_CHUNK_SIZE,
+                 pipeline_depth=_DEFAULT_MEM_PIPELINE_DEPTH):
         super(ResourceHidlMemoryMirror, self).__init__(client)
         self._mem_id = mem_id
+        self._chunk_size = chunk_size
+        self._pipeline_depth = pipeline_depth
 
     def _allocate(self, mem_size):
         """Initiate a hidl_memory region on the target side.
@@ -524,6 +739,7 @@ class ResourceHidlMemoryMirror(mirror_object.MirrorObject):
 
         This method helps caller perform actual read operation on the
         memory region, because host side won't be able to cast c++ pointers.
+        Ranges larger than chunkSize are read in pipelined chunks.
 
         Args:
             length: int, number of bytes to read.
@@ -535,29 +751,70 @@ class ResourceHidlMemoryMirror(mirror_object.MirrorObject):
                     corresponding data structure in python.
             None, indicate if the read fails.
         """
-        request_msg = self._createTemplateRequestMessage(
-            ResControlMsg.MEM_PROTO_READ_BYTES)
-        request_msg.start = start
-        request_msg.length = length
+        if length <= self._chunk_size:
+            response_msg = self._client.SendHidlMemoryRequest(
+                self._createReadBytesRequestMessage(start, length))
+            if response_msg is not None:
+                if response_msg.success:
+                    return response_msg.read_data
+                logging.error("Failed to find memory region with id %d",
+                              self._mem_id)
+            return None
 
-        response_msg = self._client.SendHidlMemoryRequest(request_msg)
-        if response_msg is not None:
-            if response_msg.success:
-                return response_msg.read_data
-            logging.error("Failed to find memory region with id %d",
-                          self._mem_id)
-        return None
+        data = bytearray(length)
+        if self.readInto(data, start) != length:
+            return None
+        return bytes(data)
+
+    def readInto(self, buffer, start=0):
+        """Reads a byte range of the memory region into a buffer.
+
+        The range starts at start and has the size of the buffer. It is read
+        in chunks of chunkSize bytes, and each chunk is copied into the buffer
+        as it arrives.
+        As with readBytes(), caller must call read() or readRange() first.
+
+        Args:
+            buffer: bytearray or writable memoryview, the buffer to fill.
+            start: int, offset from the start of memory region to read.
+
+        Returns:
+            int, number of bytes read, -1 to signal operation failure.
+        """
+        view = _ByteView(buffer)
+        if view.readonly:
+            logging.error("Cannot read into a read-only buffer.")
+            return -1
+        length = len(view)
+        request_msgs = (self._createReadBytesRequestMessage(
+            start + offset, min(self._chunk_size, length - offset))
+                        for offset in xrange(0, length, self._chunk_size))
+
+        offset = 0
+        for response_msg in self._sendPipelinedRequests(request_msgs):
+            if response_msg is None:
+                return -1
+            if not response_msg.success:
+                logging.error("Failed to find memory region with id %d",
+                              self._mem_id)
+                return -1
+            chunk = response_msg.read_data
+            view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return offset
 
     def updateBytes(self, data, length, start=0):
         """This method performs actual write operation.
 
         This method helps caller perform actual write operation on the
         memory region, because host side won't be able to cast c++ pointers.
+        Ranges larger than chunkSize are written in pipelined chunks.
 
         Args:
-            data: string, bytes to be written into memory.
+            data: string, bytearray, or memoryview, bytes to be written into
+                  memory.
                   Caller can use bytearray() function to convert python
-                  data structures into python, and call str() on the resulting
+                  data structures into python, and pass the resulting
                   bytearray object.
             length: int, number of bytes to write.
             start: int, offset from the start of memory region to be modified.
@@ -565,19 +822,29 @@ class ResourceHidlMemoryMirror(mirror_object.MirrorObject):
         Returns:
             bool, true if the operation succeeds, false otherwise.
         """
-        request_msg = self._createTemplateRequestMessage(
-            ResControlMsg.MEM_PROTO_UPDATE_BYTES)
-        request_msg.write_data = data
-        request_msg.start = start
-        request_msg.length = length
+        if length <= self._chunk_size and isinstance(data, str):
+            request_msgs = [
+                self._createUpdateBytesRequestMessage(data, start, length)
+            ]
+        else:
+            view = _ByteView(data)
+            if len(view) < length:
+                logging.error("Data has %d bytes, less than length %d.",
+                              len(view), length)
+                return False
+            request_msgs = (self._createUpdateBytesRequestMessage(
+                view[offset:min(offset + self._chunk_size, length)].tobytes(),
+                start + offset, min(self._chunk_size, length - offset))
+                            for offset in xrange(0, length, self._chunk_size))
 
-        response_msg = self._client.SendHidlMemoryRequest(request_msg)
-        if response_msg is not None:
+        for response_msg in self._sendPipelinedRequests(request_msgs):
+            if response_msg is None:
+                return False
             if not response_msg.success:
                 logging.error("Failed to find memory region with id %d",
                               self._mem_id)
-            return response_msg.success
-        return False
+                return False
+        return True
 
     def commit(self):
         """Caller signals done with operating on the memory region.
@@ -624,6 +891,102 @@ class ResourceHidlMemoryMirror(mirror_object.MirrorObject):
         """
         return self._mem_id
 
+    @property
+    def chunkSize(self):
+        """Gets the max number of bytes transferred in one request."""
+        return self._chunk_size
+
+    @chunkSize.setter
+    def chunkSize(self, chunk_size):
+        """Sets the max number of bytes transferred in one request.
+
+        Args:
+            chunk_size: int, a positive number of bytes.
+        """
+        if chunk_size <= 0:
+            raise ValueError("Invalid chunk size %d." % chunk_size)
+        self._chunk_size = chunk_size
+
+    @property
+    def pipelineDepth(self):
+        """Gets the max number of chunk requests in flight."""
+        return self._pipeline_depth
+
+    @pipelineDepth.setter
+    def pipelineDepth(self, pipeline_depth):
+        """Sets the max number of chunk requests in flight.
+
+        Args:
+            pipeline_depth: int, a positive number of requests.
+                            1 disables pipelining.
+        """
+        if pipeline_depth <= 0:
+            raise ValueError("Invalid pipeline depth %d." % pipeline_depth)
+        self._pipeline_depth = pipeline_depth
+
+    def _sendPipelinedRequests(self, request_msgs):
+        """Sends hidl_memory requests, keeping several of them in flight.
+
+        Requests are taken from request_msgs lazily, so at most
+        pipelineDepth chunks are held in memory.
+
+        Args:
+            request_msgs: iterable of HidlMemoryRequestMessage.
+
+        Yields:
+            HidlMemoryResponseMessage or None, the response of each request
+            in order.
+        """
+        request_msgs = iter(request_msgs)
+        send_many = getattr(self._client, "SendHidlMemoryRequests", None)
+        while True:
+            batch = list(itertools.islice(request_msgs, self._pipeline_depth))
+            if not batch:
+                return
+            if send_many is not None and len(batch) > 1:
+                response_msgs = send_many(batch)
+            else:
+                response_msgs = [
+                    self._client.SendHidlMemoryRequest(request_msg)
+                    for request_msg in batch
+                ]
+            for response_msg in response_msgs:
+                yield response_msg
+
+    def _createReadBytesRequestMessage(self, start, length):
+        """Creates a request to read a byte range.
+
+        Args:
+            start: int, offset from the start of memory region to read.
+            length: int, number of bytes to read.
+
+        Returns:
+            HidlMemoryRequestMessage, the MEM_PROTO_READ_BYTES request.
+        """
+        request_msg = self._createTemplateRequestMessage(
+            ResControlMsg.MEM_PROTO_READ_BYTES)
+        request_msg.start = start
+        request_msg.length = length
+        return request_msg
+
+    def _createUpdateBytesRequestMessage(self, data, start, length):
+        """Creates a request to write a byte range.
+
+        Args:
+            data: string, bytes to be written into memory.
+            start: int, offset from the start of memory region to be modified.
+            length: int, number of bytes to write.
+
+        Returns:
+            HidlMemoryRequestMessage, the MEM_PROTO_UPDATE_BYTES request.
+        """
+        request_msg = self._createTemplateRequestMessage(
+            ResControlMsg.MEM_PROTO_UPDATE_BYTES)
+        request_msg.write_data = data
+        request_msg.start = start
+        request_msg.length = length
+        return request_msg
+
     def _createTemplateRequestMessage(self, operation):
         """Creates a template HidlMemoryRequestMessage.
 
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import array
+import struct
+import unittest
+
+from vts.proto import VtsResourceControllerMessage_pb2 as ResControlMsg
+from vts.utils.python.mirror import resource_mirror
+
+
+class FakeFmqClient(object):
+    """A fake VtsTcpClient backed by a host-side list of int32_t items."""
+
+    def __init__(self):
+        self.queue = []
+        self.requests = []
+
+    def SendFmqRequest(self, request_msg):
+        self.requests.append(request_msg)
+        response_msg = ResControlMsg.FmqResponseMessage()
+        response_msg.success = True
+        if request_msg.operation == ResControlMsg.FMQ_WRITE:
+            if request_msg.HasField("write_data_packed"):
+                packed_data = request_msg.write_data_packed
+                self.queue.extend(
+                    struct.unpack("<%di" % (len(packed_data) // 4),
+                                  packed_data))
+            else:
+                self.queue.extend(
+                    item.scalar_value.int32_t
+                    for item in request_msg.write_data)
+        elif request_msg.operation == ResControlMsg.FMQ_READ:
+            items = self.queue[:request_msg.read_data_size]
+            del self.queue[:request_msg.read_data_size]
+            if request_msg.pack_read_data:
+                response_msg.read_data_packed = struct.pack(
+                    "<%di" % len(items), *items)
+            else:
+                for item in items:
+                    read_item = response_msg.read_data.add()
+                    read_item.scalar_type = "int32_t"
+                    read_item.scalar_value.int32_t = item
+        return response_msg
+
+    def GetPythonDataOfVariableSpecMsg(self, var_spec_msg):
+        return var_spec_msg.scalar_value.int32_t
+
+
+class FakeHidlMemoryClient(object):
+    """A fake VtsTcpClient backed by a host-side bytearray."""
+
+    def __init__(self, size):
+        self.memory = bytearray(size)
+        self.requests = []
+        self.batch_sizes = []
+
+    def SendHidlMemoryRequest(self, request_msg):
+        self.requests.append(request_msg)
+        response_msg = ResControlMsg.HidlMemoryResponseMessage()
+        end = request_msg.start + request_msg.length
+        response_msg.success = end <= len(self.memory)
+        if not response_msg.success:
+            return response_msg
+        if request_msg.operation == ResControlMsg.MEM_PROTO_UPDATE_BYTES:
+            self.memory[request_msg.start:end] = (
+                request_msg.write_data[:request_msg.length])
+        elif request_msg.operation == ResControlMsg.MEM_PROTO_READ_BYTES:
+            response_msg.read_data = bytes(self.memory[request_msg.start:end])
+        return response_msg
+
+    def SendHidlMemoryRequests(self, request_msgs):
+        self.batch_sizes.append(len(request_msgs))
+        return [self.SendHidlMemoryRequest(msg) for msg in request_msgs]
+
+
+class ResourceFmqMirrorTest(unittest.TestCase):
+    """Tests the packed data path of ResourceFmqMirror."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.client = FakeFmqClient()
+        self.queue = resource_mirror.ResourceFmqMirror("int32_t", True,
+                                                       self.client, 1)
+
+    def testWriteArray(self):
+        """Tests that array.array data is written in packed form."""
+        self.assertTrue(self.queue.write(array.array("i", [1, -2, 3]), 2))
+        self.assertEqual(self.client.queue, [1, -2])
+        self.assertEqual(len(self.client.requests[0].write_data), 0)
+
+    def testWriteMismatchedArray(self):
+        """Tests that arrays of another item size are converted."""
+        self.assertTrue(self.queue.write(array.array("h", [4, -5]), 2))
+        self.assertEqual(self.client.queue, [4, -5])
+
+    def testWriteBytearray(self):
+        """Tests that little-endian bytes are written as they are."""
+        data = bytearray(struct.pack("<3i", 7, 8, 9))
+        self.assertTrue(self.queue.write(data, 3))
+        self.assertEqual(self.client.queue, [7, 8, 9])
+        self.assertFalse(self.queue.write(bytearray(b"\0" * 3), 1))
+
+    def testReadArray(self):
+        """Tests that data is read into an array.array in packed form."""
+        self.client.queue = [1, 2, 3]
+        data = array.array("i", [100])
+        self.assertTrue(self.queue.read(data, 2))
+        self.assertEqual(data.tolist(), [1, 2])
+        self.assertTrue(self.client.requests[0].pack_read_data)
+
+    def testReadList(self):
+        """Tests that reading into a list uses the per-item messages."""
+        self.client.queue = [1, 2, 3]
+        data = []
+        self.assertTrue(self.queue.read(data, 3))
+        self.assertEqual(data, [1, 2, 3])
+        self.assertFalse(self.client.requests[0].pack_read_data)
+
+    def testPackedDtype(self):
+        """Tests the numpy dtype of packed data."""
+        self.assertEqual(self.queue.packedDtype, "<i4")
+
+
+class ResourceHidlMemoryMirrorTest(unittest.TestCase):
+    """Tests the chunked byte range I/O of ResourceHidlMemoryMirror."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.client = FakeHidlMemoryClient(100)
+        self.memory = resource_mirror.ResourceHidlMemoryMirror(
+            self.client, 1, chunk_size=8, pipeline_depth=3)
+
+    def testSmallRange(self):
+        """Tests that a range within one chunk uses one request."""
+        self.assertTrue(self.memory.updateBytes(b"abcd", 4, 2))
+        self.assertEqual(self.memory.readBytes(4, 2), b"abcd")
+        self.assertEqual(len(self.client.requests), 2)
+        self.assertEqual(self.client.batch_sizes, [])
+
+    def testChunkedUpdate(self):
+        """Tests that large writes are split into pipelined chunks."""
+        data = bytearray(range(30))
+        self.assertTrue(self.memory.updateBytes(memoryview(data), 30, 10))
+        self.assertEqual(self.client.memory[10:40], data)
+        self.assertEqual([msg.length for msg in self.client.requests],
+                         [8, 8, 8, 6])
+        self.assertEqual(self.client.batch_sizes, [3])
+
+    def testUpdateShorterLength(self):
+        """Tests that only length bytes of the data are written."""
+        self.assertTrue(self.memory.updateBytes(bytearray(b"x" * 20), 10))
+        self.assertEqual(self.client.memory[:11], bytearray(b"x" * 10 + b"\0"))
+        self.assertFalse(self.memory.updateBytes(bytearray(4), 10))
+
+    def testChunkedRead(self):
+        """Tests that large reads are assembled from chunks."""
+        self.client.memory[:] = bytearray(range(100))
+        self.assertEqual(self.memory.readBytes(20, 50),
+                         bytes(bytearray(range(50, 70))))
+
+    def testReadInto(self):
+        """Tests reading into a preallocated buffer."""
+        self.client.memory[:] = bytearray(range(100))
+        buf = bytearray(30)
+        self.assertEqual(self.memory.readInto(memoryview(buf)[5:], 70), 25)
+        self.assertEqual(buf[5:], bytearray(range(70, 95)))
+        self.assertEqual(buf[:5], bytearray(5))
+
+    def testReadIntoFailure(self):
+        """Tests that out-of-range and read-only reads fail."""
+        self.assertEqual(self.memory.readInto(bytearray(20), 90), -1)
+        self.assertEqual(self.memory.readInto(memoryview(b"abc")), -1)
+        self.assertIsNone(self.memory.readBytes(20, 90))
+
+    def testChunkSettings(self):
+        """Tests validation of the chunk size and pipeline depth."""
+        self.memory.pipelineDepth = 1
+        self.assertTrue(self.memory.updateBytes(bytearray(20), 20))
+        self.assertEqual(self.client.batch_sizes, [])
+        with self.assertRaises(ValueError):
+            self.memory.chunkSize = 0
+        with self.assertRaises(ValueError):
+            self.memory.pipelineDepth = 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,14 +14,72 @@
 # limitations under the License.
 #
 import logging
-import os
 import re
-import shutil
-import tempfile
 
 from vts.runners.host import const
 from vts.utils.python.mirror import mirror_object
 
+# Max size of a chunk of streamed shell output.
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ShellStreamError(Exception):
+    """Raised when the output of a shell command cannot be streamed."""
+
+
+def StreamCommandOutput(adb, command, chunk_size=_STREAM_CHUNK_SIZE):
+    """Streams the stdout of a device shell command.
+
+    The command runs with the adb shell v2 service, whose output is neither
+    buffered on the device nor written to a host file. Stderr is collected
+    while the output is streamed.
+
+    Args:
+        adb: AdbProxy, the adb of the device.
+        command: string, the shell command.
+        chunk_size: int, max number of bytes per chunk.
+
+    Returns:
+        An iterator of bytes, the chunks of the output. After the last
+        chunk, the iterator raises ShellStreamError with the stderr if the
+        command exits with a non-zero code.
+
+    Raises:
+        ShellStreamError if the device has no adb.
+    """
+    if adb is None:
+        raise ShellStreamError(
+            "Cannot stream the output of '%s' without adb." % command)
+    return _StreamShellPackets(adb.client.shell_stream(command), command,
+                               chunk_size)
+
+
+def _StreamShellPackets(packets, command, chunk_size):
+    """Yields the stdout of a shell v2 stream and checks the exit code.
+
+    Args:
+        packets: iterator of (stdout, stderr, exit code) tuples returned by
+                 AdbClient.shell_stream.
+        command: string, the shell command.
+        chunk_size: int, max number of bytes per chunk.
+
+    Yields:
+        bytes, the chunks of the output.
+
+    Raises:
+        ShellStreamError if the command exits with a non-zero code.
+    """
+    stderr = []
+    for stdout, err, exit_code in packets:
+        for offset in range(0, len(stdout), chunk_size):
+            yield stdout[offset:offset + chunk_size]
+        stderr.append(err)
+        if exit_code:
+            raise ShellStreamError(
+                "'%s' exited with code %d: %s" %
+                (command, exit_code, b"".join(stderr).decode(
+                    "utf-8", "replace")))
+
 
 class ShellMirror(mirror_object.MirrorObject):
     """The class that acts as the mirror to an Android device's shell terminal.
@@ -79,29 +137,66 @@ class ShellMirror(mirror_object.MirrorObject):
             }
         result = self._client.ExecuteShellCommand(command, no_except)
 
-        tmp_dir = tempfile.mkdtemp()
         pattern = re.compile(self.TMP_FILE_PATTERN)
 
-        for result_val, result_type in zip(
-            [result[const.STDOUT], result[const.STDERR]],
-            ["stdout", "stderr"]):
+        for result_val in [result[const.STDOUT], result[const.STDERR]]:
             for index, val in enumerate(result_val):
-                # If val is a tmp file name, pull the file and set the contents
-                # to result.
+                # If val is a tmp file name, read and remove the file and set
+                # the contents to result.
                 if pattern.match(val):
-                    tmp_file = os.path.join(tmp_dir, result_type + str(index))
-                    logging.debug("pulling file: %s to %s", val, tmp_file)
-                    self._adb.pull(val, tmp_file)
-                    result_val[index] = open(tmp_file, "r").read()
-                    self._adb.shell("rm -f %s" % val)
+                    logging.debug("reading file: %s", val)
+                    data = b"".join(self.StreamFile(val, remove=True))
+                    if not isinstance(data, str):
+                        data = data.decode("utf-8", "replace")
+                    result_val[index] = data
                 else:
                     result_val[index] = val
 
-        shutil.rmtree(tmp_dir)
         logging.debug("resp for VTS_AGENT_COMMAND_EXECUTE_SHELL_COMMAND: %s",
                       result)
         return result
 
+    def ExecuteStream(self, command, chunk_size=_STREAM_CHUNK_SIZE):
+        """Executes a shell command and streams its stdout.
+
+        Unlike Execute, the output is not collected on the device first, so
+        the caller can process it, e.g., parse XML, while it arrives.
+
+        Args:
+            command: string, the shell command.
+            chunk_size: int, max number of bytes per chunk.
+
+        Returns:
+            An iterator of bytes, the chunks of the output. It raises
+            ShellStreamError if the command exits with a
+            non-zero code.
+
+        Raises:
+            ShellStreamError if the device has no adb.
+        """
+        return StreamCommandOutput(self._adb, command, chunk_size)
+
+    def StreamFile(self, path, remove=False, chunk_size=_STREAM_CHUNK_SIZE):
+        """Streams the content of a device file.
+
+        Reading and removing the file take one adb round trip.
+
+        Args:
+            path: string, the path to the file on the device.
+            remove: bool, whether to remove the file after reading it.
+            chunk_size: int, max number of bytes per chunk.
+
+        Returns:
+            An iterator of bytes, the chunks of the file content. It raises
+            ShellStreamError if the file cannot be read.
+        """
+        command = "cat %s" % path
+        if remove:
+            # Removes the file even if cat fails, and keeps the exit code of
+            # cat.
+            command += "; status=$?; rm -f %s; exit $status" % path
+        return StreamCommandOutput(self._adb, command, chunk_size)
+
     def SetConnTimeout(self, timeout):
         """Set remote shell connection timeout.
 
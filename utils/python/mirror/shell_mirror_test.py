@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+
+from vts.runners.host import const
+from vts.utils.python.mirror import shell_mirror
+
+
+class FakeAdbClient(object):
+    """A fake AdbClient which serves shell commands from a dict of files."""
+
+    def __init__(self, files):
+        self.files = files
+        self.commands = []
+
+    def shell_stream(self, cmd):
+        self.commands.append(cmd)
+        path = cmd.split(";")[0].split(" ", 1)[1]
+        if path not in self.files:
+            yield b"", b"No such file or directory", None
+            yield b"", b"", 1
+            return
+        data = self.files[path]
+        if "rm -f" in cmd:
+            del self.files[path]
+        yield data, b"", None
+        yield b"", b"", 0
+
+
+class FakeAdb(object):
+    """A fake AdbProxy with an AdbClient."""
+
+    def __init__(self, files):
+        self.client = FakeAdbClient(files)
+
+
+class FakeVtsClient(object):
+    """A fake VtsTcpClient which returns a nohup file as stdout."""
+
+    def ExecuteShellCommand(self, command, no_except):
+        return {
+            const.STDOUT: ["/data/local/tmp/nohup.1", "short"],
+            const.STDERR: ["", ""],
+            const.EXIT_CODE: [0, 0],
+        }
+
+
+class ShellMirrorTest(unittest.TestCase):
+    """Tests the output streaming of ShellMirror."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.adb = FakeAdb({
+            "/data/local/tmp/nohup.1": b"long output",
+            "/data/local/tmp/result.xml": b"<testsuites/>",
+        })
+        self.mirror = shell_mirror.ShellMirror(FakeVtsClient(), self.adb)
+
+    def testExecuteReadsTmpFile(self):
+        """Tests that a tmp file is read and removed in one command."""
+        result = self.mirror.Execute(["long", "short"])
+        self.assertEqual(result[const.STDOUT], ["long output", "short"])
+        self.assertEqual(self.adb.client.commands, [
+            "cat /data/local/tmp/nohup.1; status=$?; "
+            "rm -f /data/local/tmp/nohup.1; exit $status"
+        ])
+        self.assertNotIn("/data/local/tmp/nohup.1", self.adb.client.files)
+
+    def testExecuteMissingTmpFile(self):
+        """Tests that a tmp file which cannot be read raises an error."""
+        del self.adb.client.files["/data/local/tmp/nohup.1"]
+        with self.assertRaisesRegexp(shell_mirror.ShellStreamError,
+                                     "No such file or directory"):
+            self.mirror.Execute(["long", "short"])
+
+    def testStreamFile(self):
+        """Tests that a file is streamed in chunks."""
+        chunks = list(
+            self.mirror.StreamFile("/data/local/tmp/result.xml", chunk_size=4))
+        self.assertEqual(chunks, [b"<tes", b"tsui", b"tes/", b">"])
+        self.assertIn("/data/local/tmp/result.xml", self.adb.client.files)
+
+    def testStreamErrors(self):
+        """Tests the errors of a missing file and a device without adb."""
+        chunks = self.mirror.StreamFile("/data/local/tmp/missing.xml")
+        with self.assertRaisesRegexp(shell_mirror.ShellStreamError,
+                                     "No such file or directory"):
+            list(chunks)
+        with self.assertRaises(shell_mirror.ShellStreamError):
+            shell_mirror.StreamCommandOutput(None, "true")
+
+
+if __name__ == "__main__":
+    unittest.main()
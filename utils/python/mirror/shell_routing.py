@@ -0,0 +1,177 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+
+# The transports of shell commands.
+TRANSPORT_ADB = "adb"
+TRANSPORT_VTS_DRIVER = "vts_driver"
+
+# Weight of a new latency sample in the moving average.
+_DEFAULT_EWMA_ALPHA = 0.3
+# Every this many calls of a command count bucket, the slower transport is
+# tried again so that its estimate follows changes of the device.
+_DEFAULT_EXPLORE_INTERVAL = 20
+# Calls of at most this many commands always use adb.
+_DEFAULT_ADB_THRESHOLD = 3
+# Command counts are bucketed as 1, 2, 3-4, 5-8, 9-16, and 17+.
+_MAX_BUCKET = 5
+
+
+def _Bucket(command_count):
+    """Gets the bucket of a command count.
+
+    Args:
+        command_count: int, number of commands in a call.
+
+    Returns:
+        int, the bucket index.
+    """
+    return min((command_count - 1).bit_length(), _MAX_BUCKET)
+
+
+def _BucketName(bucket):
+    """Gets the readable range of a bucket.
+
+    Args:
+        bucket: int, the bucket index.
+
+    Returns:
+        string, e.g., "3-4" or "17+".
+    """
+    if bucket == 0:
+        return "1"
+    low = (1 << (bucket - 1)) + 1
+    if bucket == _MAX_BUCKET:
+        return "%d+" % low
+    high = 1 << bucket
+    return str(low) if low == high else "%d-%d" % (low, high)
+
+
+class ShellRoutingPolicy(object):
+    """Chooses the faster transport for shell commands from measurements.
+
+    A call of at most adb_threshold commands always uses adb, as the static
+    rule did. For larger calls, the policy keeps an exponentially weighted
+    moving average of the latency of each transport for each command count
+    bucket. A call is routed to the transport with the lower average. A
+    bucket without measurements falls back to the VTS shell driver, and
+    tries the unmeasured transport on its second call. The slower transport
+    is retried every explore_interval calls.
+
+    Attributes:
+        _alpha: float, weight of a new sample in the moving average.
+        _explore_interval: int, number of calls between two retries of the
+                           slower transport.
+        _adb_threshold: int, max command count which is always routed to
+                        adb.
+        _latencies: dict, (transport, bucket) to the average latency in
+                    seconds.
+        _samples: dict, (transport, bucket) to the number of samples.
+        _calls: dict, bucket to the number of routed calls.
+        _decisions: dict, (transport, bucket) to the number of routed calls.
+        _lock: threading.Lock, protects the dicts.
+    """
+
+    def __init__(self,
+                 alpha=_DEFAULT_EWMA_ALPHA,
+                 explore_interval=_DEFAULT_EXPLORE_INTERVAL,
+                 adb_threshold=_DEFAULT_ADB_THRESHOLD):
+        self._alpha = alpha
+        self._explore_interval = explore_interval
+        self._adb_threshold = adb_threshold
+        self._latencies = {}
+        self._samples = {}
+        self._calls = {}
+        self._decisions = {}
+        self._lock = threading.Lock()
+
+    def Choose(self, command_count):
+        """Chooses the transport of a call.
+
+        Args:
+            command_count: int, number of commands in the call.
+
+        Returns:
+            TRANSPORT_ADB or TRANSPORT_VTS_DRIVER.
+        """
+        bucket = _Bucket(command_count)
+        with self._lock:
+            calls = self._calls.get(bucket, 0) + 1
+            self._calls[bucket] = calls
+            adb_latency = self._latencies.get((TRANSPORT_ADB, bucket))
+            driver_latency = self._latencies.get((TRANSPORT_VTS_DRIVER, bucket))
+
+            if command_count <= self._adb_threshold:
+                transport = TRANSPORT_ADB
+            elif adb_latency is None and driver_latency is None:
+                transport = TRANSPORT_VTS_DRIVER
+            elif adb_latency is None or driver_latency is None:
+                known = (TRANSPORT_VTS_DRIVER
+                         if adb_latency is None else TRANSPORT_ADB)
+                unknown = (TRANSPORT_ADB
+                           if adb_latency is None else TRANSPORT_VTS_DRIVER)
+                explore = (calls % self._explore_interval ==
+                           2 % self._explore_interval)
+                transport = unknown if explore else known
+            else:
+                if adb_latency <= driver_latency:
+                    transport, other = TRANSPORT_ADB, TRANSPORT_VTS_DRIVER
+                else:
+                    transport, other = TRANSPORT_VTS_DRIVER, TRANSPORT_ADB
+                if calls % self._explore_interval == 0:
+                    transport = other
+
+            key = (transport, bucket)
+            self._decisions[key] = self._decisions.get(key, 0) + 1
+        return transport
+
+    def Record(self, transport, command_count, latency):
+        """Records the latency of a call.
+
+        Args:
+            transport: string, the transport of the call.
+            command_count: int, number of commands in the call.
+            latency: float, wall time of the call in seconds.
+        """
+        key = (transport, _Bucket(command_count))
+        with self._lock:
+            average = self._latencies.get(key)
+            if average is None:
+                self._latencies[key] = latency
+            else:
+                self._latencies[key] = (
+                    self._alpha * latency + (1 - self._alpha) * average)
+            self._samples[key] = self._samples.get(key, 0) + 1
+
+    def GetStats(self):
+        """Gets the cost model and the routing decisions.
+
+        Returns:
+            dict, (transport, command count range) to a dict of the average
+            latency in seconds ("latency"), the number of samples
+            ("samples"), and the number of routed calls ("calls").
+        """
+        stats = {}
+        with self._lock:
+            for key in set(self._latencies) | set(self._decisions):
+                transport, bucket = key
+                stats[transport, _BucketName(bucket)] = {
+                    "latency": self._latencies.get(key),
+                    "samples": self._samples.get(key, 0),
+                    "calls": self._decisions.get(key, 0),
+                }
+        return stats
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+
+from vts.utils.python.mirror import shell_routing
+
+ADB = shell_routing.TRANSPORT_ADB
+DRIVER = shell_routing.TRANSPORT_VTS_DRIVER
+
+
+class ShellRoutingPolicyTest(unittest.TestCase):
+    """Tests the cost model of ShellRoutingPolicy."""
+
+    def setUp(self):
+        """SetUp tasks"""
+        self.policy = shell_routing.ShellRoutingPolicy(explore_interval=5)
+
+    def testStaticRuleWithoutMeasurements(self):
+        """Tests the default routing before any measurement."""
+        self.assertEqual(self.policy.Choose(1), ADB)
+        self.assertEqual(self.policy.Choose(3), ADB)
+        self.assertEqual(self.policy.Choose(5), DRIVER)
+
+    def testSmallCallsAlwaysUseAdb(self):
+        """Tests that small calls are not explored or rerouted."""
+        self.policy.Record(ADB, 1, 1.0)
+        self.policy.Record(DRIVER, 1, 0.1)
+        self.assertEqual([self.policy.Choose(1) for _ in range(10)],
+                         [ADB] * 10)
+
+    def testExploreUnknownTransport(self):
+        """Tests that the unmeasured transport is tried on the second call."""
+        self.assertEqual(self.policy.Choose(5), DRIVER)
+        self.policy.Record(DRIVER, 5, 0.1)
+        self.assertEqual(self.policy.Choose(5), ADB)
+        self.assertEqual(self.policy.Choose(5), DRIVER)
+
+    def testRouteToFasterTransport(self):
+        """Tests that calls follow the lower moving average."""
+        self.policy.Record(ADB, 10, 0.5)
+        self.policy.Record(DRIVER, 10, 0.2)
+        self.assertEqual(
+            [self.policy.Choose(10) for _ in range(5)],
+            [DRIVER, DRIVER, DRIVER, DRIVER, ADB])
+        # adb becomes faster after a few samples.
+        for _ in range(5):
+            self.policy.Record(ADB, 12, 0.05)
+        self.assertEqual(self.policy.Choose(9), ADB)
+        # Other buckets are not affected.
+        self.assertEqual(self.policy.Choose(2), ADB)
+
+    def testGetStats(self):
+        """Tests the moving average and the decision counters."""
+        self.policy.Record(ADB, 3, 1.0)
+        self.policy.Record(ADB, 4, 2.0)
+        self.policy.Choose(4)
+        stats = self.policy.GetStats()
+        self.assertAlmostEqual(stats[ADB, "3-4"]["latency"], 1.3)
+        self.assertEqual(stats[ADB, "3-4"]["samples"], 2)
+        self.assertEqual(stats[ADB, "3-4"]["calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()